@@ -19,6 +19,12 @@ setuptools.setup(
           "plotly"
           
       ],
+    extras_require={
+          "dask": ["dask[dataframe]", "distributed"],
+          "spatial": ["scipy"],
+          "arrow": ["pyarrow"],
+          "polars": ["pyarrow", "polars"],
+      },
     classifiers=[
         "Programming Language :: Python :: 3",
         "License :: OSI Approved :: MIT License",
@@ -0,0 +1,54 @@
+import os
+import numpy as np
+import pandas as pd
+import pytest
+from udidata import settings
+from udidata.dir import utils as dir_utils
+from udidata.load import raw, agg as load_agg
+from udidata.settings import COL_NAMES
+
+
+def readings(n, rng, first_id=0, start=0):
+    """
+    n raw readings in the layout of the hourly files, raw_time from start (ms)
+    """
+    df = pd.DataFrame({col: rng.normal(size=n) for col in COL_NAMES.values()})
+    df["_id"] = np.arange(first_id, first_id+n)
+    df["raw_time"] = start + np.sort(rng.integers(0, 3600000, n))
+    df["temperature"] = rng.normal(20, 5, n)
+    df["pressure"] = rng.normal(1000, 10, n)
+    df.loc[rng.random(n) < 0.1, "humidity"] = np.nan
+    df["lat"] = rng.uniform(30, 35, n)
+    df["lng"] = rng.uniform(30, 36, n)
+    df["model"] = rng.choice(["a", "b"], n)
+    df["tz_offset"] = 3*3600000
+    return df[list(COL_NAMES.values())]
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    """
+    An empty DATA_DIR
+    """
+    path = str(tmp_path / "data")
+    for module in [settings, dir_utils, raw, load_agg]:
+        monkeypatch.setattr(module, "DATA_DIR", path)
+    return path
+
+
+@pytest.fixture
+def make_day(data_dir):
+    """
+    Writes hourly files of a date to DATA_DIR: make_day(date, hours, n)
+    """
+    def make(date, hours=range(3), n=200, seed=0):
+        rng = np.random.default_rng(seed)
+        folder = os.path.join(data_dir, date)
+        os.makedirs(folder, exist_ok=True)
+        start = pd.Timestamp(date.replace("/", "-")).value // 10**6
+        for h in hours:
+            df = readings(n, rng, first_id=(seed*24 + h)*n, start=start + h*3600000)
+            df.to_csv(os.path.join(folder, f"{h:02d}.csv.gz"), index=False)
+        return folder
+
+    return make
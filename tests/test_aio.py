@@ -0,0 +1,54 @@
+import asyncio
+import threading
+import time
+import pandas as pd
+from udidata import aio, load
+from udidata.dir import pack
+
+
+def test_identical_requests_load_once(monkeypatch):
+    calls = []
+    lock = threading.Lock()
+
+    def slow_day(date, **kwargs):
+        with lock:
+            calls.append(date)
+        time.sleep(0.2)
+        return pd.DataFrame({"date": [date]})
+
+    monkeypatch.setattr(load.raw, "day", slow_day)
+
+    async def main():
+        service = aio.DataService()
+        try:
+            return await asyncio.gather(*[service.day("2017/05/05", columns=["lat", "lng"]) for _ in range(5)],
+                                        service.day("2017/05/06", columns=["lat", "lng"]))
+        finally:
+            service.close()
+
+    results = asyncio.run(main())
+
+    assert sorted(calls) == ["2017/05/05", "2017/05/06"]
+    assert all(df is results[0] for df in results[:5])
+    assert results[5]["date"][0] == "2017/05/06"
+
+
+def test_concurrent_reads_of_packed_days(make_day, monkeypatch):
+    dates = [f"2017/05/{d:02d}" for d in range(1, 7)]
+    for i, date in enumerate(dates):
+        make_day(date, n=100, seed=i)
+    pack.pack_days((dates[0], dates[-1]), remove=True)
+
+    # fewer open packs than days, so reads in threads evict packs other threads read
+    monkeypatch.setattr(pack, "MAX_OPEN_PACKS", 2)
+    expected = {date: load.day(date, columns=["lat", "lng", "temperature"]) for date in dates}
+
+    async def main():
+        service = aio.DataService(limits={"raw": 6})
+        try:
+            return await asyncio.gather(*[service.day(date, columns=["lat", "lng", "temperature"]) for date in dates * 3])
+        finally:
+            service.close()
+
+    for date, df in zip(dates * 3, asyncio.run(main())):
+        pd.testing.assert_frame_equal(df, expected[date])
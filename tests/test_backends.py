@@ -0,0 +1,21 @@
+import pytest
+from udidata import load
+from udidata.calculate.agg import spatial_agg
+
+
+def test_arrow_sample_keeps_fraction(make_day):
+    make_day("2017/05/05", n=2000)
+    table = load.day("2017/05/05", columns=["lat", "lng", "temperature"], sample=0.5, seed=1, backend="arrow")
+    df = load.backends.as_pandas(table)
+
+    assert df.attrs["sample"] == 0.5
+    agg = spatial_agg(df)
+    assert "count_ci" in agg.index.get_level_values("stat")
+
+
+def test_polars_sample_is_refused(make_day):
+    make_day("2017/05/05")
+    with pytest.raises(ValueError, match="polars"):
+        load.day("2017/05/05", sample=0.5, backend="polars")
+    with pytest.raises(ValueError, match="polars"):
+        load.days(("2017/05/05", "2017/05/05"), sample=0.5, backend="polars")
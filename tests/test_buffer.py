@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+from udidata.load.buffer import ColumnBuffer
+
+
+def frames(seed=0):
+    rng = np.random.default_rng(seed)
+    dfs = []
+    for i, n in enumerate([5, 0, 40, 3, 100]):
+        df = pd.DataFrame({"x": rng.integers(0, 10, n), "y": rng.normal(size=n), "s": rng.choice(["a", "b"], n)})
+        if i == 3:
+            # int column with missing values is read as float
+            df["x"] = df["x"].astype(float)
+            df.loc[0, "x"] = np.nan
+        dfs.append(df)
+    return dfs
+
+
+def test_buffer_matches_concat_when_it_grows():
+    dfs = frames()
+
+    for capacity in [0, 7, 60, 1000]:
+        buffer = ColumnBuffer(capacity)
+        for df in dfs:
+            buffer.append(df)
+
+        pd.testing.assert_frame_equal(buffer.to_frame(), pd.concat(dfs, ignore_index=True), check_dtype=False)
+        assert buffer.to_frame()["x"].dtype == np.float64
+
+
+def test_grown_buffer_keeps_filled_chunks():
+    buffer = ColumnBuffer(10)
+    buffer.append(pd.DataFrame({"x": np.arange(10.0)}))
+    first = buffer.chunks[0][0]["x"]
+    buffer.append(pd.DataFrame({"x": np.arange(10.0, 25.0)}))
+
+    # the filled chunk was not reallocated
+    assert buffer.chunks[0][0]["x"] is first
+    assert len(buffer.chunks) == 2
+    assert buffer.to_frame()["x"].tolist() == list(np.arange(25.0))
+
+
+def test_empty_buffer():
+    assert list(ColumnBuffer(0).to_frame(["x", "y"]).columns) == ["x", "y"]
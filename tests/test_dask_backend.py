@@ -0,0 +1,60 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip("dask.distributed")
+
+from udidata import dask_backend, load
+from udidata.calculate.agg import spatial_agg
+from udidata.calculate.merge import merge_spatial_aggs
+
+COLS = ["temperature", "pressure"]
+
+
+@pytest.fixture(scope="module")
+def client():
+    client = dask_backend.local_client(n_workers=2, processes=False)
+    yield client
+    client.close()
+    client.cluster.close()
+
+
+def stats_of(agg):
+    return sorted(set(agg.index.get_level_values("stat")))
+
+
+def test_spatial_agg_range_matches_serial(client, make_day):
+    for i, date in enumerate(["2017/05/05", "2017/05/06", "2017/05/07"]):
+        make_day(date, n=300, seed=i)
+
+    agg = dask_backend.spatial_agg_range(("2017/05/05", "2017/05/07"), cols=COLS, split_every=2, client=client)
+    expected = spatial_agg(load.days(("2017/05/05", "2017/05/07"), columns=["lat", "lng"]+COLS))
+
+    for stat in ["count", "mean", "std", "min", "max"]:
+        np.testing.assert_allclose(agg.xs(stat, level="stat").sort_index().to_numpy(float),
+                                   expected.xs(stat, level="stat").sort_index()[agg.columns].to_numpy(float), rtol=1e-9)
+
+
+def test_single_day_has_the_schema_of_several(client, make_day):
+    make_day("2017/05/05", seed=0)
+    make_day("2017/05/06", seed=1)
+
+    one = dask_backend.spatial_agg_range(("2017/05/05", "2017/05/05"), cols=COLS, client=client)
+    two = dask_backend.spatial_agg_range(("2017/05/05", "2017/05/06"), cols=COLS, client=client)
+
+    assert stats_of(one) == stats_of(two)
+    assert "median" not in stats_of(one)
+    pd.testing.assert_frame_equal(one, merge_spatial_aggs([spatial_agg(load.day("2017/05/05", columns=["lat", "lng"]+COLS))]))
+
+
+def test_days_partitions(client, make_day):
+    make_day("2017/05/05", seed=0)
+    make_day("2017/05/06", hours=[0], seed=1)
+
+    ddf = dask_backend.days(("2017/05/05", "2017/05/06"), columns=["_id", "temperature", "model"])
+
+    assert ddf.npartitions == 2
+    assert ddf.dtypes["_id"] == np.float64
+    df = client.compute(ddf).result()
+    assert len(df) == 800
+    assert df["_id"].tolist() == list(range(600)) + list(range(4800, 5000))
@@ -0,0 +1,26 @@
+import numpy as np
+from udidata.utils.dedupe import SeenIds, hash_ids
+
+
+def test_int_and_float_ids_are_duplicates():
+    seen = SeenIds()
+
+    assert seen.filter(np.array([1, 2, 3], dtype=np.int64)).all()
+    # the same ids read as float, because of a missing id in the file
+    mask = seen.filter(np.array([3.0, np.nan, 4.0, 2.5]))
+
+    assert mask.tolist() == [False, True, True, True]
+
+
+def test_float_ids_hash_like_ints():
+    assert (hash_ids(np.array([7.0, -2.0])) == hash_ids(np.array([7, -2]))).all()
+    assert hash_ids(np.array([7.5]))[0] != hash_ids(np.array([7]))[0]
+
+
+def test_duplicates_inside_and_across_chunks():
+    seen = SeenIds()
+    chunks = [np.arange(i, i+100) for i in range(0, 1000, 50)]
+
+    kept = np.concatenate([chunk[seen.filter(chunk)] for chunk in chunks])
+
+    assert np.array_equal(np.sort(kept), np.arange(1050))
@@ -0,0 +1,54 @@
+import numpy as np
+import pandas as pd
+import pytest
+from udidata.utils import grid
+from udidata.calculate.agg import spatial_agg
+from udidata.calculate.pyramid import coarsen_agg
+from test_merge import assert_stats_equal
+
+
+def band_areas(deg):
+    # cell area of every band, relative to a cell at the equator
+    columns = grid.equal_area_columns(deg)
+    edges = np.radians(np.linspace(-90, 90, columns.size+1))
+    areas = (np.sin(edges[1:]) - np.sin(edges[:-1])) / columns
+    return areas / areas[columns.size // 2]
+
+
+@pytest.mark.parametrize("deg", [0.25, 0.5, 1, 2.5, 5, 10])
+def test_equal_area_cells_are_about_the_same_size(deg):
+    areas = band_areas(deg)
+
+    # only the polar caps are single, bigger cells
+    assert grid.equal_area_columns(deg)[[0, -1]].tolist() == [1, 1]
+    assert ((areas[1:-1] > 0.45) & (areas[1:-1] < 1.2)).all()
+
+
+@pytest.mark.parametrize("deg,parent_deg", [(0.5, 1), (0.5, 2.5), (1, 3), (1, 5), (2.5, 7.5), (2.5, 10), (0.25, 5)])
+def test_equal_area_cells_nest(deg, parent_deg):
+    rng = np.random.default_rng(0)
+    lat, lng = rng.uniform(-90, 90, 100000), rng.uniform(-180, 180, 100000)
+
+    band_idx, lng_idx = grid.equal_area_index(lat, lng, deg)
+    parent = grid.equal_area_parent(band_idx, lng_idx, deg, parent_deg)
+    expected = grid.equal_area_index(lat, lng, parent_deg)
+    assert (parent[0] == expected[0]).all() and (parent[1] == expected[1]).all()
+
+    # centroids are inside their cells
+    centroid_idx = grid.equal_area_index(*grid.equal_area_centroids(band_idx, lng_idx, deg), deg)
+    assert (centroid_idx[0] == band_idx).all() and (centroid_idx[1] == lng_idx).all()
+
+    # children of a cell are the cells whose parent it is
+    cells = np.unique(grid.cell_ids(lat, lng, parent_deg))[::50]
+    for cell, children in zip(cells, grid.cell_children(cells, parent_deg, deg)):
+        assert (grid.cell_parent(children, deg, parent_deg) == cell).all()
+
+
+def test_coarsen_equal_area_matches_direct_aggregation():
+    rng = np.random.default_rng(1)
+    n = 20000
+    df = pd.DataFrame({"lat": rng.uniform(-90, 90, n), "lng": rng.uniform(-180, 180, n),
+                       "temperature": rng.normal(20, 5, n), "pressure": rng.normal(1000, 10, n)})
+
+    coarse = coarsen_agg(spatial_agg(df, deg=2.5, grid="equal_area"), 10, base_deg=2.5, grid="equal_area")
+    assert_stats_equal(coarse, spatial_agg(df, deg=10, grid="equal_area"), stats=["count", "mean", "min", "max"])
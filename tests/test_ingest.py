@@ -0,0 +1,103 @@
+import os
+from udidata import ingest, load
+from udidata.calculate.agg import spatial_agg
+from test_merge import assert_stats_equal
+
+COLS = ["temperature", "pressure"]
+
+
+def ingestor(monkeypatch, today):
+    monkeypatch.setattr(ingest, "utc_today", lambda: today)
+    return ingest.Ingestor(cols=COLS, settle=0)
+
+
+def day_agg(date):
+    return spatial_agg(load.day(date, columns=["lat", "lng"]+COLS))
+
+
+def test_day_in_progress_is_merged_from_hours(make_day, monkeypatch):
+    make_day("2017/05/05", hours=range(2))
+    ing = ingestor(monkeypatch, "2017/05/05")
+    assert len(ing.poll(["2017/05/05"])) == 2
+
+    # a new hour only reads its own file
+    make_day("2017/05/05", hours=[2], seed=1)
+    reads = []
+    day = load.day
+    monkeypatch.setattr(load, "day", lambda date, *args, **kwargs: reads.append(kwargs.get("hour_range")) or day(date, *args, **kwargs))
+    assert ing.poll(["2017/05/05"]) == [("2017/05/05", 2)]
+    assert reads == [2]
+
+    daily = load.agg.day("2017/05/05", atmos=COLS)
+    assert "median" not in daily.index.get_level_values("stat")
+    monkeypatch.setattr(load, "day", day)
+    assert_stats_equal(daily, day_agg("2017/05/05"), stats=["count", "mean", "std", "min", "max", "na_count"], cols=COLS)
+    assert ing.state["partial"] == ["2017/05/05"]
+
+
+def test_finished_day_gets_median(make_day, monkeypatch):
+    make_day("2017/05/05")
+    ing = ingestor(monkeypatch, "2017/05/06")
+    ing.poll(["2017/05/05"])
+
+    daily = load.agg.day("2017/05/05", atmos=COLS)
+    assert_stats_equal(daily, day_agg("2017/05/05"), stats=["count", "mean", "median", "std"], cols=COLS)
+    assert ing.state["partial"] == []
+
+
+def test_new_variables_are_kept(make_day, monkeypatch):
+    make_day("2017/05/05", hours=[0])
+    ing = ingestor(monkeypatch, "2017/05/05")
+    ing.poll(["2017/05/05"])
+
+    make_day("2017/05/05", hours=[1], seed=1)
+    ing.cols = COLS + ["humidity"]
+    ing.poll(["2017/05/05"])
+
+    hourly = load.agg.hourly("2017/05/05", atmos=COLS+["humidity"])
+    assert hourly.xs(0, level="hour")["humidity"].isna().all()
+    assert hourly.xs(1, level="hour")["humidity"].notna().any()
+
+
+def test_hours_without_data_are_recorded(make_day, data_dir, monkeypatch):
+    folder = make_day("2017/05/05", hours=[0], n=0)
+    ing = ingestor(monkeypatch, "2017/05/05")
+
+    assert ing.poll(["2017/05/05"]) == [("2017/05/05", 0)]
+    assert ing.poll(["2017/05/05"]) == []
+    assert not os.path.exists(load.agg.hourly_path("2017/05/05"))
+
+
+def test_failed_rollups_are_retried(make_day, monkeypatch):
+    make_day("2017/05/05")
+    ing = ingestor(monkeypatch, "2017/05/06")
+
+    update_month = ing.update_month
+    def fail(year, month):
+        raise OSError("disk full")
+    monkeypatch.setattr(ing, "update_month", fail)
+    ing.poll(["2017/05/05"])
+    assert ing.state["failed"] == ["2017/05"]
+
+    # nothing new to ingest, the month is rebuilt anyway
+    monkeypatch.setattr(ing, "update_month", update_month)
+    assert ing.poll(["2017/05/05"]) == []
+    assert ing.state["failed"] == []
+    assert os.path.exists(load.agg.month_path(2017, 5))
+    assert ingest.Ingestor(cols=COLS).state["failed"] == []
+
+
+def test_run_goes_on_after_errors(monkeypatch):
+    ing = ingest.Ingestor(cols=COLS, interval=0)
+    polls = []
+
+    def poll():
+        polls.append(1)
+        if len(polls) == 1:
+            raise OSError("DATA_DIR unavailable")
+        ing.stop()
+        return []
+
+    monkeypatch.setattr(ing, "poll", poll)
+    ing.run()
+    assert len(polls) == 2
@@ -0,0 +1,19 @@
+import numpy as np
+from udidata import load
+from udidata.calculate.agg import spatial_agg
+
+
+def test_dataset_leaves_missing_variables_nan(make_day):
+    for i, date in enumerate(["2017/05/05", "2017/05/06"]):
+        make_day(date, seed=i)
+    cols = ["temperature", "pressure"]
+    full = spatial_agg(load.day("2017/05/05", columns=["lat", "lng"]+cols))
+    full.to_csv(load.agg.day_path("2017/05/05"))
+    # a file with only some of the variables
+    spatial_agg(load.day("2017/05/06", columns=["lat", "lng", "temperature"])).to_csv(load.agg.day_path("2017/05/06"))
+
+    ds = load.agg.dataset(("2017/05/05", "2017/05/06"), "day", atmos=cols, stats=["count", "mean"])
+
+    assert np.isnan(ds["pressure"].sel(date="2017-05-06").to_numpy()).all()
+    assert (ds["temperature"].sel(date="2017-05-06", stat="count") > 0).any()
+    assert np.nansum(ds["pressure"].sel(date="2017-05-05", stat="count")) == full.xs("count", level="stat")["pressure"].sum()
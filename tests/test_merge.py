@@ -0,0 +1,82 @@
+import numpy as np
+import pandas as pd
+from udidata.calculate.agg import spatial_agg
+from udidata.calculate.merge import merge_stats, merge_spatial_aggs
+from udidata.calculate.pyramid import coarsen_agg
+
+
+COLS = ["temperature", "pressure"]
+MERGEABLE = ["count", "mean", "std", "min", "max", "na_count", "na_pct"]
+
+
+def readings(n, seed):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({"lat": rng.uniform(30, 35, n), "lng": rng.uniform(30, 35, n),
+                       "temperature": rng.normal(20, 5, n), "pressure": rng.normal(1000, 10, n)})
+    df.loc[rng.random(n) < 0.1, "temperature"] = np.nan
+    return df
+
+
+def assert_stats_equal(agg, expected, stats=MERGEABLE, cols=COLS):
+    for stat in stats:
+        a = agg.xs(stat, level="stat").sort_index()
+        b = expected.xs(stat, level="stat").sort_index()
+        assert a.index.equals(b.index), stat
+        np.testing.assert_allclose(a[cols].to_numpy(float), b[cols].to_numpy(float), rtol=1e-9, equal_nan=True, err_msg=stat)
+
+
+def test_merge_spatial_aggs_matches_aggregation_of_all_rows():
+    parts = [readings(2000, seed) for seed in range(3)]
+
+    merged = merge_spatial_aggs([spatial_agg(df) for df in parts])
+
+    assert_stats_equal(merged, spatial_agg(pd.concat(parts, ignore_index=True)))
+    assert "median" not in merged.index.get_level_values("stat")
+
+
+def test_merge_spatial_aggs_skips_none():
+    df = readings(500, 0)
+    assert_stats_equal(merge_spatial_aggs([None, spatial_agg(df), None]), spatial_agg(df))
+    assert merge_spatial_aggs([None]) is None
+
+
+def test_merge_stats_std_is_nan_below_two_readings():
+    # one reading in the first cell, none of temperature in the second
+    df = pd.DataFrame({"lat": [30.1, 40.1, 40.2], "lng": [30.1, 40.1, 40.2],
+                       "temperature": [20.0, np.nan, np.nan], "pressure": [1000.0, 1001.0, 1003.0]})
+
+    merged = merge_spatial_aggs([spatial_agg(df.iloc[:2]), spatial_agg(df.iloc[2:])])
+    std = merged.xs("std", level="stat")
+
+    assert std["temperature"].isna().all()
+    assert std.loc[(40.0, 40.0), "pressure"] == np.std([1001.0, 1003.0], ddof=1)
+
+
+def test_merge_stats_groups_by_keys():
+    hourly = pd.concat([spatial_agg(readings(1000, h)) for h in range(4)], keys=pd.Index(range(4), name="hour"))
+    first_half = lambda index: {"half": index.get_level_values("hour") < 2, "lat": index.get_level_values("lat"),
+                                "lng": index.get_level_values("lng")}
+
+    merged = merge_stats(hourly, first_half)
+
+    assert merged.index.names == ["half", "lat", "lng", "stat"]
+    expected = spatial_agg(pd.concat([readings(1000, h) for h in range(2)], ignore_index=True))
+    assert_stats_equal(merged.xs(True, level="half"), expected)
+
+
+def test_merge_stats_pools_comoments():
+    parts = [readings(2000, seed) for seed in range(3)]
+
+    merged = merge_spatial_aggs([spatial_agg(df, comoments=True) for df in parts])
+    expected = spatial_agg(pd.concat(parts, ignore_index=True), comoments=True)
+
+    pairs = ["pair_count|pressure", "pair_mean|pressure", "pair_m2|pressure", "comoment|pressure"]
+    assert_stats_equal(merged, expected, pairs, cols=["temperature"])
+
+
+def test_coarsen_agg_matches_direct_aggregation():
+    df = readings(5000, 0)
+
+    coarse = coarsen_agg(spatial_agg(df, deg=0.5), 2.5, base_deg=0.5)
+
+    assert_stats_equal(coarse, spatial_agg(df, deg=2.5))
@@ -0,0 +1,53 @@
+import gzip
+from concurrent.futures import ThreadPoolExecutor
+from udidata.dir import pack
+
+
+def make_packs(tmp_path, n):
+    folders = []
+    for i in range(n):
+        folder = tmp_path / f"{i:02d}"
+        folder.mkdir()
+        pack.write_pack(pack.pack_path(str(folder)), {"00.csv": f"a,b\n{i},{i}\n".encode(), "01.csv": b"a,b\n1,2"})
+        folders.append(str(folder))
+    return folders
+
+
+def test_member_rows_without_trailing_newline():
+    assert pack.member_rows("00.csv", b"a,b\n1,2\n3,4\n") == 2
+    assert pack.member_rows("00.csv", b"a,b\n1,2\n3,4") == 2
+    assert pack.member_rows("00.csv.gz", gzip.compress(b"a,b\n1,2")) == 1
+    assert pack.member_rows("00.csv", b"a,b") == 0
+    assert pack.member_rows("00.csv", b"") == 0
+    assert pack.member_rows("20170505_daily_agg.csv", b"a,b\n1,2\n") is None
+
+
+def test_open_packs_are_bounded(tmp_path, monkeypatch):
+    monkeypatch.setattr(pack, "MAX_OPEN_PACKS", 3)
+    folders = make_packs(tmp_path, 6)
+
+    first = pack.open_pack(folders[0])[1]
+    for folder in folders[1:]:
+        pack.open_pack(folder)
+
+    assert len(pack._open_packs) == 3
+    assert first.closed
+    # an evicted pack is opened again when it's needed
+    assert pack.read_member(folders[0], "00.csv") == b"a,b\n0,0\n"
+
+    for folder in folders:
+        pack.close_pack(folder)
+
+
+def test_concurrent_reads(tmp_path, monkeypatch):
+    monkeypatch.setattr(pack, "MAX_OPEN_PACKS", 2)
+    folders = make_packs(tmp_path, 8)
+
+    with ThreadPoolExecutor(8) as pool:
+        data = list(pool.map(lambda i: pack.read_member(folders[i % 8], "00.csv"), range(400)))
+
+    assert data == [f"a,b\n{i % 8},{i % 8}\n".encode() for i in range(400)]
+    assert len(pack._open_packs) <= 2
+
+    for folder in folders:
+        pack.close_pack(folder)
@@ -0,0 +1,42 @@
+import base64
+import struct
+import zlib
+import numpy as np
+import pandas as pd
+from udidata.plot import plot, plot_utils
+
+
+def decode_png(uri):
+    png = base64.b64decode(uri.split(",", 1)[1])
+    width, height = struct.unpack(">II", png[16:24])
+    size = struct.unpack(">I", png[33:37])[0]
+    rows = np.frombuffer(zlib.decompress(png[41:41+size]), dtype=np.uint8).reshape(height, width * 4 + 1)
+    return rows[:, 1:].reshape(height, width, 4)
+
+
+def test_mercator_round_trip():
+    lat = np.array([-85, -60, 0, 45, 85])
+    assert np.allclose(plot_utils.mercator_lat(plot_utils.mercator_y(lat)), lat)
+    assert np.isclose(plot_utils.mercator_y(plot_utils.MERCATOR_LAT), 180, atol=1e-3)
+    assert np.isnan(plot_utils.mercator_y(89))
+
+
+def test_png_image_rows_and_transparency():
+    raster = np.array([[0.0, np.nan], [1.0, 1.0]])
+    rgba = decode_png(plot_utils.png_image(raster, "greys", 0, 1))
+
+    # the first raster row is the bottom of the image
+    assert (rgba[1, 0] != rgba[0, 0]).any()
+    assert rgba[1, 1, 3] == 0
+    assert (rgba[0, :, 3] == 255).all()
+
+
+def test_raster_geo_is_a_map_layer():
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({"lat": rng.uniform(-90, 90, 5000), "lng": rng.uniform(-180, 180, 5000)})
+    fig = plot.raster_geo(df, shape=(30, 60))
+
+    layer = fig.layout.map.layers[0]
+    assert layer.sourcetype == "image"
+    assert decode_png(layer.source).shape == (30, 60, 4)
+    assert fig.data[0].type == "scattermap"
@@ -0,0 +1,57 @@
+import numpy as np
+from udidata.calculate.rolling import RollingMoments
+
+
+def periods(n, shape, seed=0):
+    """
+    Readings of n periods, and their count, mean, std per cell
+    """
+    rng = np.random.default_rng(seed)
+    data = [rng.normal(rng.uniform(-5, 5), 2, (rng.integers(0, 6),) + shape) for _ in range(n)]
+    stats = []
+    for values in data:
+        count = np.full(shape, float(len(values)))
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = values.mean(axis=0) if len(values) else np.full(shape, np.nan)
+            std = values.std(axis=0, ddof=1) if len(values) > 1 else np.full(shape, np.nan)
+        stats.append((count, mean, std))
+    return data, stats
+
+
+def test_window_matches_readings_of_the_window():
+    shape, window = (2, 3), 4
+    data, stats = periods(20, shape)
+    rolling = RollingMoments(window, shape, resync=1000)
+
+    for i, period in enumerate(stats):
+        count, mean, std = rolling.add(*period)
+        values = np.concatenate(data[max(i-window+1, 0):i+1])
+
+        assert (count == len(values)).all()
+        if len(values) > 0:
+            np.testing.assert_allclose(mean, values.mean(axis=0), rtol=1e-9)
+        if len(values) > 1:
+            np.testing.assert_allclose(std, values.std(axis=0, ddof=1), rtol=1e-7)
+        else:
+            assert np.isnan(std).all()
+
+
+def test_recompute_matches_incremental():
+    shape = (3,)
+    _, stats = periods(30, shape, seed=1)
+    incremental = RollingMoments(5, shape, resync=1000)
+    resynced = RollingMoments(5, shape, resync=1)
+
+    for period in stats:
+        a = incremental.add(*period)
+        b = resynced.add(*period)
+
+    for x, y in zip(a, b):
+        np.testing.assert_allclose(x, y, rtol=1e-9, equal_nan=True)
+
+
+def test_empty_window_has_no_mean():
+    rolling = RollingMoments(2, (1,))
+    count, mean, std = rolling.add(np.array([np.nan]), np.array([np.nan]), np.array([np.nan]))
+
+    assert count[0] == 0 and np.isnan(mean[0]) and np.isnan(std[0])
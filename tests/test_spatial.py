@@ -0,0 +1,26 @@
+import numpy as np
+from udidata.calculate.spatial import SpatialIndex, EARTH_RADIUS
+
+
+def test_query_knn_empty_index():
+    index = SpatialIndex([np.nan], [10.0])
+    distances, positions = index.query_knn([0, 1], [0, 1], k=3)
+
+    assert len(index) == 0
+    assert distances.shape == positions.shape == (2, 3)
+    assert np.isinf(distances).all()
+    assert (positions == -1).all()
+
+
+def test_query_knn_caps_k_and_skips_nan_points():
+    index = SpatialIndex([0, np.nan, 0], [0, 5, 90])
+    distances, positions = index.query_knn([0, np.nan], [1, 1], k=4)
+
+    assert positions.tolist() == [[0, 2, -1, -1], [-1, -1, -1, -1]]
+    assert np.isclose(distances[0, 0], EARTH_RADIUS * np.radians(1))
+    assert np.isinf(distances[0, 2:]).all() and np.isinf(distances[1]).all()
+
+
+def test_query_radius():
+    index = SpatialIndex([0, 0, 0], [0, 1, 3])
+    assert [p.tolist() for p in index.query_radius(0, 0.5, 100)] == [[0, 1]]
@@ -0,0 +1,45 @@
+import numpy as np
+import pandas as pd
+from udidata.load.spill import PartitionedFrame, PartitionedGroupBy, spill_frame
+
+
+def partitions(seed=0):
+    rng = np.random.default_rng(seed)
+    parts = []
+    for n in [300, 1, 500]:
+        parts.append(pd.DataFrame({"key": rng.choice(["a", "b", "c"], n), "x": rng.normal(10, 3, n), "y": rng.normal(size=n)}))
+    parts[0].loc[::7, "x"] = np.nan
+    return parts
+
+
+def test_groupby_agg_matches_pandas(tmp_path):
+    parts = partitions()
+    # one partition spilled to disk, the others in memory
+    frame = PartitionedFrame([parts[0], spill_frame(parts[1], str(tmp_path / "1")), parts[2]], ["key", "x", "y"])
+
+    result = frame.groupby("key").agg(PartitionedGroupBy.funcs)
+    expected = pd.concat(parts, ignore_index=True).groupby("key").agg(PartitionedGroupBy.funcs)
+
+    pd.testing.assert_frame_equal(result, expected[result.columns], check_dtype=False, check_names=False)
+
+
+def test_groupby_agg_of_filtered_columns():
+    parts = partitions(1)
+    frame = PartitionedFrame(parts, ["key", "x", "y"])
+
+    result = frame[["key", "x"]].filter({"x": (5, 15)}).groupby("key").agg(["count", "mean"])
+    df = pd.concat(parts, ignore_index=True)
+    expected = df[df["x"].between(5, 15)].groupby("key")[["x"]].agg(["count", "mean"])
+
+    pd.testing.assert_frame_equal(result, expected, check_dtype=False, check_names=False)
+
+
+def test_groupby_agg_of_groups_with_fewer_than_two_values():
+    parts = [pd.DataFrame({"key": ["a", "a", "b", "c"], "x": [np.nan, np.nan, 1.0, 2.0]}),
+             pd.DataFrame({"key": ["a", "c"], "x": [np.nan, 4.0]})]
+
+    result = PartitionedFrame(parts, ["key", "x"]).groupby("key").agg(["count", "var", "std"])
+
+    assert result[("x", "var")].isna().tolist() == [True, True, False]
+    assert result[("x", "std")].isna().tolist() == [True, True, False]
+    assert result.loc["c", ("x", "var")] == 2.0
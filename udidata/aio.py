@@ -0,0 +1,195 @@
+"""
+asyncio counterparts of the loaders, for serving data from an event loop (dashboards, web apps).
+Blocking reads run in a bounded thread pool, identical requests in flight are coalesced into one read,
+and the number of concurrent reads per backend (raw data, aggregated data) is limited, for example:
+
+    from udidata import aio
+    df, agg = await asyncio.gather(aio.day("2017/05/05", columns=["lat", "lng", "temperature"]),
+                                   aio.agg_day("2017/05/05"))
+
+Coalesced requests get the same result object, it shouldn't be modified in place.
+"""
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from . import load
+
+
+#######################################################################################################################
+
+# default limits of concurrent reads per backend
+LIMITS = {"raw": 4, "agg": 16}
+
+
+#######################################################################################################################
+
+def freeze(value):
+    """
+    Converts arguments to a hashable request key, None if they can't be (such requests are not coalesced)
+    """
+    if isinstance(value, (list, tuple)):
+        items = [freeze(v) for v in value]
+        return None if any(item is None and v is not None for item, v in zip(items, value)) else (type(value).__name__, *items)
+    if isinstance(value, dict):
+        items = freeze(sorted(value.items(), key=repr))
+        return None if items is None else ("dict", items)
+    if isinstance(value, (set, frozenset)):
+        return frozenset(value)
+    if isinstance(value, type({}.values())):
+        return freeze(list(value))
+
+    try:
+        hash(value)
+    except TypeError:
+        return None
+    return value
+
+
+#######################################################################################################################
+
+class DataService:
+    """
+    Runs blocking loader calls for coroutines
+
+    Parameters
+    ----------
+    max_workers : int, default 8
+        Size of the thread pool reads run in
+
+    limits : dict, default None
+        Maximum concurrent reads per backend, updates LIMITS
+    """
+
+    def __init__(self, max_workers=8, limits=None):
+        self.max_workers = max_workers
+        self.executor = ThreadPoolExecutor(max_workers, thread_name_prefix="udidata")
+        self.limits = {**LIMITS, **(limits or {})}
+
+        # by event loop: semaphores by backend and futures of requests in flight by key
+        self._semaphores = {}
+        self._in_flight = {}
+
+    def semaphore(self, backend):
+        loop = asyncio.get_running_loop()
+        key = (loop, backend)
+        if key not in self._semaphores:
+            self._semaphores[key] = asyncio.Semaphore(self.limits.get(backend, self.max_workers))
+        return self._semaphores[key]
+
+    async def run(self, backend, func, *args, **kwargs):
+        """
+        Runs func(*args, **kwargs) in the thread pool and returns its result. If the same call is already running,
+        its result is awaited instead of reading again
+
+        Parameters
+        ----------
+        backend : str
+            Name of the storage backend the call reads from, concurrent calls per backend are limited
+        """
+        loop = asyncio.get_running_loop()
+        request = freeze((func.__module__, func.__qualname__, args, kwargs))
+
+        if request is None:
+            return await self._run(backend, func, args, kwargs)
+
+        key = (loop, request)
+        future = self._in_flight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self._run(backend, func, args, kwargs))
+            self._in_flight[key] = future
+            future.add_done_callback(lambda _: self._in_flight.pop(key, None))
+
+        # shield, so one caller being cancelled doesn't cancel the read for the others
+        return await asyncio.shield(future)
+
+    async def _run(self, backend, func, args, kwargs):
+        async with self.semaphore(backend):
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, functools.partial(func, *args, **kwargs))
+
+    def close(self):
+        """
+        Shuts down the thread pool
+        """
+        self.executor.shutdown(wait=False)
+
+    # loaders, arguments are the same as the blocking versions
+
+    async def day(self, date, **kwargs):
+        """ see load.raw.day """
+        return await self.run("raw", load.raw.day, date, **kwargs)
+
+    async def days(self, date_range, **kwargs):
+        """ see load.raw.days """
+        return await self.run("raw", load.raw.days, tuple(date_range), **kwargs)
+
+    async def agg_day(self, date, **kwargs):
+        """ see load.agg.day """
+        return await self.run("agg", load.agg.day, date, **kwargs)
+
+    async def agg_hourly(self, date, **kwargs):
+        """ see load.agg.hourly """
+        return await self.run("agg", load.agg.hourly, date, **kwargs)
+
+    async def agg_month(self, year, month, **kwargs):
+        """ see load.agg.month """
+        return await self.run("agg", load.agg.month, year, month, **kwargs)
+
+    async def agg_year(self, year, **kwargs):
+        """ see load.agg.year """
+        return await self.run("agg", load.agg.year, year, **kwargs)
+
+    async def dataset(self, date_range, **kwargs):
+        """ see load.agg.dataset """
+        return await self.run("agg", load.agg.dataset, tuple(date_range), **kwargs)
+
+    async def query(self, variables, **kwargs):
+        """ see load.query """
+        return await self.run("agg", load.query, variables, **kwargs)
+
+
+#######################################################################################################################
+
+_default_service = None
+
+
+def default_service():
+    """
+    Returns the service used by the module level functions, created on first use
+    """
+    global _default_service
+    if _default_service is None:
+        _default_service = DataService()
+    return _default_service
+
+
+async def day(date, **kwargs):
+    return await default_service().day(date, **kwargs)
+
+
+async def days(date_range, **kwargs):
+    return await default_service().days(date_range, **kwargs)
+
+
+async def agg_day(date, **kwargs):
+    return await default_service().agg_day(date, **kwargs)
+
+
+async def agg_hourly(date, **kwargs):
+    return await default_service().agg_hourly(date, **kwargs)
+
+
+async def agg_month(year, month, **kwargs):
+    return await default_service().agg_month(year, month, **kwargs)
+
+
+async def agg_year(year, **kwargs):
+    return await default_service().agg_year(year, **kwargs)
+
+
+async def dataset(date_range, **kwargs):
+    return await default_service().dataset(date_range, **kwargs)
+
+
+async def query(variables, **kwargs):
+    return await default_service().query(variables, **kwargs)
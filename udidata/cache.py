@@ -0,0 +1,212 @@
+import os
+import pickle
+import hashlib
+import tempfile
+import inspect
+import functools
+import numpy as np
+from . import settings
+from .dir import pack
+from .load.spill import parse_size
+
+
+#######################################################################################################################
+
+# A persistent memoization layer for expensive results (calculate.agg).
+# Entries are keyed on the function name, its arguments, fingerprints (path, mtime, size) of its input files
+# and a hash of the package source, so an entry goes stale as soon as an input file or the code changes. Entries are pickled to settings.CACHE_DIR,
+# which is capped at settings.CACHE_SIZE by evicting least recently used entries.
+
+SUFFIX = ".pkl"
+
+
+#######################################################################################################################
+
+def is_plain(value):
+    """
+    Checks if value can be part of a cache key: None, bool, number, str, or lists, tuples and dicts of them
+    """
+    if value is None or isinstance(value, (bool, int, float, str, np.integer, np.floating, np.str_)):
+        return True
+    if isinstance(value, (list, tuple)):
+        return all(map(is_plain, value))
+    if isinstance(value, dict):
+        return all(map(is_plain, value.keys())) and all(map(is_plain, value.values()))
+    return False
+
+
+def is_cacheable(arguments):
+    """
+    Checks if a call can be cached. Stateful arguments (like a shared SeenIds or a random Generator)
+    and random samples without a seed are not cached
+    """
+    random = arguments.get("sample") is not None or arguments.get("per_cell") is not None
+    if random and arguments.get("seed") is None:
+        return False
+    return all(map(is_plain, arguments.values()))
+
+
+def normalize(value):
+    """
+    Converts a plain value (see is_plain) to python types, so equal arguments have the same key
+    """
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (list, tuple)):
+        return tuple(map(normalize, value))
+    if isinstance(value, dict):
+        return sorted((normalize(k), normalize(v)) for k, v in value.items())
+    return value
+
+
+#######################################################################################################################
+
+@functools.lru_cache(maxsize=None)
+def code_version():
+    """
+    Returns a hex digest of the source files of the package, entries of older code don't match after an upgrade
+    """
+    root = os.path.dirname(os.path.abspath(__file__))
+    digest = hashlib.sha256()
+
+    for folder, dirs, files in sorted(os.walk(root)):
+        dirs.sort()
+        for name in sorted(files):
+            if name.endswith(".py"):
+                path = os.path.join(folder, name)
+                digest.update(os.path.relpath(path, root).encode())
+                with open(path, "rb") as f:
+                    digest.update(f.read())
+
+    return digest.hexdigest()
+
+
+def make_key(func, arguments, input_paths):
+    """
+    Returns the cache key of a call, a hex digest of the code version, function name, arguments and input fingerprints
+    """
+    arguments = sorted((name, normalize(value)) for name, value in arguments.items())
+    content = repr((code_version(), f"{func.__module__}.{func.__qualname__}", arguments, [pack.fingerprint(path) for path in input_paths]))
+    return hashlib.sha256(content.encode()).hexdigest()
+
+
+#######################################################################################################################
+
+def cached(inputs):
+    """
+    Decorator, caches results of the decorated function on disk
+
+    Parameters
+    ----------
+    inputs : function
+        Takes in the arguments of the decorated function (as keyword arguments) and returns a list of paths
+        of the files the result is calculated from
+
+    Returns
+    -------
+    decorator : function
+        The decorated function has an uncached attribute, the original function
+    """
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+
+            if settings.CACHE_DIR is None or not is_cacheable(bound.arguments):
+                return func(*args, **kwargs)
+
+            key = make_key(func, bound.arguments, inputs(**bound.arguments))
+            path = os.path.join(settings.CACHE_DIR, key + SUFFIX)
+
+            result = read_entry(path)
+            if result is None:
+                result = func(*args, **kwargs)
+                if result is not None:
+                    write_entry(path, result)
+
+            return result
+
+        wrapper.uncached = func
+        return wrapper
+
+    return decorator
+
+
+#######################################################################################################################
+
+def read_entry(path):
+    """
+    Returns a cached result, None if there's no entry (or it can't be read). Reading an entry marks it as recently used
+    """
+    try:
+        with open(path, "rb") as f:
+            result = pickle.load(f)
+    except (OSError, EOFError, pickle.UnpicklingError):
+        return None
+
+    os.utime(path)
+    return result
+
+
+def write_entry(path, result):
+    """
+    Writes a result to the cache, then evicts least recently used entries if the cache is over its size
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    # write to a unique temp file and replace, so concurrent readers never see half an entry
+    # and concurrent writers (threads or processes) never share a temp file
+    with tempfile.NamedTemporaryFile(dir=os.path.dirname(path), prefix=os.path.basename(path), suffix=".tmp", delete=False) as f:
+        pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(f.name, path)
+
+    evict(settings.CACHE_SIZE)
+
+
+#######################################################################################################################
+
+def entries():
+    """
+    Returns a list of (mtime, size, path) of cache entries, least recently used first
+    """
+    if settings.CACHE_DIR is None or not os.path.isdir(settings.CACHE_DIR):
+        return []
+
+    found = []
+    for entry in os.scandir(settings.CACHE_DIR):
+        if entry.name.endswith(SUFFIX):
+            stat = entry.stat()
+            found.append((stat.st_mtime_ns, stat.st_size, entry.path))
+
+    return sorted(found)
+
+
+def evict(max_size):
+    """
+    Deletes least recently used entries until the cache size is at most max_size (bytes or a string like "2GB")
+    """
+    found = entries()
+    total = sum(size for mtime, size, path in found)
+    max_size = parse_size(max_size)
+
+    for mtime, size, path in found:
+        if total <= max_size:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        total -= size
+
+
+def clear():
+    """
+    Deletes all cache entries
+    """
+    evict(0)
+
+
+#######################################################################################################################
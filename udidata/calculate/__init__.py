@@ -1,2 +1,11 @@
 from . import agg
-from . import fft
\ No newline at end of file
+from . import merge
+from . import sample
+from . import local_hour
+from . import pyramid
+from . import fft
+from . import resample
+from . import spatial
+from . import rolling
+from . import corr
+from . import climatology
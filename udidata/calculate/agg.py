@@ -1,12 +1,22 @@
 import numpy as np
 import pandas as pd
 from .. import load
-from ..dir.utils import get_hours_with_data, data_exists, generate_date_list, get_relevant_hours, get_day_folder_path, get_month_range
+from ..dir.utils import get_hours_with_data, data_exists, generate_date_list, get_relevant_hours, get_month_range, \
+    get_day_folder_path, generate_hour_list, add_lead_zero
 from ..utils.df_utils import count_na
+from ..utils.grid import grid_cells, check_grid
+from ..utils.dedupe import as_seen_ids
+from ..dir import pack
+from ..settings import EXTENSION
+from ..cache import cached
+from ..load.backends import as_pandas
+from .corr import comoment_stats, pair_stat
+from .merge import merge_spatial_aggs
+from .sample import check_sampling, add_sample_error
 
 #######################################################################################################################
 
-def spatial_agg(df, deg=2.5): 
+def spatial_agg(df, deg=2.5, sample=None, seed=None, confidence=0.95, grid="latlng", comoments=False, per_cell=None): 
     """
     For a given df calculate aggregation (count, mean, median, std, min, max) 
     for data variables (temperature, pressure, humidity, magnetic_tot)
@@ -19,6 +29,29 @@ def spatial_agg(df, deg=2.5):
     
     deg: int or float, default 2.5
         Spatial degree interval for for latitude and longitude data
+
+    sample: float, default None
+        Approximate aggregation from a fraction of rows, in (0, 1]. Sampled aggregations have count and na_count
+        estimates of the full data, and mean_ci, count_ci statistics: half widths of confidence intervals of mean and count.
+        A df loaded with a sample (see load.day) is treated as sampled too
+
+    seed: int or numpy Generator, default None
+        Seed of the sample
+
+    confidence: float, default 0.95
+        Confidence level of mean_ci and count_ci
+
+    grid: "latlng" or "equal_area", default "latlng"
+        Grid of cells: deg x deg latitude/longitude cells labeled by their lower edge, or equal area cells
+        (see utils.grid) labeled by their centroid
+
+    comoments: bool, default False
+        If True, pairwise co-moments of the variables are kept too (see calculate.corr), they merge exactly
+        across hours, days and months and give covariance and correlation (calculate.corr.covariance, correlation)
+
+    per_cell: int, default None
+        Approximate aggregation from at most per_cell random rows of every cell (reservoir), full counts are known.
+        Can't be combined with sample
     
     Returns
     -------
@@ -29,7 +62,27 @@ def spatial_agg(df, deg=2.5):
         Series with count of data points for every location
     """
     # Group data points by lat, lng categories
-    df = df.discretize_latlng(deg=deg)
+    check_grid(grid)
+    df = as_pandas(df)
+    if grid == "latlng":
+        df = df.discretize_latlng(deg=deg)
+    else:
+        lat_cat, lng_cat = grid_cells(df["lat"], df["lng"], deg, grid)
+        df = df.drop(["lat", "lng"], axis=1).assign(lat_cat=lat_cat, lng_cat=lng_cat)
+
+    fraction = df.attrs.get("sample")
+    population = None
+    check_sampling(sample, per_cell, fraction)
+    if per_cell is not None:
+        # keep per_cell random rows of every cell, full counts are known
+        rng = np.random.default_rng(seed)
+        population = df.groupby(by=["lat_cat","lng_cat"], observed=True).size()
+        shuffled = df.iloc[rng.permutation(len(df))]
+        df = shuffled[shuffled.groupby(by=["lat_cat","lng_cat"], observed=True).cumcount().to_numpy() < per_cell]
+    elif sample is not None:
+        rng = np.random.default_rng(seed)
+        df = df[rng.random(len(df)) < sample]
+        fraction = sample * (fraction or 1)
 
     # create a groupby object grouped by lat, lng categories
     grouped = df.groupby(by=["lat_cat","lng_cat"])
@@ -45,8 +98,15 @@ def spatial_agg(df, deg=2.5):
     # group by regular statistics
     agg = grouped.agg(["mean","median","std","min","max","count"])
 
+    agg = agg.join([na_cnt, na_pct])
+    if comoments:
+        cols = [col for col in df.columns if col not in ["lat_cat", "lng_cat"]]
+        agg = agg.join(comoment_stats(df, [df["lat_cat"], df["lng_cat"]], cols))
+    if fraction is not None or population is not None:
+        agg = add_sample_error(agg, grouped.size(), fraction, population, confidence)
+
     # join all groups and reshape dataframe so it has statistics as index not columns
-    agg = agg.join([na_cnt, na_pct]).T.unstack().T
+    agg = agg.T.unstack().T
 
     # rename indices and columns for readability
     agg.columns.names = ["atmos"]
@@ -57,7 +117,59 @@ def spatial_agg(df, deg=2.5):
 
 #######################################################################################################################
 
-def spatial_hour_agg(date, hour, cols=["temperature", "pressure", "humidity", "magnetic_tot"]):
+def agg_dataset(aggs):
+    """
+    Converts aggregated DataFrames of several dates into an xarray Dataset with (date, stat, cell) dimensions
+    and lat, lng coordinates of every cell. Works for any grid (load.agg.dataset reads latitude/longitude grids only),
+    plot.scatter_geo can plot it, cells are plotted at their lat, lng labels (centroids for the equal area grid)
+
+    Parameters
+    ----------
+    aggs: dict
+        Dates as keys, aggregated DataFrames (lat, lng and stat index) as values
+
+    Returns
+    -------
+    ds: xarray Dataset
+    """
+    import xarray as xr
+
+    df = pd.concat(aggs, names=["date"])
+    dates = pd.Index(pd.to_datetime([str(date).replace("/", "-") for date in aggs]))
+    date_idx = np.repeat(np.arange(len(aggs)), [len(agg) for agg in aggs.values()])
+
+    cell_keys = df.index.droplevel(["date", "stat"])
+    cells = cell_keys.unique()
+    stats = df.index.get_level_values("stat").unique()
+
+    pos = (date_idx, stats.get_indexer(df.index.get_level_values("stat")), cells.get_indexer(cell_keys))
+
+    data = {}
+    for prop in df.columns:
+        values = np.full((len(dates), len(stats), len(cells)), np.nan)
+        values[pos] = df[prop].to_numpy(dtype=float)
+        data[prop] = (("date", "stat", "cell"), values)
+
+    coords = {"date": dates, "stat": list(stats),
+              "lat": ("cell", cells.get_level_values("lat").to_numpy(dtype=float)),
+              "lng": ("cell", cells.get_level_values("lng").to_numpy(dtype=float))}
+
+    return xr.Dataset(data, coords=coords)
+
+
+#######################################################################################################################
+
+def hour_inputs(date, hour_range, **kwargs):
+    """
+    Input files of hourly aggregations (for the cache): hourly data files of date in hour_range
+    """
+    hours = np.intersect1d(generate_hour_list(hour_range), get_hours_with_data(date))
+    return [f"{get_day_folder_path(date)}{add_lead_zero(h)}.{EXTENSION}" for h in hours]
+
+
+@cached(lambda date, hour, **kwargs: hour_inputs(date, hour))
+def spatial_hour_agg(date, hour, cols=["temperature", "pressure", "humidity", "magnetic_tot"], deg=2.5, dedupe=False, sample=None, seed=None,
+                     grid="latlng", comoments=False, per_cell=None):
     """
     Get spatial aggregations for a specific hour in a specific date.
 
@@ -68,6 +180,27 @@ def spatial_hour_agg(date, hour, cols=["temperature", "pressure", "humidity", "m
 
     hour: str or int
         Range 0-23
+
+    deg: int or float, default 2.5
+        Spatial degree interval for for latitude and longitude data
+
+    dedupe: bool or utils.dedupe.SeenIds, default False
+        Drop readings with an _id that was already seen, see load.day
+
+    sample: float, default None
+        Approximate aggregation from a fraction of rows, see spatial_agg. Rows are sampled while loading
+
+    seed: int or numpy Generator, default None
+        Seed of the sample
+
+    grid: "latlng" or "equal_area", default "latlng"
+        Grid of cells, see spatial_agg
+
+    comoments: bool, default False
+        Keep pairwise co-moments, see spatial_agg
+
+    per_cell: int, default None
+        Approximate aggregation from at most per_cell rows of every cell, see spatial_agg
     
     Returns
     -------
@@ -81,12 +214,13 @@ def spatial_hour_agg(date, hour, cols=["temperature", "pressure", "humidity", "m
     if data_exists(date,hour):
         
         # load data set with one hour data
-        df_hour = load.day(date, columns=["lat", "lng"]+cols, hour_range=hour)
+        check_sampling(sample, per_cell)
+        df_hour = load.day(date, columns=["lat", "lng"]+cols, hour_range=hour, dedupe=dedupe, sample=sample, seed=seed)
     
         # in case load.day return None
         if isinstance(df_hour, pd.DataFrame):
 
-            return spatial_agg(df_hour)
+            return spatial_agg(df_hour, deg=deg, seed=seed, grid=grid, comoments=comoments, per_cell=per_cell)
 
     else:
         pass
@@ -94,7 +228,9 @@ def spatial_hour_agg(date, hour, cols=["temperature", "pressure", "humidity", "m
 
 #######################################################################################################################
 
-def hourly_spatial_agg(date, hour_range=(0,23), cols=["temperature", "pressure", "humidity", "magnetic_tot"]):
+@cached(hour_inputs)
+def hourly_spatial_agg(date, hour_range=(0,23), cols=["temperature", "pressure", "humidity", "magnetic_tot"], deg=2.5, dedupe=False,
+                       sample=None, seed=None, grid="latlng", comoments=False, per_cell=None):
     """
     For a certain date, get hourly aggregations and count for the desired columns. For available hours.
 
@@ -102,12 +238,36 @@ def hourly_spatial_agg(date, hour_range=(0,23), cols=["temperature", "pressure",
     ----------
     hour_range: int or tuple of int, default (0,23)
         Range of hours of the day to return
+
+    deg: int or float, default 2.5
+        Spatial degree interval for for latitude and longitude data
+
+    dedupe: bool or utils.dedupe.SeenIds, default False
+        If True, readings with an _id that already appeared in an earlier hour are dropped
+
+    sample: float, default None
+        Approximate aggregation from a fraction of rows, see spatial_agg
+
+    seed: int or numpy Generator, default None
+        Seed of the sample
+
+    grid: "latlng" or "equal_area", default "latlng"
+        Grid of cells, see spatial_agg
+
+    comoments: bool, default False
+        Keep pairwise co-moments, see spatial_agg
+
+    per_cell: int, default None
+        Approximate aggregation from at most per_cell rows of every cell, see spatial_agg
     """
     
     relevant_hours = get_relevant_hours(date, hour_range, return_type="int")
+    seen = as_seen_ids(dedupe)
+    check_sampling(sample, per_cell)
+    rng = None if sample is None and per_cell is None else np.random.default_rng(seed)
     
     # list of tuples of dataframes with hour agg and count data
-    hour_dfs = [spatial_hour_agg(date, h, cols) for h in relevant_hours]
+    hour_dfs = [spatial_hour_agg(date, h, cols, deg, seen, sample, rng, grid, comoments, per_cell) for h in relevant_hours]
     
     # create an index of given hours, for concatanation
     hour_idx = pd.Index(np.array(relevant_hours, dtype=np.int32), name="hour")
@@ -120,11 +280,74 @@ def hourly_spatial_agg(date, hour_range=(0,23), cols=["temperature", "pressure",
 
 #######################################################################################################################
 
-def monthly_spatial_agg(year, month):
+def with_comoments(agg, parts):
+    """
+    Adds the merged pairwise co-moments of parts (aggregated DataFrames of the sub periods) to agg
+    """
+    merged = merge_spatial_aggs(parts)
+    pairs = merged[merged.index.get_level_values("stat").str.contains("|", regex=False)]
+    if pairs.empty:
+        raise ValueError("The agg files have no co-moments, aggregate them with comoments=True")
+
+    return pd.concat([agg, pairs, self_comoments(merged)]).sort_index()
+
+
+def self_comoments(merged):
+    """
+    Co-moments of every variable with itself (its variance over all readings, the diagonal of calculate.corr.covariance)
+    of merged reading level aggs, for variables that don't have them yet. Monthly and yearly aggs keep the std of
+    daily means, so their diagonal comes from these
+    """
+    wide = merged.unstack("stat")
+
+    self_pairs = {}
+    for a in merged.columns:
+        if (a, pair_stat("comoment", a)) in wide.columns:
+            continue
+        count = wide[(a, "count")]
+        m2 = (wide[(a, "std")]**2 * (count - 1)).where(count > 1)
+        for stat, values in [("pair_count", count), ("pair_mean", wide[(a, "mean")]), ("pair_m2", m2), ("comoment", m2)]:
+            self_pairs[(a, pair_stat(stat, a))] = values
+
+    if len(self_pairs) == 0:
+        return None
+
+    self_pairs = pd.DataFrame(self_pairs)
+    self_pairs.columns.names = ["atmos", "stat"]
+    self_pairs = self_pairs.stack("stat")
+    self_pairs.columns.names = ["atmos"]
+    return self_pairs.reindex(columns=merged.columns)
+
+
+#######################################################################################################################
+
+def reduce_atmos(df, stat):
+    """
+    Reduces the (period, atmos) columns of df to one column per atmos with stat (sum, count, std, min, max, median),
+    like DataFrame.<stat>(axis=1, level="atmos") of older pandas
+    """
+    return df.T.groupby(level="atmos").agg(stat).T
+
+
+#######################################################################################################################
+
+@cached(lambda year, month, deg, **kwargs: [load.agg.day_path(date, deg) for date in get_month_range(year, month)])
+def monthly_spatial_agg(year, month, deg=None, comoments=False):
     
     """
+    Parameters
+    ----------
+    deg: int or float, default None
+        Grid resolution level of the daily agg files to aggregate. If None, the original agg files are used
+
+    comoments: bool, default False
+        If True, pairwise co-moments of the daily agg files (see spatial_agg) are merged into the month too
     """
-    dates = get_month_range(year, month)
+    # days with an agg file, days of a month in progress might not have one yet
+    dates = [date for date in get_month_range(year, month) if pack.exists(load.agg.day_path(date, deg))]
+    if len(dates) == 0:
+        print(f"No daily agg files for {year}/{month}")
+        return
     
     aggs = []
 
@@ -133,9 +356,7 @@ def monthly_spatial_agg(year, month):
     for date in dates:
 
         # load agg data and append to aggs list
-        path_start = f"{get_day_folder_path(date)}{date.replace('/','')}_"
-
-        agg = pd.read_csv(f"{path_start}daily_agg.csv.gz", index_col=["lat", "lng", "stat"])
+        agg = pack.read_csv(load.agg.day_path(date, deg), index_col=["lat", "lng", "stat"])
 
         aggs.append(agg)
 
@@ -151,13 +372,13 @@ def monthly_spatial_agg(year, month):
 
 
     # perform aggregations
-    total_count = count.sum(axis=1, level="atmos")    # number of data points in the whole month
-    wa = (mean * count).sum(axis=1, level="atmos") / total_count    # weighted average
-    total_days = mean.count(axis=1, level="atmos")
-    std_ = mean.std(axis=1, level="atmos")
-    min_ = mean.min(axis=1, level="atmos")
-    max_ = mean.max(axis=1, level="atmos")
-    med_ = mean.median(axis=1, level="atmos")
+    total_count = reduce_atmos(count, "sum")    # number of data points in the whole month
+    wa = reduce_atmos(mean * count, "sum") / total_count    # weighted average
+    total_days = reduce_atmos(mean, "count")
+    std_ = reduce_atmos(mean, "std")
+    min_ = reduce_atmos(mean, "min")
+    max_ = reduce_atmos(mean, "max")
+    med_ = reduce_atmos(mean, "median")
 
 
     # concat all stats into one data frame and store it
@@ -170,21 +391,39 @@ def monthly_spatial_agg(year, month):
     # reshape
     monthly_agg = monthly_agg.swaplevel(axis=1).T.unstack().T
 
+    if comoments:
+        monthly_agg = with_comoments(monthly_agg, aggs)
+
     return monthly_agg
 
 
 #######################################################################################################################
 
-def yearly_spatial_agg(year):
+@cached(lambda year, deg, **kwargs: [load.agg.month_path(year, month, deg) for month in range(1,13)])
+def yearly_spatial_agg(year, deg=None, comoments=False):
     
     """
+    Parameters
+    ----------
+    deg: int or float, default None
+        Grid resolution level of the monthly agg files to aggregate. If None, the original agg files are used
+
+    comoments: bool, default False
+        If True, pairwise co-moments of the monthly agg files are merged into the year too
     """
     
-    # iterate over 12 months of the year and load monthly agg data
-    aggs = [load.agg.month(year, month) for month in range(1,13)]
+    # iterate over months of the year with an agg file and load monthly agg data
+    months = [month for month in range(1,13) if pack.exists(load.agg.month_path(year, month, deg))]
+    if len(months) == 0:
+        print(f"No monthly agg files for {year}")
+        return
+
+    # all variables of the files, like monthly_spatial_agg (files written by the ingestor may have only some of them)
+    aggs = [pack.read_csv(load.agg.month_path(year, month, deg), index_col=["lat", "lng", "stat"]) for month in months]
     
     # concat all into one dataframe
-    agg = pd.concat(aggs, axis=1, keys=range(1,13), names=["month"])
+    agg = pd.concat(aggs, axis=1, keys=months)
+    agg.columns.names = ["month", "atmos"]
 
     # extract mean, count and days data
     mean = agg.xs("mean", level="stat")
@@ -192,13 +431,13 @@ def yearly_spatial_agg(year):
     days = agg.xs("days", level="stat")
 
     # perform aggregations
-    total_count = count.sum(axis=1, level="atmos")    # number of data points in the whole month
-    wa = (mean * count).sum(axis=1, level="atmos") / total_count    # weighted average
-    total_days = days.sum(axis=1, level="atmos")
-    std_ = mean.std(axis=1, level="atmos")
-    min_ = mean.min(axis=1, level="atmos")
-    max_ = mean.max(axis=1, level="atmos")
-    med_ = mean.median(axis=1, level="atmos")
+    total_count = reduce_atmos(count, "sum")    # number of data points in the whole month
+    wa = reduce_atmos(mean * count, "sum") / total_count    # weighted average
+    total_days = reduce_atmos(days, "sum")
+    std_ = reduce_atmos(mean, "std")
+    min_ = reduce_atmos(mean, "min")
+    max_ = reduce_atmos(mean, "max")
+    med_ = reduce_atmos(mean, "median")
 
     # concat all stats into one data frame and store it
     yearly_agg = pd.concat([wa, std_, min_, max_, med_, total_count, total_days], 
@@ -210,6 +449,9 @@ def yearly_spatial_agg(year):
     # reshape
     yearly_agg = yearly_agg.swaplevel(axis=1).T.unstack().T
 
+    if comoments:
+        yearly_agg = with_comoments(yearly_agg, aggs)
+
 
     return yearly_agg
 
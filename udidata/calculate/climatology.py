@@ -0,0 +1,227 @@
+import json
+import warnings
+import numpy as np
+import pandas as pd
+from .. import load
+
+
+#######################################################################################################################
+
+# Climatology baselines: per cell statistics of the agg archive by period of the year (month or day of year,
+# optionally by hour), stored as a compact cube, and anomalies / z-scores of any dates against them.
+# Daily (or hourly) agg files are accumulated in chunks into mergeable sums, so years of data are never
+# held in memory at once.
+
+BASELINE_STATS = ["count", "mean", "std", "days", "daily_std"]
+
+
+#######################################################################################################################
+
+def period_keys(dates, by="dayofyear"):
+    """
+    Returns the baseline period of every date (0 based) and the number of periods
+
+    Parameters
+    ----------
+    dates : pandas DatetimeIndex
+
+    by : "dayofyear" or "month", default "dayofyear"
+        Day of year ignores leap days: February 29 counts as February 28, so every year has 365 days
+    """
+    if by == "month":
+        return dates.month.to_numpy() - 1, 12
+    if by == "dayofyear":
+        doy = dates.dayofyear.to_numpy()
+        return doy - 1 - (dates.is_leap_year & (doy >= 60)), 365
+    raise ValueError(f"by must be dayofyear or month, got {by}")
+
+
+#######################################################################################################################
+
+def baseline(date_range, by="dayofyear", hourly=False, atmos=load.agg.atmos, deg=None, window=0, chunk_days=31):
+    """
+    Builds a climatology baseline from the daily (or hourly) agg files of date_range
+
+    Parameters
+    ----------
+    date_range : array-like of str
+        A tuple in the form of (start_date, end_date). Dates must be in the following format: yyyy/mm/dd
+
+    by : "dayofyear" or "month", default "dayofyear"
+        Period of the year to group by
+
+    hourly : bool, default False
+        If True, the hourly agg files are read and the baseline is by hour of day too
+
+    atmos : array-like, default ["pressure", "temperature", "humidity", "magnetic_tot"]
+        Atmospheric propeties
+
+    deg : int or float, default None
+        Grid resolution level, see load.agg.dataset
+
+    window : int, default 0
+        Periods before and after every period that are pooled into it (circular), to smooth sparse day of year baselines
+
+    chunk_days : int, default 31
+        Days of agg files read at a time
+
+    Returns
+    -------
+    baseline : xarray Dataset
+        Dimensions (by, [hour], stat, lat, lng), float32, by has only the periods date_range covers (1 based). stat is one of:
+        count (readings), mean (count weighted), std (pooled std of readings), days (days with data)
+        and daily_std (std of daily means, the day to day variability)
+    """
+    import xarray as xr
+
+    freq = "hourly" if hourly else "day"
+    dates = pd.date_range(date_range[0].replace("/", "-"), date_range[-1].replace("/", "-"), freq="D")
+
+    # only periods the date range covers are kept, a full year of hourly periods is too big to hold
+    all_keys, nkeys = period_keys(dates, by)
+    periods = np.unique(all_keys)
+    position = np.full(nkeys, -1)
+    position[periods] = np.arange(len(periods))
+
+    acc, ref = None, None
+    for start in range(0, len(dates), chunk_days):
+        chunk = dates[start:start+chunk_days]
+        ds = load.agg.dataset((chunk[0].strftime("%Y/%m/%d"), chunk[-1].strftime("%Y/%m/%d")), freq, atmos,
+                              stats=["count", "mean", "std"], deg=deg)
+        keys = position[all_keys[start:start+chunk_days]]
+
+        count = np.stack([ds[prop].sel(stat="count").to_numpy() for prop in atmos])
+        mean = np.stack([ds[prop].sel(stat="mean").to_numpy() for prop in atmos])
+        std = np.stack([ds[prop].sel(stat="std").to_numpy() for prop in atmos])
+
+        # sums are taken around a per cell reference (mean of the first chunk), so they don't lose precision
+        if ref is None:
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore", RuntimeWarning)    # cells with no data in the chunk
+                ref = np.nan_to_num(np.nanmean(mean, axis=1, keepdims=True))
+            acc = {name: np.zeros((len(atmos), len(periods)) + mean.shape[2:]) for name in ["n", "s1", "s2", "d", "u1", "u2"]}
+
+        has = (count > 0) & ~np.isnan(mean)
+        n = np.where(has, count, 0)
+        dev = np.where(has, mean - ref, 0)
+        m2 = np.where(has & (count > 1), np.nan_to_num(std**2 * (count - 1)), 0)
+
+        for name, values in [("n", n), ("s1", n*dev), ("s2", m2 + n*dev**2), ("d", has.astype(float)), ("u1", dev), ("u2", dev**2)]:
+            np.add.at(acc[name], (slice(None), keys), values)
+
+    if window:
+        # every period pools its neighbours around the year that the date range covers
+        pooled = {name: np.zeros_like(values) for name, values in acc.items()}
+        for shift in range(-window, window+1):
+            src = position[(periods + shift) % nkeys]
+            dst = np.flatnonzero(src >= 0)
+            for name, values in acc.items():
+                pooled[name][:, dst] += values[:, src[dst]]
+        acc = pooled
+
+    n, d = acc["n"], acc["d"]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        stats = {"count": n,
+                 "mean": np.where(n > 0, acc["s1"] / n, np.nan) + ref,
+                 "std": np.where(n > 1, np.sqrt(np.clip(acc["s2"] - acc["s1"]**2 / n, 0, None) / (n - 1)), np.nan),
+                 "days": d,
+                 "daily_std": np.where(d > 1, np.sqrt(np.clip(acc["u2"] - acc["u1"]**2 / d, 0, None) / (d - 1)), np.nan)}
+
+    # (atmos, by, [hour], stat, lat, lng)
+    cube = np.stack([stats[stat].astype(np.float32) for stat in BASELINE_STATS], axis=-3)
+
+    dims = (by, "hour", "stat", "lat", "lng") if hourly else (by, "stat", "lat", "lng")
+    coords = {by: periods + 1, "stat": BASELINE_STATS, "lat": ds["lat"].to_numpy(), "lng": ds["lng"].to_numpy()}
+    if hourly:
+        coords["hour"] = np.arange(24)
+
+    attrs = {"by": by, "deg": json.dumps(deg), "window": window, "date_range": json.dumps(list(date_range))}
+    return xr.Dataset({prop: (dims, cube[i]) for i, prop in enumerate(atmos)}, coords=coords, attrs=attrs)
+
+
+#######################################################################################################################
+
+def save_baseline(baseline, path):
+    """
+    Saves a baseline (see baseline) to a compressed .npz file
+    """
+    arrays = {f"var_{prop}": baseline[prop].to_numpy() for prop in baseline.data_vars}
+    arrays.update({f"coord_{name}": baseline[name].to_numpy() for name in baseline.coords})
+    meta = {"dims": list(baseline[list(baseline.data_vars)[0]].dims), "attrs": baseline.attrs}
+
+    np.savez_compressed(path, meta=np.array(json.dumps(meta)), **arrays)
+
+
+def load_baseline(path):
+    """
+    Loads a baseline saved by save_baseline
+    """
+    import xarray as xr
+
+    with np.load(path) as f:
+        meta = json.loads(str(f["meta"]))
+        data = {key[len("var_"):]: (meta["dims"], f[key]) for key in f.files if key.startswith("var_")}
+        coords = {key[len("coord_"):]: f[key] for key in f.files if key.startswith("coord_")}
+
+    return xr.Dataset(data, coords=coords, attrs=meta["attrs"])
+
+
+#######################################################################################################################
+
+def anomalies(date_range, baseline, spread="daily_std"):
+    """
+    Anomaly and z-score of the daily (or hourly, for an hourly baseline) mean of every cell, against a baseline.
+    Computed by broadcasting the baseline period of every date against the dates
+
+    Parameters
+    ----------
+    date_range : array-like of str
+        A tuple in the form of (start_date, end_date). Dates must be in the following format: yyyy/mm/dd
+
+    baseline : xarray Dataset
+        See baseline, the agg files are read at its grid resolution level
+
+    spread : "daily_std" or "std", default "daily_std"
+        Baseline statistic the z-score divides by: day to day variability of the mean, or spread of single readings
+
+    Returns
+    -------
+    ds : xarray Dataset
+        Dimensions (date, [hour], stat, lat, lng), stat in [mean, anomaly, zscore]
+    """
+    import xarray as xr
+
+    by = baseline.attrs["by"]
+    hourly = "hour" in baseline.dims
+    atmos = list(baseline.data_vars)
+
+    ds = load.agg.dataset(date_range, "hourly" if hourly else "day", atmos, stats=["mean"], deg=json.loads(baseline.attrs["deg"]))
+    keys, nkeys = period_keys(ds.indexes["date"], by)
+
+    # dates of periods the baseline doesn't have are NaN
+    position = np.full(nkeys, -1)
+    position[baseline[by].to_numpy() - 1] = np.arange(baseline.sizes[by])
+    keys = position[keys]
+    missing = keys < 0
+
+    out = {}
+    for prop in atmos:
+        mean = ds[prop].sel(stat="mean").to_numpy()
+        clim = baseline[prop].sel(stat="mean").to_numpy()[keys]
+        scale = baseline[prop].sel(stat=spread).to_numpy()[keys]
+        clim[missing] = np.nan
+
+        anomaly = mean - clim
+        with np.errstate(invalid="ignore", divide="ignore"):
+            zscore = anomaly / scale
+
+        out[prop] = (("date", "hour", "stat", "lat", "lng") if hourly else ("date", "stat", "lat", "lng"),
+                     np.stack([mean, anomaly, zscore], axis=-3))
+
+    coords = {name: ds[name] for name in ds.coords if name != "stat"}
+    coords["stat"] = ["mean", "anomaly", "zscore"]
+
+    return xr.Dataset(out, coords=coords)
+
+
+#######################################################################################################################
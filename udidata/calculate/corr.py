@@ -0,0 +1,216 @@
+import itertools
+import numpy as np
+import pandas as pd
+
+
+#######################################################################################################################
+
+# Pairwise co-moments of atmospheric variables, kept in aggregated data (see agg.spatial_agg with comoments=True)
+# as stats of the form "<stat>|<other variable>" in the column of a variable, over the rows where both are present:
+#
+#     pair_count|b    number of rows with both variables
+#     pair_mean|b     mean of the variable over these rows
+#     pair_m2|b       sum of squared deviations of the variable over these rows
+#     comoment|b      sum of products of deviations of the variable and b over these rows
+#
+# Monthly and yearly aggs also pair every variable with itself (comoment|a in the column of a is its sum of squared
+# deviations over all readings), since their std is the std of daily means.
+#
+# All of them merge exactly (merge.merge_stats), so covariance and correlation of any period and grid
+# are derived from aggregated data without reading raw data.
+
+PAIR_STATS = ["pair_count", "pair_mean", "pair_m2", "comoment"]
+SEP = "|"
+
+
+def pair_stat(stat, other):
+    return f"{stat}{SEP}{other}"
+
+
+def pair_partners(stats):
+    """
+    Returns the variables that appear as pair partners in a list of stat names
+    """
+    return sorted({stat.split(SEP, 1)[1] for stat in stats if stat.startswith(PAIR_STATS[-1] + SEP)})
+
+
+#######################################################################################################################
+
+def comoment_stats(df, keys, cols):
+    """
+    Calculates pairwise co-moments of cols, grouped by keys, with vectorized grouped sums
+
+    Parameters
+    ----------
+    df: pandas DataFrame
+        Raw data
+
+    keys: list
+        Group keys, passed to DataFrame.groupby
+
+    cols: list of str
+        Variables
+
+    Returns
+    -------
+    stats: pandas DataFrame
+        Rows by group, (atmos, stat) columns for every ordered pair of variables
+    """
+    # sums are taken around the overall mean of every variable, so large values (pressure) don't lose precision
+    centered = df[cols] - df[cols].mean()
+
+    sums = {}
+    for a, b in itertools.permutations(cols, 2):
+        both = centered[a].notna() & centered[b].notna()
+        x = centered[a].where(both)
+        y = centered[b].where(both)
+        sums[(a, b, "n")] = both.astype(float)
+        sums[(a, b, "x")] = x
+        sums[(a, b, "xx")] = x**2
+        sums[(a, b, "xy")] = x*y
+        sums[(a, b, "y")] = y
+
+    sums = pd.DataFrame(sums).groupby(keys, observed=True).sum()
+
+    out = {}
+    for a, b in itertools.permutations(cols, 2):
+        n, sx, sy = sums[(a, b, "n")], sums[(a, b, "x")], sums[(a, b, "y")]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            out[(a, pair_stat("pair_count", b))] = n
+            out[(a, pair_stat("pair_mean", b))] = (sx / n).where(n > 0) + df[a].mean()
+            out[(a, pair_stat("pair_m2", b))] = (sums[(a, b, "xx")] - sx**2 / n).clip(lower=0).where(n > 0)
+            out[(a, pair_stat("comoment", b))] = (sums[(a, b, "xy")] - sx * sy / n).where(n > 0)
+
+    return pd.DataFrame(out)
+
+
+#######################################################################################################################
+
+def merge_pair_stats(wide, grouped, other):
+    """
+    Merges the co-moments with other of every variable, for merge.merge_stats
+
+    Parameters
+    ----------
+    wide: pandas DataFrame
+        Aggregated data with (atmos, stat) columns
+
+    grouped: function
+        Takes in a DataFrame of wide rows and returns it grouped by the merge keys
+
+    other: str
+        Pair partner
+
+    Returns
+    -------
+    merged: dict
+        Merged stat names as keys, DataFrames (atmos columns) as values
+    """
+    get = lambda stat: wide.xs(pair_stat(stat, other), axis=1, level="stat")
+    n = get("pair_count")
+    mean_a = get("pair_mean")
+    atmos = n.columns
+
+    # mean of other over the same rows, kept in the column of other
+    mean_b = pd.DataFrame({a: wide[(other, pair_stat("pair_mean", a))] if (other, pair_stat("pair_mean", a)) in wide.columns
+                           else np.nan for a in atmos}, index=wide.index)
+
+    total = grouped(n).transform("sum")
+    merged_a = grouped((n*mean_a).fillna(0)).transform("sum") / total
+    merged_b = grouped((n*mean_b).fillna(0)).transform("sum") / total
+    da, db = mean_a - merged_a, mean_b - merged_b
+
+    merged = {}
+    merged[pair_stat("pair_count", other)] = grouped(n).sum()
+    merged[pair_stat("pair_mean", other)] = grouped((n*mean_a).fillna(0)).sum() / merged[pair_stat("pair_count", other)]
+    merged[pair_stat("pair_m2", other)] = grouped(get("pair_m2").fillna(0) + (n*da**2).fillna(0)).sum()
+    merged[pair_stat("comoment", other)] = grouped(get("comoment").fillna(0) + (n*da*db).fillna(0)).sum()
+
+    # pairs with no rows
+    empty = merged[pair_stat("pair_count", other)] == 0
+    for stat in merged:
+        if not stat.startswith("pair_count"):
+            merged[stat] = merged[stat].mask(empty)
+
+    return merged
+
+
+#######################################################################################################################
+
+def pair_matrix(agg, func):
+    """
+    Builds a matrix of every pair of variables for every row group of agg (see covariance, correlation)
+    """
+    stats = agg.index.get_level_values("stat")
+    wide = agg.unstack("stat")
+    atmos = list(agg.columns)
+
+    matrix = {}
+    for other in atmos:
+        if pair_stat("comoment", other) not in stats:
+            continue
+        get = lambda stat, a: wide[(a, pair_stat(stat, other))] if (a, pair_stat(stat, other)) in wide.columns else np.nan
+        matrix[other] = pd.DataFrame({a: func(wide, a, other, get) for a in atmos}, index=wide.index)
+
+    if len(matrix) == 0:
+        raise ValueError("agg has no co-moments, aggregate with comoments=True")
+
+    matrix = pd.concat(matrix, names=["other"])
+    matrix = matrix.reorder_levels(list(range(1, matrix.index.nlevels)) + [0]).sort_index()
+    matrix.columns.names = ["atmos"]
+
+    return matrix
+
+
+def diagonal_variance(wide, a):
+    # monthly and yearly aggs keep the variance of readings as the co-moment of a variable with itself,
+    # their std describes daily means
+    if (a, pair_stat("comoment", a)) in wide.columns:
+        return wide[(a, pair_stat("comoment", a))] / (wide[(a, pair_stat("pair_count", a))] - 1)
+    if (a, "std") in wide.columns:
+        return wide[(a, "std")]**2
+    return np.nan
+
+
+#######################################################################################################################
+
+def covariance(agg):
+    """
+    Covariance matrices of the variables for every cell (and period) of aggregated data with co-moments
+    (see agg.spatial_agg with comoments=True, and merge.merge_stats)
+
+    Parameters
+    ----------
+    agg: pandas DataFrame
+        Aggregated data with stat as the last index level
+
+    Returns
+    -------
+    cov: pandas DataFrame
+        The index of agg with an other level instead of stat, atmos columns. cov.loc[(lat, lng)] is the matrix of a cell.
+        Pairwise (rows where both variables are present), the diagonal is the variance of all rows
+    """
+    def func(wide, a, other, get):
+        if a == other:
+            return diagonal_variance(wide, a)
+        return get("comoment", a) / (get("pair_count", a) - 1)
+
+    return pair_matrix(agg, func)
+
+
+def correlation(agg):
+    """
+    Pearson correlation matrices of the variables for every cell (and period) of aggregated data with co-moments,
+    see covariance
+    """
+    def func(wide, a, other, get):
+        if a == other:
+            return pd.Series(1.0, index=wide.index)
+        m2_other = wide[(other, pair_stat("pair_m2", a))] if (other, pair_stat("pair_m2", a)) in wide.columns else np.nan
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return get("comoment", a) / np.sqrt(get("pair_m2", a) * m2_other)
+
+    return pair_matrix(agg, func)
+
+
+#######################################################################################################################
@@ -0,0 +1,52 @@
+import numpy as np
+from ..utils.grid import grid_labels, latlng_index
+from ..load.backends import as_pandas
+
+
+#######################################################################################################################
+
+def local_hour_spatial_agg(df, deg=2.5, cols=["temperature", "pressure", "humidity", "magnetic_tot"], tz_unit="ms"):
+    """
+    For a given df calculate aggregation (count, mean, median, std, min, max) for data variables,
+    grouped by local hour of day (raw_time + tz_offset) and latitude and longitude category, in one grouped pass.
+    Useful for diurnal cycles
+
+    Parameters
+    ----------
+    df: pandas DataFrame
+        Raw data with raw_time, tz_offset, lat and lng columns
+
+    deg: int or float, default 2.5
+        Spatial degree interval for for latitude and longitude data
+
+    tz_unit: str, default "ms"
+        Unit of tz_offset, see utils.df_utils.local_time
+
+    Returns
+    -------
+    data_agg: pandas DataFrame
+        Aggregated data with local_hour, lat, lng and stat index
+    """
+    df = as_pandas(df)
+    hour = df.local_hour(tz_unit=tz_unit)
+    lat_idx, lng_idx = latlng_index(df["lat"], df["lng"], deg)
+    lat_labels, lng_labels = grid_labels(deg)
+
+    # rows with no hour or out of the grid get NaN keys, which groupby drops
+    valid = (lat_idx >= 0) & ~np.isnan(hour)
+    keys = [np.where(valid, hour, np.nan),
+            np.where(valid, lat_labels[lat_idx], np.nan),
+            np.where(valid, lng_labels[lng_idx], np.nan)]
+
+    agg = df[cols].groupby(keys).agg(["mean","median","std","min","max","count"])
+
+    # reshape dataframe so it has statistics as index not columns
+    agg = agg.T.unstack().T
+    agg.columns.names = ["atmos"]
+    agg.index.names = ["local_hour", "lat", "lng", "stat"]
+    agg.index = agg.index.set_levels(agg.index.levels[0].astype(int), level="local_hour")
+
+    return agg
+
+
+#######################################################################################################################
@@ -0,0 +1,109 @@
+import numpy as np
+import pandas as pd
+from ..load.backends import as_pandas
+from .corr import merge_pair_stats, pair_partners
+
+
+#######################################################################################################################
+
+# index levels of aggregated data, columns in Arrow and polars aggs
+AGG_INDEX = ["hour", "lat", "lng", "stat"]
+
+
+#######################################################################################################################
+
+def merge_stats(agg, keys):
+    """
+    Merge rows of an aggregated DataFrame (see agg.spatial_agg) that share the same keys.
+    Only mergeable statistics are combined: count, na_count and days are summed, min and max are reduced,
+    mean is count weighted, std is pooled and na_pct is recalculated. Pairwise co-moments (see calculate.corr)
+    are pooled over the rows where both variables are present. Other statistics (median) are dropped.
+
+    Parameters
+    ----------
+    agg: pandas DataFrame
+        Aggregated data with stat as the last index level and atmospheric variables as columns
+
+    keys: function
+        Takes in the index of agg without the stat level and returns a dict of index level names
+        and arrays to group rows by
+
+    Returns
+    -------
+    agg: pandas DataFrame
+        Merged aggregated data, in the same format
+    """
+    stats = agg.index.get_level_values("stat")
+    wide = agg.unstack("stat")
+    by = keys(wide.index)
+    names = list(by)
+    by = list(by.values())
+
+    get = lambda stat: wide.xs(stat, axis=1, level="stat")
+    grouped = lambda df: df.groupby(by, observed=True)
+
+    merged = {}
+    count = get("count")
+    merged["count"] = grouped(count).sum()
+
+    if "mean" in stats:
+        mean = get("mean")
+        merged["mean"] = grouped((mean*count).fillna(0)).sum() / merged["count"]
+
+        if "std" in stats:
+            # pooled std - sum of squared deviations within each row, plus deviations of row means from the merged mean
+            merged_mean = grouped((mean*count).fillna(0)).transform("sum") / grouped(count).transform("sum")
+            m2 = ((count-1)*get("std")**2).fillna(0) + (count*(mean-merged_mean)**2).fillna(0)
+            merged["std"] = np.sqrt(grouped(m2).sum() / (merged["count"]-1).where(merged["count"] > 1))
+
+    for stat in ["min", "max"]:
+        if stat in stats:
+            merged[stat] = grouped(get(stat)).agg(stat)
+
+    for stat in ["na_count", "days"]:
+        if stat in stats:
+            merged[stat] = grouped(get(stat)).sum()
+
+    if "na_count" in stats:
+        merged["na_pct"] = merged["na_count"] / (merged["na_count"] + merged["count"])
+
+    for other in pair_partners(stats):
+        merged.update(merge_pair_stats(wide, grouped, other))
+
+    # reshape back to stat as an index level
+    merged = pd.concat(merged, axis=1, names=["stat"])
+    merged = merged.swaplevel(axis=1).T.unstack().T
+    merged.columns.names = ["atmos"]
+    merged.index.names = names + ["stat"]
+
+    return merged
+
+
+#######################################################################################################################
+
+def merge_spatial_aggs(aggs):
+    """
+    Merge aggregated DataFrames of different periods (hours, days...) into one, see merge_stats
+
+    Parameters
+    ----------
+    aggs: list of pandas DataFrame
+        Aggregated data with lat, lng and stat index levels, None entries are skipped.
+        Arrow and polars aggs (see load.agg) are converted
+
+    Returns
+    -------
+    agg: pandas DataFrame
+    """
+    aggs = [as_pandas(agg, index=AGG_INDEX) for agg in aggs]
+    aggs = [agg for agg in aggs if isinstance(agg, pd.DataFrame)]
+    if len(aggs) == 0:
+        return None
+
+    agg = pd.concat(aggs, keys=range(len(aggs)), names=["part"])
+    keys = lambda index: {name: np.asarray(index.get_level_values(name), dtype=float) for name in ["lat", "lng"]}
+
+    return merge_stats(agg, keys)
+
+
+#######################################################################################################################
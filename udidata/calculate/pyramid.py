@@ -0,0 +1,160 @@
+import numpy as np
+import pandas as pd
+from .. import load
+from ..dir.utils import get_relevant_hours
+from ..utils.grid import check_grid, equal_area_index, equal_area_centroids, equal_area_parent, nesting_ratio
+from ..load.backends import as_pandas
+from .merge import merge_stats, AGG_INDEX
+from .agg import spatial_agg
+
+
+#######################################################################################################################
+
+def coarsen_agg(agg, deg, base_deg=None, grid="latlng"):
+    """
+    Merge an aggregated DataFrame into a coarser latitude and longitude grid.
+    Grid cells are labeled by their lower edge, like in discretize_latlng.
+
+    Parameters
+    ----------
+    agg: pandas DataFrame
+        Aggregated data with lat, lng and stat index levels (other levels, like hour, are kept)
+
+    deg: int or float
+        Spatial degree interval of the coarse grid
+
+    base_deg: int or float, default None
+        Spatial degree interval of agg. If given, deg is validated to be a multiple of it
+
+    grid: "latlng" or "equal_area", default "latlng"
+        Grid of agg (see agg.spatial_agg). Equal area cells are merged into their parent cells, which needs base_deg
+
+    Returns
+    -------
+    agg: pandas DataFrame
+        Aggregated data on the coarse grid
+    """
+    check_grid(grid)
+    if base_deg is not None:
+        nesting_ratio(base_deg, deg)
+
+    if grid == "equal_area":
+        if base_deg is None:
+            raise ValueError("base_deg is needed to coarsen an equal area grid")
+        return merge_stats(as_pandas(agg, index=AGG_INDEX), lambda index: equal_area_parents(index, base_deg, deg))
+
+    # lower edge of the coarse cell every cell falls in, rounding takes care of float errors in the labels
+    coarse = lambda values, start: np.floor(np.round((np.asarray(values, dtype=float) - start) / deg, 6)) * deg + start
+
+    def keys(index):
+        return {name: coarse(index.get_level_values(name), -90 if name == "lat" else -180) if name in ["lat", "lng"]
+                else index.get_level_values(name) for name in index.names}
+
+    return merge_stats(as_pandas(agg, index=AGG_INDEX), keys)
+
+
+#######################################################################################################################
+
+def equal_area_parents(index, deg, parent_deg):
+    """
+    Group keys of coarsen_agg for the equal area grid: centroids of the parent cells of the cells of index
+    """
+    band_idx, lng_idx = equal_area_index(index.get_level_values("lat"), index.get_level_values("lng"), deg)
+
+    keys = {name: index.get_level_values(name) for name in index.names}
+    keys["lat"], keys["lng"] = equal_area_centroids(*equal_area_parent(band_idx, lng_idx, deg, parent_deg), parent_deg)
+    return keys
+
+
+#######################################################################################################################
+
+def spatial_agg_pyramid(df, base_deg=0.5, degs=(1, 2.5, 5), grid="latlng"):
+    """
+    Calculate spatial aggregations (see agg.spatial_agg) for a base grid, and derive coarser grids from it
+    by merging mergeable statistics. Coarser levels don't have median.
+
+    Parameters
+    ----------
+    df: pandas DataFrame
+        Pandas dataframe with data for the desired sampling range (hourly, daily)
+
+    base_deg: int or float, default 0.5
+        Spatial degree interval of the finest grid
+
+    degs: array-like of int or float, default (1, 2.5, 5)
+        Spatial degree intervals of the coarser grids, each one has to be a multiple of base_deg
+
+    grid: "latlng" or "equal_area", default "latlng"
+        Grid of cells, see agg.spatial_agg
+
+    Returns
+    -------
+    pyramid: dict
+        Grid resolution as keys, aggregated DataFrame as values
+    """
+    base = spatial_agg(df, deg=base_deg, grid=grid)
+
+    pyramid = {base_deg: base}
+    for deg in degs:
+        pyramid[deg] = coarsen_agg(base, deg, base_deg, grid)
+
+    return pyramid
+
+
+#######################################################################################################################
+
+def day_pyramid(date, base_deg=0.5, degs=(1, 2.5, 5), cols=["temperature", "pressure", "humidity", "magnetic_tot"], save=False, grid="latlng"):
+    """
+    Calculate daily and hourly spatial aggregations of a specific date, for every grid resolution level.
+    The day is read once, hour by hour. The base levels are aggregated from the data (with median),
+    coarser levels are merged from them (see spatial_agg_pyramid).
+
+    Parameters
+    ----------
+    date: str
+        Format yyyy/mm/dd
+
+    base_deg, degs: see spatial_agg_pyramid
+
+    save: bool, default False
+        If True, every level is written to its agg file, so it can be read by load.agg.day and load.agg.hourly with deg.
+        Only for the latlng grid, agg files are latitude/longitude grids
+
+    grid: "latlng" or "equal_area", default "latlng"
+        Grid of cells, see agg.spatial_agg
+
+    Returns
+    -------
+    daily, hourly: dict
+        Grid resolution as keys, aggregated DataFrame as values
+    """
+    if save and grid != "latlng":
+        raise ValueError("Only latlng grid aggregations can be saved to agg files")
+
+    # every hour is read once, aggregated into the hourly base and kept for the daily base
+    frames = {h: load.day(date, columns=["lat", "lng"]+cols, hour_range=h) for h in get_relevant_hours(date, (0,23), return_type="int")}
+    frames = {h: df for h, df in frames.items() if isinstance(df, pd.DataFrame)}
+    if len(frames) == 0:
+        print(f"No data for {date}")
+        return
+
+    hour_idx = pd.Index(np.array(list(frames), dtype=np.int32), name="hour")
+    hourly_base = pd.concat([spatial_agg(df, deg=base_deg, grid=grid) for df in frames.values()], keys=hour_idx)
+    daily_base = spatial_agg(pd.concat(list(frames.values()), ignore_index=True), deg=base_deg, grid=grid)
+    del frames
+
+    daily = {base_deg: daily_base}
+    hourly = {base_deg: hourly_base}
+    for deg in degs:
+        daily[deg] = coarsen_agg(daily_base, deg, base_deg, grid)
+        hourly[deg] = coarsen_agg(hourly_base, deg, base_deg, grid)
+
+    if save:
+        for deg in daily:
+            daily[deg].to_csv(load.agg.day_path(date, deg))
+            hourly[deg].to_csv(load.agg.hourly_path(date, deg))
+
+    return daily, hourly
+
+
+#######################################################################################################################
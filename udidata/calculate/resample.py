@@ -0,0 +1,140 @@
+import numpy as np
+import pandas as pd
+from ..utils.grid import grid_shape, grid_labels, latlng_index
+from ..load.backends import as_pandas, is_frame
+
+
+#######################################################################################################################
+
+def bin_sums(df, step, deg, cols, time_col="raw_time"):
+    """
+    Sum and count the values of cols for every (time bin, grid cell) pair of df, in one vectorized pass
+
+    Parameters
+    ----------
+    df : pandas DataFrame
+        Raw data with time, lat and lng columns
+
+    step : int
+        Time bin size in milliseconds
+
+    deg : int or float
+        Spatial degree interval for for latitude and longitude data
+
+    cols : list of str
+        Columns to sum
+
+    Returns
+    -------
+    keys : numpy array of int
+        Unique keys of (time bin, grid cell) pairs, a key is time_bin * number_of_cells + cell
+
+    sums, counts : numpy arrays
+        Arrays with shape (keys, cols)
+    """
+    nlat, nlng = grid_shape(deg)
+
+    lat_idx, lng_idx = latlng_index(df["lat"], df["lng"], deg)
+    time = df[time_col].to_numpy(dtype=float)
+    valid = (lat_idx >= 0) & ~np.isnan(time)
+
+    time_bin = (time[valid] // step).astype(np.int64)
+    cell = lat_idx[valid] * nlng + lng_idx[valid]
+
+    keys, inverse = np.unique(time_bin * (nlat*nlng) + cell, return_inverse=True)
+
+    sums = np.zeros((keys.size, len(cols)))
+    counts = np.zeros((keys.size, len(cols)))
+
+    for i, col in enumerate(cols):
+        values = df[col].to_numpy(dtype=float)[valid]
+        notna = ~np.isnan(values)
+        sums[:, i] = np.bincount(inverse, weights=np.where(notna, values, 0), minlength=keys.size)
+        counts[:, i] = np.bincount(inverse, weights=notna, minlength=keys.size)
+
+    return keys, sums, counts
+
+
+#######################################################################################################################
+
+def grid_resample(data, freq="1h", deg=2.5, cols=["temperature", "pressure", "humidity", "magnetic_tot"], time_col="raw_time"):
+    """
+    Bin raw data by time (raw_time) and grid cell into regular time series, for every active grid cell.
+    Unlike to_utc + discretize_latlng + groupby, the frame is not copied.
+
+    Parameters
+    ----------
+    data : pandas DataFrame or iterable of pandas DataFrames
+        Raw data (see load.day, load.days), or a day iterator (see load.raw.iter_days). Arrow and polars frames are converted.
+        Data must have raw_time, lat and lng columns
+
+    freq : str, default "1h"
+        Time bin size, any pandas Timedelta string (1min, 10min, 1h...), at least one second
+
+    deg : int or float, default 2.5
+        Spatial degree interval for for latitude and longitude data
+
+    cols : list of str, default ["temperature", "pressure", "humidity", "magnetic_tot"]
+        Atmospheric variables to resample
+
+    Returns
+    -------
+    ds : xarray Dataset
+        A data variable for every column, with dimensions (date, stat, cell) and stat in [mean, count].
+        Time bins with no data are NaN for mean and 0 for count.
+        Cells have lat and lng coordinates (lower edge of the cell), so ds works with plot.lines
+    """
+    import xarray as xr
+
+    step = pd.Timedelta(freq).value // 10**6    # bin size in ms, like raw_time
+    if step < 1000:
+        raise ValueError("freq must be at least one second")
+
+    # one frame (of any loader backend) or an iterable of frames
+    if is_frame(data):
+        data = [data]
+    data = map(as_pandas, data)
+
+    # sum every chunk on its own, then merge chunks by key
+    parts = [bin_sums(df, step, deg, cols, time_col) for df in data if isinstance(df, pd.DataFrame)]
+
+    if len(parts) == 0:
+        raise ValueError("No data to resample")
+
+    keys, inverse = np.unique(np.concatenate([p[0] for p in parts]), return_inverse=True)
+    sums = np.stack([np.bincount(inverse, weights=col, minlength=keys.size) for col in np.concatenate([p[1] for p in parts]).T], axis=1)
+    counts = np.stack([np.bincount(inverse, weights=col, minlength=keys.size) for col in np.concatenate([p[2] for p in parts]).T], axis=1)
+
+    # every row was out of the grid or had no time
+    if keys.size == 0:
+        raise ValueError("No data to resample: no row has a valid time and grid cell")
+
+    # scatter keys into a dense (time, cell) array
+    nlat, nlng = grid_shape(deg)
+    time_bin, cell = np.divmod(keys, nlat*nlng)
+    cells, cell_pos = np.unique(cell, return_inverse=True)
+    time_pos = time_bin - time_bin.min()
+    num_times = time_pos.max() + 1
+
+    dense_sums = np.zeros((num_times, cells.size, len(cols)))
+    dense_counts = np.zeros((num_times, cells.size, len(cols)))
+    dense_sums[time_pos, cell_pos] = sums
+    dense_counts[time_pos, cell_pos] = counts
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        dense_mean = dense_sums / dense_counts
+
+    lat_labels, lng_labels = grid_labels(deg)
+    coords = {"date": pd.to_datetime((time_bin.min() + np.arange(num_times)) * step, unit="ms"),
+              "stat": ["mean", "count"],
+              "cell": cells,
+              "lat": ("cell", lat_labels[cells // nlng]),
+              "lng": ("cell", lng_labels[cells % nlng])}
+
+    data_vars = {col: (("date", "stat", "cell"), np.stack([dense_mean[..., i], dense_counts[..., i]], axis=1))
+                 for i, col in enumerate(cols)}
+
+    return xr.Dataset(data_vars, coords=coords)
+
+
+#######################################################################################################################
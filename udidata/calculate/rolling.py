@@ -0,0 +1,169 @@
+from collections import deque
+import numpy as np
+import pandas as pd
+from .. import load
+
+
+#######################################################################################################################
+
+class RollingMoments:
+    """
+    Sliding window statistics (count, mean, std) of per period aggregations (daily agg files), for all cells at once.
+    The window keeps count weighted mergeable moments (count, mean, sum of squared deviations).
+    Every step merges the new period in and removes the period leaving the window, O(1) per step regardless
+    of window length. New periods can be streamed in with add.
+
+    Parameters
+    ----------
+    window : int
+        Number of periods in the window
+
+    shape : tuple of int
+        Shape of the arrays of one period (for example (atmos, lat, lng))
+
+    resync : int, default None
+        Every resync steps the window moments are recomputed from the periods in the window,
+        to stop floating point errors of removals from building up. Defaults to window
+    """
+
+    def __init__(self, window, shape, resync=None):
+        self.window = window
+        self.resync = resync or window
+        self.count = np.zeros(shape)
+        self.mean = np.zeros(shape)
+        self.m2 = np.zeros(shape)
+        self.periods = deque()
+        self.steps = 0
+
+    def add(self, count, mean, std):
+        """
+        Adds a period to the window (removing the oldest one if the window is full) and returns the window statistics
+
+        Parameters
+        ----------
+        count, mean, std : numpy arrays
+            Statistics of the period, NaN count is no data
+
+        Returns
+        -------
+        stats : tuple of numpy arrays
+            count, mean and std of the window, see stats
+        """
+        count = np.nan_to_num(np.asarray(count, dtype=float))
+        mean = np.where(count > 0, np.nan_to_num(mean), 0)
+        m2 = np.where(count > 1, np.nan_to_num(np.asarray(std, dtype=float)**2 * (count - 1)), 0)
+
+        self.periods.append((count, mean, m2))
+        self.merge(count, mean, m2)
+
+        if len(self.periods) > self.window:
+            self.remove(*self.periods.popleft())
+
+        self.steps += 1
+        if self.steps % self.resync == 0:
+            self.recompute()
+
+        return self.stats()
+
+    def merge(self, count, mean, m2):
+        # pooled moments (Chan et al.)
+        total = self.count + count
+        with np.errstate(invalid="ignore", divide="ignore"):
+            delta = mean - self.mean
+            self.mean = np.where(total > 0, self.mean + delta * count / total, 0)
+            self.m2 = np.where(total > 0, self.m2 + m2 + delta**2 * self.count * count / total, 0)
+        self.count = total
+
+    def remove(self, count, mean, m2):
+        # inverse of merge
+        rest = self.count - count
+        with np.errstate(invalid="ignore", divide="ignore"):
+            rest_mean = np.where(rest > 0, (self.count * self.mean - count * mean) / rest, 0)
+            delta = mean - rest_mean
+            self.m2 = np.where(rest > 0, np.maximum(self.m2 - m2 - delta**2 * rest * count / self.count, 0), 0)
+        self.mean = rest_mean
+        self.count = rest
+
+    def recompute(self):
+        """
+        Recomputes the window moments from the periods in the window
+        """
+        self.count[:], self.mean[:], self.m2[:] = 0, 0, 0
+        for period in self.periods:
+            self.merge(*period)
+
+    def stats(self, min_count=1):
+        """
+        Returns count, mean and std (sample) of the window. Mean is NaN for cells with less than min_count values,
+        std for cells with less than 2
+        """
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = np.where(self.count >= max(min_count, 1), self.mean, np.nan)
+            std = np.where(self.count > 1, np.sqrt(self.m2 / (self.count - 1)), np.nan)
+        return self.count.copy(), mean, std
+
+    def add_dataset(self, ds, min_count=1):
+        """
+        Adds every date of a dataset (see load.agg.dataset, with count, mean and std stats) in order
+
+        Returns
+        -------
+        ds : xarray Dataset
+            Window statistics at every date, with stat in [count, mean, std]
+        """
+        import xarray as xr
+
+        atmos = list(ds.data_vars)
+        stacked = {stat: np.stack([ds[prop].sel(stat=stat).to_numpy() for prop in atmos], axis=1) for stat in ["count", "mean", "std"]}
+
+        out = np.empty((len(atmos), ds.sizes["date"], 3) + self.count.shape[1:])
+        for i in range(ds.sizes["date"]):
+            self.add(stacked["count"][i], stacked["mean"][i], stacked["std"][i])
+            for j, values in enumerate(self.stats(min_count)):
+                out[:, i, j] = values
+
+        dims = ("date", "stat") + ds[atmos[0]].sel(stat="count").dims[1:]
+        coords = {name: ds[name] for name in dims if name in ds.coords}
+        coords["stat"] = ["count", "mean", "std"]
+
+        return xr.Dataset({prop: (dims, out[k]) for k, prop in enumerate(atmos)}, coords=coords)
+
+
+#######################################################################################################################
+
+def rolling_stats(date_range, window=7, atmos=load.agg.atmos, deg=None, min_count=1):
+    """
+    Rolling count, mean and std of every grid cell over the daily agg files, for windows of window days
+    ending at every date of date_range. Days before the start of date_range are read too, so every window is full.
+
+    Parameters
+    ----------
+    date_range : array-like of str
+        A tuple in the form of (start_date, end_date). Dates must be in the following format: yyyy/mm/dd
+
+    window : int, default 7
+        Window length in days
+
+    atmos : array-like, default ["pressure", "temperature", "humidity", "magnetic_tot"]
+        Atmospheric propeties
+
+    deg : int or float, default None
+        Grid resolution level to read, see load.agg.dataset
+
+    min_count : int, default 1
+        Minimum number of readings in a window for a mean
+
+    Returns
+    -------
+    ds : xarray Dataset
+        Dimensions (date, stat, lat, lng), stat in [count, mean, std]. Days with no agg file count as no data
+    """
+    start = pd.Timestamp(date_range[0].replace("/", "-"))
+    lead_start = (start - pd.Timedelta(days=window-1)).strftime("%Y/%m/%d")
+
+    ds = load.agg.dataset((lead_start, date_range[-1]), "day", atmos, stats=["count", "mean", "std"], deg=deg)
+
+    nlat, nlng = ds.sizes["lat"], ds.sizes["lng"]
+    rolling = RollingMoments(window, (len(atmos), nlat, nlng)).add_dataset(ds, min_count)
+
+    return rolling.isel(date=slice(window-1, None))
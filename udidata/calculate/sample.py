@@ -0,0 +1,68 @@
+import numpy as np
+from statistics import NormalDist
+from .. import load
+
+
+#######################################################################################################################
+
+def check_sampling(sample, per_cell, loaded=None):
+    """
+    Validates the sample and per_cell parameters of the agg builders, loaded is the sample fraction of the data
+    """
+    load.raw.check_sample(sample)
+    if per_cell is not None and (isinstance(per_cell, bool) or not isinstance(per_cell, (int, np.integer)) or per_cell < 1):
+        raise ValueError(f"per_cell must be a positive int, got {per_cell}")
+    if per_cell is not None and (sample is not None or loaded is not None):
+        raise ValueError("per_cell can't be combined with a sample fraction")
+
+
+#######################################################################################################################
+
+def add_sample_error(agg, size, fraction, population, confidence=0.95):
+    """
+    Scales counts of an aggregation of sampled data (see agg.spatial_agg) to estimates of the full data,
+    and adds mean_ci and count_ci statistics, half widths of normal confidence intervals
+
+    Parameters
+    ----------
+    agg: pandas DataFrame
+        Aggregated data with (atmos, stat) columns, one row per cell
+
+    size: pandas Series
+        Number of sampled rows in every cell
+
+    fraction: float
+        Sampled fraction of rows (Bernoulli sample), None if cells were sampled by size
+
+    population: pandas Series
+        Number of rows in every cell before sampling by size, None for a Bernoulli sample
+    """
+    z = NormalDist().inv_cdf((1 + confidence) / 2)
+    agg = agg.copy()
+    if population is not None:
+        population = population.reindex(size.index)
+
+    for atmos in agg.columns.get_level_values(0).unique():
+        count = agg[(atmos, "count")]
+        std_err = agg[(atmos, "std")] / np.sqrt(count)
+
+        if population is None:
+            # every row is sampled independently with probability fraction
+            agg[(atmos, "mean_ci")] = z * std_err
+            agg[(atmos, "count_ci")] = z * np.sqrt(count * (1 - fraction)) / fraction
+            agg[(atmos, "count")] = count / fraction
+            agg[(atmos, "na_count")] = agg[(atmos, "na_count")] / fraction
+        else:
+            # a simple random sample of every cell, with finite population correction.
+            # count is estimated from the share of non NaN values in the sample
+            fpc = (population - size) / (population - 1).clip(lower=1)
+            share = count / size
+            agg[(atmos, "mean_ci")] = z * std_err * np.sqrt(fpc)
+            agg[(atmos, "count_ci")] = z * population * np.sqrt(share * (1 - share) / size * fpc)
+            agg[(atmos, "count")] = share * population
+            agg[(atmos, "na_count")] = (1 - share) * population
+
+    return agg
+
+
+#######################################################################################################################
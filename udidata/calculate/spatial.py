@@ -0,0 +1,138 @@
+import numpy as np
+from .. import load
+from ..load.backends import as_pandas
+
+EARTH_RADIUS = 6371.0088    # mean earth radius in km
+
+
+#######################################################################################################################
+
+def to_xyz(lat, lng):
+    """
+    Converts latitude and longitude (degrees) to points on the unit sphere
+
+    Returns
+    -------
+    xyz : numpy array
+        Array with shape (n, 3)
+    """
+    lat = np.radians(np.atleast_1d(np.asarray(lat, dtype=float)))
+    lng = np.radians(np.atleast_1d(np.asarray(lng, dtype=float)))
+    return np.column_stack([np.cos(lat)*np.cos(lng), np.cos(lat)*np.sin(lng), np.sin(lat)])
+
+
+#######################################################################################################################
+
+class SpatialIndex:
+    """
+    KD-tree of readings on the unit sphere, for batched radius and nearest neighbor queries in km.
+    Queries return row positions in the indexed frame (use df.iloc). Requires scipy
+    """
+
+    def __init__(self, lat, lng, leafsize=32):
+        """
+        Parameters
+        ----------
+        lat, lng : array-like
+            Coordinates of the readings, rows with NaN coordinates are not indexed
+
+        leafsize : int, default 32
+            Leaf size of the tree
+        """
+        from scipy.spatial import cKDTree
+
+        xyz = to_xyz(lat, lng)
+        valid = ~np.isnan(xyz).any(axis=1)
+
+        self.positions = np.flatnonzero(valid)    # row position of every tree point
+        self.tree = cKDTree(xyz[valid], leafsize=leafsize)
+        self.frame = None
+
+    def __len__(self):
+        return self.positions.size
+
+    @classmethod
+    def from_frame(cls, df, lat_col="lat", lng_col="lng"):
+        """
+        Builds an index over a loaded frame (of any loader backend), the frame is kept in index.frame
+        """
+        df = as_pandas(df)
+        index = cls(df[lat_col], df[lng_col])
+        index.frame = df
+        return index
+
+    @classmethod
+    def from_day(cls, date, columns=["lat", "lng"], hour_range=(0,23), where=None):
+        """
+        Loads a day of raw data (see load.day) and builds an index over it, the frame is kept in index.frame
+        """
+        df = load.day(date, columns=list(dict.fromkeys(["lat", "lng"]+list(columns))), hour_range=hour_range, where=where)
+        if df is None:
+            raise ValueError(f"No data for {date}")
+        return cls.from_frame(df)
+
+    def query_radius(self, lat, lng, radius_km):
+        """
+        Finds all readings within radius_km (great circle distance) of every query point
+
+        Parameters
+        ----------
+        lat, lng : float or array-like
+            Query points
+
+        radius_km : float
+            Search radius in km
+
+        Returns
+        -------
+        positions : list of numpy arrays
+            Sorted row positions of readings within the radius, one array per query point
+        """
+        # great circle distance to straight line (chord) distance on the unit sphere
+        chord = 2 * np.sin(min(radius_km / EARTH_RADIUS, np.pi) / 2)
+        neighbors = self.tree.query_ball_point(to_xyz(lat, lng), r=chord)
+
+        return [np.sort(self.positions[np.asarray(n, dtype=int)]) for n in neighbors]
+
+    def query_knn(self, lat, lng, k=1):
+        """
+        Finds the k nearest readings of every query point
+
+        Parameters
+        ----------
+        lat, lng : float or array-like
+            Query points
+
+        k : int, default 1
+            Number of neighbors
+
+        Returns
+        -------
+        distances : numpy array
+            Great circle distances in km, shape (points, k), ordered from nearest, inf where there is no neighbor
+
+        positions : numpy array
+            Row positions of the neighbors, shape (points, k), -1 where there are less than k readings
+            (all of a row for NaN query points, all of them for an empty index)
+        """
+        xyz = to_xyz(lat, lng)
+        distances = np.full((len(xyz), k), np.inf)
+        positions = np.full((len(xyz), k), -1, dtype=np.int64)
+
+        # the tree can't return more neighbors than it has points, an empty tree has none. NaN query points have none
+        found = min(k, len(self))
+        valid = ~np.isnan(xyz).any(axis=1)
+        if found == 0 or not valid.any():
+            return distances, positions
+
+        chord, idx = self.tree.query(xyz[valid], k=found)
+        chord = np.asarray(chord).reshape(-1, found)
+        idx = np.asarray(idx).reshape(-1, found)
+
+        distances[valid, :found] = 2 * EARTH_RADIUS * np.arcsin(np.clip(chord / 2, 0, 1))
+        positions[valid, :found] = self.positions[idx]
+
+        return distances, positions
+
+
+#######################################################################################################################
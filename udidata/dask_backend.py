@@ -0,0 +1,231 @@
+"""
+Optional dask backend for day partitioned loads and aggregations.
+Requires dask (and dask.distributed for clusters), for example:
+
+    from udidata import dask_backend
+    client = dask_backend.local_client()    # or distributed.Client("scheduler-address:8786")
+    agg = dask_backend.monthly_spatial_agg(2017, 5)
+
+Without a client, the default dask scheduler is used.
+"""
+import dask
+import dask.dataframe as dd
+import pandas as pd
+from . import load
+from .calculate.agg import spatial_agg
+from .calculate.merge import merge_spatial_aggs
+from .dir.utils import data_exists, generate_date_list, get_relevant_hours, get_month_range
+from .settings import COL_NAMES
+
+
+#######################################################################################################################
+
+def local_client(n_workers=None, processes=True, **kwargs):
+    """
+    Starts a local dask cluster and returns a client connected to it
+
+    Parameters
+    ----------
+    n_workers : int, default None
+        Number of workers, dask decides by default
+
+    processes : bool, default True
+        If False, workers are threads in the current process (handy for tests)
+
+    kwargs :
+        Passed to distributed.LocalCluster
+    """
+    from dask.distributed import Client, LocalCluster
+
+    return Client(LocalCluster(n_workers=n_workers, processes=processes, **kwargs))
+
+
+#######################################################################################################################
+
+def compute(*tasks, client=None):
+    """
+    Computes dask tasks, on the cluster of client if given
+    """
+    if client is not None:
+        return tuple(client.gather(client.compute(list(tasks))))
+    return dask.compute(*tasks)
+
+
+#######################################################################################################################
+
+def iterate_days(dates, task, client=None):
+    """
+    Parallel version of dir.utils.iterate_days, task is executed for every day with data as a separate dask task
+
+    Parameters
+    ----------
+    dates : array-like of str
+        Start date and end date of days to iterate over, format yyyy/mm/dd
+
+    task : function
+        A function to execute for each day folder, its first argument is date
+
+    client : distributed.Client, default None
+        Client of the cluster to run on
+
+    Returns
+    -------
+    tasks_returns : list
+    """
+    if not callable(task):
+        raise TypeError("task must be a function")
+
+    date_range = filter(data_exists, generate_date_list(dates[0], dates[-1]))
+    return list(compute(*[dask.delayed(task)(date) for date in date_range], client=client))
+
+
+#######################################################################################################################
+
+# columns that are read as text, all other columns are numeric
+TEXT_COLUMNS = ["model"]
+
+
+def meta_frame(columns):
+    """
+    Empty DataFrame with the dtypes of the partitions of days: float for numeric columns (an int column
+    is read as float in files with missing values, so partitions could differ otherwise), str for text columns
+    """
+    return pd.DataFrame({col: pd.Series(dtype=str if col in TEXT_COLUMNS else "float64") for col in columns})
+
+
+def day_or_empty(date, columns, hour_range, where, dropna):
+    """
+    load.day cast to the dtypes of meta_frame, with an empty DataFrame instead of None,
+    so every partition has the same columns and dtypes
+    """
+    meta = meta_frame(columns)
+    df = load.day(date, columns, hour_range, where, dropna)
+    if isinstance(df, pd.DataFrame):
+        return df.astype(meta.dtypes.to_dict())
+    return meta
+
+
+def days(date_range, columns=COL_NAMES.values(), hour_range=(0,23), where=None, dropna=None, partition="day"):
+    """
+    Lazy version of load.days, returns a dask DataFrame with one partition per day (or per hour)
+
+    Parameters
+    ----------
+    date_range : array-like of str
+        A tuple in the form of (start_date, end_date). Dates must be in the following format: yyyy/mm/dd
+
+    partition : str, default "day"
+        "day" or "hour"
+
+    columns, hour_range, where, dropna : see load.days
+
+    Returns
+    -------
+    df : dask DataFrame
+        Numeric columns are float, see meta_frame
+    """
+    columns = list(columns)
+    dates = list(filter(data_exists, generate_date_list(*date_range)))
+
+    if partition == "day":
+        parts = [dask.delayed(day_or_empty)(date, columns, hour_range, where, dropna) for date in dates]
+    elif partition == "hour":
+        parts = [dask.delayed(day_or_empty)(date, columns, h, where, dropna)
+                 for date in dates for h in get_relevant_hours(date, hour_range, return_type="int")]
+    else:
+        raise ValueError(f"partition must be 'day' or 'hour', got {partition}")
+
+    if len(parts) == 0:
+        print(f"Sorry, no data found for these dates: {date_range[0]} to {date_range[-1]}")
+        return
+
+    # with meta, dask doesn't compute a partition to find the columns and dtypes
+    return dd.from_delayed(parts, meta=meta_frame(columns))
+
+
+#######################################################################################################################
+
+def day_agg(date, deg, cols):
+    """
+    Spatial aggregation of one day of raw data, None if there's no data
+    """
+    df = load.day(date, columns=["lat", "lng"]+cols)
+    if isinstance(df, pd.DataFrame) and not df.empty:
+        return spatial_agg(df, deg=deg)
+
+
+def tree_reduce(tasks, split_every=8):
+    """
+    Merges aggregation tasks with a tree of merge_spatial_aggs tasks, split_every parts per merge.
+    Tasks are merged at least once, so a single task has the same statistics as several (no median)
+    """
+    tasks = list(tasks)
+    merge = dask.delayed(merge_spatial_aggs)
+    if len(tasks) == 0:
+        return dask.delayed(None)
+
+    tasks = [merge(tasks[i:i+split_every]) for i in range(0, len(tasks), split_every)]
+    while len(tasks) > 1:
+        tasks = [merge(tasks[i:i+split_every]) for i in range(0, len(tasks), split_every)]
+
+    return tasks[0]
+
+
+#######################################################################################################################
+
+def spatial_agg_tasks(date_range, deg=2.5, cols=["temperature", "pressure", "humidity", "magnetic_tot"], split_every=8):
+    """
+    Returns a dask task that aggregates raw data of a date range (see calculate.agg.spatial_agg), with one task per day
+    and a tree reduction of the daily aggregations. Statistics are mergeable ones, pooled over all readings
+    """
+    dates = filter(data_exists, generate_date_list(*date_range))
+    return tree_reduce([dask.delayed(day_agg)(date, deg, cols) for date in dates], split_every)
+
+
+def spatial_agg_range(date_range, deg=2.5, cols=["temperature", "pressure", "humidity", "magnetic_tot"], split_every=8, client=None):
+    """
+    Aggregates raw data of a date range in parallel, see spatial_agg_tasks
+
+    Returns
+    -------
+    agg : pandas DataFrame
+        Same format as calculate.merge.merge_spatial_aggs
+    """
+    return compute(spatial_agg_tasks(date_range, deg, cols, split_every), client=client)[0]
+
+
+#######################################################################################################################
+
+def monthly_spatial_agg(year, month, deg=2.5, cols=["temperature", "pressure", "humidity", "magnetic_tot"], client=None):
+    """
+    Parallel monthly aggregation from raw data. Unlike calculate.agg.monthly_spatial_agg, which aggregates daily means,
+    statistics are pooled over all readings of the month (count, mean, std, min, max, na_count, na_pct)
+    """
+    dates = get_month_range(year, month)
+    return spatial_agg_range((dates[0], dates[-1]), deg, cols, client=client)
+
+
+def yearly_spatial_agg(year, deg=2.5, cols=["temperature", "pressure", "humidity", "magnetic_tot"], client=None):
+    """
+    Parallel yearly aggregation from raw data, days are reduced into months and months into the year
+
+    Returns
+    -------
+    yearly_agg : pandas DataFrame
+        Pooled statistics of the year, see monthly_spatial_agg
+
+    monthly_aggs : dict
+        Month number as keys, pooled statistics of the month as values
+    """
+    months = {}
+    for month in range(1, 13):
+        dates = get_month_range(year, month)
+        months[month] = spatial_agg_tasks((dates[0], dates[-1]), deg, cols)
+
+    year_task = tree_reduce(list(months.values()))
+    results = compute(year_task, *months.values(), client=client)
+
+    return results[0], dict(zip(months, results[1:]))
+
+
+#######################################################################################################################
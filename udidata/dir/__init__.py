@@ -1 +1,4 @@
-from . import utils
\ No newline at end of file
+from . import utils
+from . import pack
+from . import cluster
+from . import scan
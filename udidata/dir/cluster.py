@@ -0,0 +1,199 @@
+import io
+import os
+import gzip
+from collections import namedtuple
+import numpy as np
+import pandas as pd
+from ..settings import EXTENSION
+from . import pack
+from .utils import get_day_folder_path, get_hours_with_data, add_lead_zero, generate_date_list
+
+
+#######################################################################################################################
+
+# A clustered day holds all readings of a day sorted by a space filling curve (Morton / Z-order) key of lat, lng,
+# in blocks (pack members) with lat, lng bounds and hours in the table of contents.
+# Loaders with a lat/lng filter read only the blocks that intersect it.
+
+CLUSTER_NAME = "clustered.pack"
+
+# a block to read: pack file path, member name, number of rows and hours to keep
+Block = namedtuple("Block", ["path", "name", "rows", "hours"])
+
+
+#######################################################################################################################
+
+def spread_bits(x):
+    """
+    Spreads the lower 16 bits of every value to the even bit positions
+    """
+    x = x.astype(np.uint64) & np.uint64(0xFFFF)
+    for shift, mask in [(8, 0x00FF00FF), (4, 0x0F0F0F0F), (2, 0x33333333), (1, 0x55555555)]:
+        x = (x | (x << np.uint64(shift))) & np.uint64(mask)
+    return x
+
+
+def morton_key(lat, lng):
+    """
+    Z-order curve key of latitude and longitude, on a 16 bit grid per axis. NaN coordinates get the largest key
+
+    Parameters
+    ----------
+    lat, lng : array-like
+
+    Returns
+    -------
+    key : numpy array of uint64
+    """
+    lat = np.asarray(lat, dtype=float)
+    lng = np.asarray(lng, dtype=float)
+    nan = np.isnan(lat) | np.isnan(lng)
+
+    scale = 2**16 - 1
+    q_lat = np.clip(np.nan_to_num((lat + 90) / 180 * scale), 0, scale)
+    q_lng = np.clip(np.nan_to_num((lng + 180) / 360 * scale), 0, scale)
+
+    key = spread_bits(q_lng) | (spread_bits(q_lat) << np.uint64(1))
+    key[nan] = np.uint64(2**32)
+
+    return key
+
+
+#######################################################################################################################
+
+def cluster_day(date, block_rows=20000):
+    """
+    Writes the clustered layout of a day: readings of all hours sorted by Morton key of lat, lng,
+    in blocks of block_rows rows. The source hour of every reading is kept in an hour column
+
+    Parameters
+    ----------
+    date : str
+        Format yyyy/mm/dd
+
+    block_rows : int, default 20000
+        Rows per block, smaller blocks prune better but add per block overhead
+
+    Returns
+    -------
+    path : str
+        Path to clustered file, None if there's no data
+    """
+    folder = get_day_folder_path(date)
+    hours = get_hours_with_data(date)
+    if len(hours) == 0:
+        return
+
+    df = pd.concat([pack.read_csv(f"{folder}{add_lead_zero(h)}.{EXTENSION}").assign(hour=h) for h in hours], ignore_index=True)
+    df = df.iloc[np.argsort(morton_key(df["lat"], df["lng"]), kind="stable")]
+
+    members, meta = {}, {}
+    for i, start in enumerate(range(0, len(df), block_rows)):
+        block = df.iloc[start:start+block_rows]
+        name = f"block_{i:05d}.csv.gz"
+
+        bounds = {f"{col}_{stat}": (None if pd.isna(value) else float(value))
+                  for col in ["lat", "lng"] for stat, value in [("min", block[col].min()), ("max", block[col].max())]}
+
+        members[name] = gzip.compress(block.to_csv(index=False).encode())
+        meta[name] = {"rows": len(block), "hours": sorted(int(h) for h in block["hour"].unique()), **bounds}
+
+    path = os.path.join(folder, CLUSTER_NAME)
+    pack.write_pack(path, members, meta)
+
+    return path
+
+
+def cluster_days(date_range, block_rows=20000):
+    """
+    Writes the clustered layout of every day between specified dates, see cluster_day
+    """
+    for date in generate_date_list(date_range[0], date_range[-1]):
+        cluster_day(date, block_rows)
+
+
+#######################################################################################################################
+
+def intersects(low, high, bounds):
+    """
+    Checks if the range [low, high] intersects bounds (lower, upper), None for an open end
+    """
+    if bounds is None:
+        return True
+    if low is None:
+        return False
+    lower, upper = bounds
+    return (lower is None or high >= lower) and (upper is None or low <= upper)
+
+
+def find_blocks(folder, hours, lat_bounds=None, lng_bounds=None):
+    """
+    Returns the blocks of the clustered file of a day folder that can hold readings in the given hours and bounds.
+    Returns None if there's no clustered file, or if it's older than the hourly data of the folder
+
+    Parameters
+    ----------
+    folder : str
+        Day folder path
+
+    hours : array-like of int
+        Wanted hours
+
+    lat_bounds, lng_bounds : tuple, default None
+        (lower, upper) limits, None for an open end
+    """
+    path = os.path.join(folder, CLUSTER_NAME)
+    opened = pack.open_pack_file(path)
+    if opened is None:
+        return None
+
+    # hourly files changed after clustering, the clustered file is stale
+    cluster_mtime = os.stat(path).st_mtime_ns
+    for name in os.listdir(folder):
+        if (pack.is_hourly_file(name) or name == pack.PACK_NAME) and os.stat(os.path.join(folder, name)).st_mtime_ns > cluster_mtime:
+            return None
+
+    hours = set(int(h) for h in hours)
+    blocks = []
+    for name, entry in opened[0].items():
+        block_hours = hours & set(entry["hours"])
+        if block_hours and intersects(entry["lat_min"], entry["lat_max"], lat_bounds) and intersects(entry["lng_min"], entry["lng_max"], lng_bounds):
+            blocks.append(Block(path, name, entry["rows"], sorted(block_hours)))
+
+    return blocks
+
+
+#######################################################################################################################
+
+def read_block(block, columns, skiprows=None):
+    """
+    Reads columns of a block, only rows of the block hours
+
+    Parameters
+    ----------
+    block : Block
+
+    columns : list of str
+
+    skiprows : array-like of int, default None
+        Line numbers of the block to skip (0 is the header), passed to pd.read_csv
+    """
+    data = pack.read_member(None, block.name, path=block.path)
+    df = pd.read_csv(io.BytesIO(data), compression="gzip", usecols=list(columns)+["hour"], skiprows=skiprows)
+
+    return df[df["hour"].isin(block.hours)][list(columns)]
+
+
+#######################################################################################################################
+
+if __name__ == "__main__":
+
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Write the spatially clustered layout of every day folder")
+    parser.add_argument("start_date", help="yyyy/mm/dd")
+    parser.add_argument("end_date", help="yyyy/mm/dd")
+    parser.add_argument("--block-rows", type=int, default=20000, help="rows per block")
+    args = parser.parse_args()
+
+    cluster_days((args.start_date, args.end_date), args.block_rows)
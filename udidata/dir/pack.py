@@ -0,0 +1,341 @@
+import io
+import os
+import re
+import gzip
+import json
+import mmap
+import struct
+import threading
+from collections import OrderedDict
+import pandas as pd
+from ..settings import COMPRESSION
+
+
+#######################################################################################################################
+
+# A pack is one file per day folder holding all the files of the day (hourly csv files and agg files) as members.
+# Layout: MAGIC, length of the table of contents (uint64), table of contents (json), members data.
+# The table of contents maps member names to their offset and size in the pack, and row count for csv members.
+
+PACK_NAME = "day.pack"
+MAGIC = b"UDIPACK1"
+HEADER = struct.Struct("<8sQ")
+
+# hourly data files, agg files of a day folder start with digits too (20170505_daily_agg...)
+HOURLY_FILE = re.compile(r"\d\d\.csv(\.gz)?")
+
+# open packs by path, least recently used first: (mtime, file, mmap, toc). Every open pack holds file descriptors,
+# so at most MAX_OPEN_PACKS are kept open. Loaders read packs from threads (see aio), the lock guards the cache
+MAX_OPEN_PACKS = 32
+_open_packs = OrderedDict()
+_lock = threading.RLock()
+
+
+#######################################################################################################################
+
+def pack_path(folder):
+    """
+    Returns path of the pack file of a day folder
+    """
+    return os.path.join(folder, PACK_NAME)
+
+
+#######################################################################################################################
+
+def is_hourly_file(name):
+    """
+    Checks if a file name is the name of an hourly data file (00.csv.gz to 23.csv.gz)
+    """
+    return HOURLY_FILE.fullmatch(name) is not None
+
+
+def member_rows(name, data):
+    """
+    Counts data rows of a csv member (without header), None for members which are not hourly data files
+    """
+    if not is_hourly_file(name):
+        return None
+    if name.endswith(".gz"):
+        data = gzip.decompress(data)
+    # the last row might have no trailing newline
+    lines = data.count(b"\n") + (len(data) > 0 and not data.endswith(b"\n"))
+    return max(lines - 1, 0)
+
+
+#######################################################################################################################
+
+def pack_folder(folder, remove=False):
+    """
+    Packs all files of a day folder into a single pack file.
+    If the folder already has a pack, its members are kept unless a loose file with the same name replaces them.
+
+    Parameters
+    ----------
+    folder : str
+        Path to day folder
+
+    remove : bool, default False
+        If True, packed loose files are deleted
+
+    Returns
+    -------
+    path : str
+        Path to pack file
+    """
+    path = pack_path(folder)
+    names = sorted(name for name in os.listdir(folder) if not name.endswith(".pack") and os.path.isfile(os.path.join(folder, name)))
+
+    members = {name: read_member(folder, name) for name in list_members(folder) if name not in names}
+    for name in names:
+        with open(os.path.join(folder, name), "rb") as f:
+            members[name] = f.read()
+
+    write_pack(path, members, {name: {"rows": member_rows(name, data)} for name, data in members.items()})
+
+    if remove:
+        for name in names:
+            os.remove(os.path.join(folder, name))
+
+    return path
+
+
+#######################################################################################################################
+
+def write_pack(path, members, meta=None):
+    """
+    Writes a pack file
+
+    Parameters
+    ----------
+    path : str
+        Path to pack file
+
+    members : dict
+        Member names as keys, bytes as values
+
+    meta : dict, default None
+        Member names as keys, dicts of extra table of contents fields as values
+    """
+    toc = {}
+    offset = 0
+    for name, data in members.items():
+        toc[name] = {"offset": offset, "size": len(data), **(meta or {}).get(name, {})}
+        offset += len(data)
+
+    toc = json.dumps(toc).encode()
+
+    # write to a temp file and replace, so a pack is never left half written
+    close_pack_file(path)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, len(toc)))
+        f.write(toc)
+        for data in members.values():
+            f.write(data)
+    os.replace(tmp_path, path)
+
+
+#######################################################################################################################
+
+def pack_days(date_range, remove=False):
+    """
+    Packs every day folder with data between specified dates, see pack_folder
+
+    Parameters
+    ----------
+    date_range : array-like of str
+        A tuple in the form of (start_date, end_date). Dates must be in the following format: yyyy/mm/dd
+    """
+    from .utils import generate_date_list, get_day_folder_path    # dir.utils uses this module
+
+    for date in generate_date_list(date_range[0], date_range[-1]):
+        folder = get_day_folder_path(date)
+        if os.path.isdir(folder):
+            pack_folder(folder, remove)
+
+
+#######################################################################################################################
+
+def open_pack(folder):
+    """
+    Returns the table of contents and a memory map of the pack of folder, None if there's no pack.
+    Packs are opened once and kept open until they change on disk, or until MAX_OPEN_PACKS more recently used
+    packs are open. Read members with read_member, which holds the lock while copying from the memory map
+    """
+    return open_pack_file(pack_path(folder))
+
+
+def open_pack_file(path):
+    """
+    Returns the table of contents and a memory map of a pack file, None if it doesn't exist, see open_pack
+    """
+    with _lock:
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            close_pack_file(path)
+            return None
+
+        cached = _open_packs.get(path)
+        if cached is not None and cached[0] == mtime:
+            _open_packs.move_to_end(path)
+            return cached[3], cached[2]
+
+        close_pack_file(path)
+        toc, mm = map_pack_file(path, mtime)
+
+        # close the least recently used packs
+        while len(_open_packs) > MAX_OPEN_PACKS:
+            close_pack_file(next(iter(_open_packs)))
+
+        return toc, mm
+
+
+def map_pack_file(path, mtime):
+    """
+    Opens and memory maps a pack file, and adds it to the open packs
+    """
+    f = open(path, "rb")
+    mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    magic, toc_size = HEADER.unpack(mm[:HEADER.size])
+    if magic != MAGIC:
+        mm.close()
+        f.close()
+        raise ValueError(f"{path} is not a pack file")
+
+    toc = json.loads(mm[HEADER.size:HEADER.size+toc_size])
+
+    # offsets in the table of contents are relative to the end of it
+    start = HEADER.size + toc_size
+    for entry in toc.values():
+        entry["offset"] += start
+
+    _open_packs[path] = (mtime, f, mm, toc)
+    return toc, mm
+
+
+#######################################################################################################################
+
+def close_pack(folder):
+    """
+    Closes the open handle of the pack of folder, if there is one
+    """
+    close_pack_file(pack_path(folder))
+
+
+def close_pack_file(path):
+    """
+    Closes the open handle of a pack file, if there is one
+    """
+    with _lock:
+        cached = _open_packs.pop(path, None)
+        if cached is not None:
+            cached[2].close()
+            cached[1].close()
+
+
+#######################################################################################################################
+
+def list_members(folder):
+    """
+    Returns a list of member names of the pack of folder, empty if there's no pack
+    """
+    pack = open_pack(folder)
+    return list(pack[0]) if pack else []
+
+
+def read_member(folder, name, path=None):
+    """
+    Returns the bytes of a member of the pack of folder, or of the pack file path if given
+    """
+    # the copy is made under the lock, so another thread can't close the pack meanwhile
+    with _lock:
+        toc, mm = open_pack(folder) if path is None else open_pack_file(path)
+        entry = toc[name]
+        return mm[entry["offset"]:entry["offset"]+entry["size"]]
+
+
+#######################################################################################################################
+
+def find_member(path):
+    """
+    For a path of a file in a day folder, returns the table of contents entry of that file in the folder pack,
+    None if it isn't packed
+    """
+    folder, name = os.path.split(os.path.normpath(path))
+    pack = open_pack(folder)
+
+    if pack is None:
+        return None
+    return pack[0].get(name)
+
+
+#######################################################################################################################
+
+def exists(path):
+    """
+    Checks if a file exists, either as a loose file or as a member of its folder pack
+    """
+    return os.path.exists(path) or find_member(path) is not None
+
+
+#######################################################################################################################
+
+def fingerprint(path):
+    """
+    Returns (path, mtime, size) of a file. Packed files use the mtime of the pack and their member size,
+    missing files have None mtime and size
+    """
+    try:
+        stat = os.stat(path)
+        return path, stat.st_mtime_ns, stat.st_size
+    except OSError:
+        pass
+
+    entry = find_member(path)
+    if entry is None:
+        return path, None, None
+
+    return path, os.stat(pack_path(os.path.dirname(os.path.normpath(path)))).st_mtime_ns, entry["size"]
+
+
+#######################################################################################################################
+
+def read_csv(path, **kwargs):
+    """
+    pd.read_csv for files which might be packed. Loose files are read directly,
+    packed files are read from the memory mapped pack.
+
+    Parameters
+    ----------
+    path : str
+        Path to csv file
+
+    kwargs :
+        Passed to pd.read_csv
+    """
+    if os.path.exists(path):
+        kwargs.setdefault("compression", COMPRESSION)
+        return pd.read_csv(path, **kwargs)
+
+    folder, name = os.path.split(os.path.normpath(path))
+    if find_member(path) is None:
+        raise FileNotFoundError(path)
+
+    kwargs["compression"] = "gzip" if name.endswith(".gz") else None
+    return pd.read_csv(io.BytesIO(read_member(folder, name)), **kwargs)
+
+
+#######################################################################################################################
+
+if __name__ == "__main__":
+
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Pack the files of every day folder into a single file")
+    parser.add_argument("start_date", help="yyyy/mm/dd")
+    parser.add_argument("end_date", help="yyyy/mm/dd")
+    parser.add_argument("--remove", action="store_true", help="delete loose files after packing")
+    args = parser.parse_args()
+
+    pack_days((args.start_date, args.end_date), args.remove)
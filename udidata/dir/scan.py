@@ -0,0 +1,278 @@
+import io
+import os
+import re
+import json
+import zlib
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+from .. import settings
+from ..settings import COL_NAMES
+from . import pack
+from .utils import generate_date_list, get_day_folder_path
+
+
+#######################################################################################################################
+
+# Integrity scanner of the archive. Every hourly and agg file (loose or packed) is checked for:
+# a complete gzip stream, the expected header, a row count matching the pack table of contents and monotonic raw_time.
+# Results are kept in a json file in DATA_DIR by file fingerprint (see pack.fingerprint), so re-scans only check
+# files that changed. With settings.SKIP_BAD_FILES, loaders skip files the last scan found bad.
+
+RESULTS_NAME = "scan.json"
+
+AGG_FILE = re.compile(r"_(daily|hourly|monthly|yearly)_agg.*\.csv(\.gz)?$")
+
+# header of agg files, without the atmospheric columns
+AGG_INDEX = {"hourly": ["hour", "lat", "lng", "stat"], "other": ["lat", "lng", "stat"]}
+
+# cached results file: (mtime, results)
+_results = {}
+
+
+#######################################################################################################################
+
+def results_path():
+    return os.path.join(settings.DATA_DIR, RESULTS_NAME)
+
+
+#######################################################################################################################
+
+def read_bytes(path):
+    """
+    Returns the (compressed) bytes of a loose or packed file
+    """
+    if os.path.exists(path):
+        with open(path, "rb") as f:
+            return f.read()
+
+    folder, name = os.path.split(os.path.normpath(path))
+    return pack.read_member(folder, name)
+
+
+def decompress(data):
+    """
+    Decompresses a whole gzip stream, raises ValueError if it's truncated or corrupt
+    """
+    decompressor = zlib.decompressobj(zlib.MAX_WBITS | 16)
+    try:
+        text = decompressor.decompress(data)
+    except zlib.error as e:
+        raise ValueError(f"corrupt gzip stream: {e}")
+    if not decompressor.eof:
+        raise ValueError("truncated gzip stream")
+
+    return text
+
+
+#######################################################################################################################
+
+def check_file(path):
+    """
+    Checks one hourly or agg file
+
+    Parameters
+    ----------
+    path : str
+        Path to file, loose or packed
+
+    Returns
+    -------
+    result : dict
+        path, fingerprint (mtime, size), rows, errors (the file can't be read correctly) and warnings
+    """
+    path = os.path.normpath(path)
+    _, mtime, size = pack.fingerprint(path)
+    result = {"path": path, "mtime": mtime, "size": size, "rows": None, "errors": [], "warnings": []}
+
+    try:
+        text = read_bytes(path)
+        if path.endswith(".gz"):
+            text = decompress(text)
+    except (OSError, ValueError) as e:
+        result["errors"].append(str(e))
+        return result
+
+    # header
+    header = text[:text.find(b"\n")].decode(errors="replace").strip().split(",")
+    name = os.path.basename(path)
+
+    if pack.is_hourly_file(name):
+        expected = list(COL_NAMES.values())
+        if header != expected:
+            result["errors"].append(f"header {header} doesn't match COL_NAMES")
+    else:
+        expected = AGG_INDEX["hourly" if "_hourly_agg" in name else "other"]
+        if header[:len(expected)] != expected:
+            result["errors"].append(f"header {header} doesn't start with {expected}")
+
+    # rows, every row is parsed
+    try:
+        df = pd.read_csv(io.BytesIO(text), usecols=["raw_time"] if "raw_time" in header else None)
+    except (ValueError, pd.errors.ParserError) as e:
+        result["errors"].append(f"can't parse: {e}")
+        return result
+
+    result["rows"] = len(df)
+
+    entry = None if os.path.exists(path) else pack.find_member(path)
+    if entry is not None and entry.get("rows") is not None and entry["rows"] != len(df):
+        result["errors"].append(f"{len(df)} rows, pack table of contents says {entry['rows']}")
+
+    if "raw_time" in df.columns:
+        raw_time = df["raw_time"].to_numpy()
+        if np.any(np.diff(raw_time) < 0):
+            result["warnings"].append("raw_time is not monotonic")
+
+    return result
+
+
+#######################################################################################################################
+
+def list_files(date_range=None):
+    """
+    Returns paths of all hourly and agg files (loose and packed) in DATA_DIR, or in day folders between specified dates
+    """
+    if date_range is None:
+        folders = [folder for folder, _, _ in os.walk(settings.DATA_DIR)]
+    else:
+        folders = [get_day_folder_path(date) for date in generate_date_list(date_range[0], date_range[-1])]
+
+    paths = []
+    for folder in folders:
+        if not os.path.isdir(folder):
+            continue
+        names = set(os.listdir(folder)) | set(pack.list_members(folder))
+        paths += [os.path.normpath(os.path.join(folder, name)) for name in sorted(names)
+                  if pack.is_hourly_file(name) or AGG_FILE.search(name)]
+
+    return paths
+
+
+#######################################################################################################################
+
+def load_results():
+    """
+    Returns the results of previous scans, a dict of results by path (see check_file)
+    """
+    path = results_path()
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return {}
+
+    if _results.get("mtime") != mtime:
+        with open(path) as f:
+            _results.update(mtime=mtime, results=json.load(f))
+
+    return _results["results"]
+
+
+def save_results(results):
+    path = results_path()
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(results, f)
+    os.replace(tmp_path, path)
+
+
+#######################################################################################################################
+
+def scan(date_range=None, workers=8, refresh=False, processes=True):
+    """
+    Checks every hourly and agg file in DATA_DIR (see check_file) in parallel.
+    Files with the same fingerprint as in the previous scan are not checked again
+
+    Parameters
+    ----------
+    date_range : array-like of str, default None
+        (start_date, end_date) in the format yyyy/mm/dd, to scan only these day folders. All of DATA_DIR if None
+
+    workers : int, default 8
+        Number of parallel workers
+
+    refresh : bool, default False
+        If True, all files are checked again
+
+    processes : bool, default True
+        If False, workers are threads
+
+    Returns
+    -------
+    results : pandas DataFrame
+        A row for every scanned file: path, mtime, size, rows, errors, warnings and ok
+    """
+    previous = {} if refresh else load_results()
+    paths = list_files(date_range)
+
+    def is_current(path):
+        entry = previous.get(path)
+        return entry is not None and (entry["mtime"], entry["size"]) == pack.fingerprint(path)[1:]
+
+    todo = [path for path in paths if not is_current(path)]
+
+    executor = ProcessPoolExecutor if processes else ThreadPoolExecutor
+    with executor(workers) as pool:
+        checked = list(pool.map(check_file, todo, chunksize=16) if processes else pool.map(check_file, todo))
+
+    results = {**load_results(), **{result["path"]: result for result in checked}}
+
+    # a full scan drops files that don't exist anymore
+    if date_range is None:
+        results = {path: results[path] for path in paths}
+    save_results(results)
+
+    df = pd.DataFrame([results[path] for path in paths],
+                      columns=["path", "mtime", "size", "rows", "errors", "warnings"])
+    df["ok"] = df["errors"].map(len) == 0
+
+    return df
+
+
+#######################################################################################################################
+
+def is_bad(path):
+    """
+    Checks if the last scan found a file bad (with errors), and the file didn't change since
+    """
+    result = load_results().get(os.path.normpath(path))
+    if result is None or len(result["errors"]) == 0:
+        return False
+
+    return (result["mtime"], result["size"]) == pack.fingerprint(os.path.normpath(path))[1:]
+
+
+def skip_bad_files(paths):
+    """
+    If settings.SKIP_BAD_FILES is set, returns paths without files the last scan found bad (see is_bad).
+    Otherwise returns paths as is
+    """
+    if not settings.SKIP_BAD_FILES:
+        return paths
+
+    bad = [path for path in paths if is_bad(path)]
+    if bad:
+        print(f"Skipping files with errors in the last scan: {bad}")
+
+    return [path for path in paths if path not in bad]
+
+
+#######################################################################################################################
+
+if __name__ == "__main__":
+
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Check the integrity of the hourly and agg files of the archive")
+    parser.add_argument("start_date", nargs="?", help="yyyy/mm/dd, all of DATA_DIR if not given")
+    parser.add_argument("end_date", nargs="?", help="yyyy/mm/dd")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--refresh", action="store_true", help="check all files again, not only changed ones")
+    args = parser.parse_args()
+
+    date_range = None if args.start_date is None else (args.start_date, args.end_date or args.start_date)
+    results = scan(date_range, args.workers, args.refresh)
+
+    print(f"{len(results)} files, {(~results['ok']).sum()} with errors, {(results['warnings'].map(len) > 0).sum()} with warnings")
+    for row in results[~results["ok"] | (results["warnings"].map(len) > 0)].itertuples():
+        print(row.path, "; ".join(row.errors + row.warnings))
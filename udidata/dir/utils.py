@@ -4,6 +4,7 @@ import numpy as np
 import pandas as pd
 from ..settings import DATA_DIR, EXTENSION
 from ..utils.utils import is_numeric
+from . import pack
 
 
 #######################################################################################################################
@@ -141,8 +142,8 @@ def hour_exists(date, hour):
     # construct full file path
     file_path = f"{folder_path}/{hour}.{EXTENSION}"
     
-    # check if file exists
-    return os.path.exists(file_path)
+    # check if file exists, loose or packed
+    return pack.exists(file_path)
 
 
 #######################################################################################################################
@@ -172,9 +173,13 @@ def get_hours_with_data(date):
     """
     # check if data exists at all for this date
     if data_exists(date):
+
+        # list the folder and its pack once, instead of checking every hour file
+        folder_path = get_day_folder_path(date)
+        names = set(os.listdir(folder_path)) | set(pack.list_members(folder_path))
         
         # create a masked array. Indicies with True value are hours with data
-        masked_array = [hour_exists(date, h) for h in map(add_lead_zero, range(24))]
+        masked_array = [f"{h}.{EXTENSION}" in names for h in map(add_lead_zero, range(24))]
         return np.arange(24)[masked_array]
             
     else:
@@ -0,0 +1,300 @@
+"""
+Live ingestion: polls DATA_DIR for new or changed hourly files and updates the aggregates they feed, for example:
+
+    from udidata.ingest import Ingestor
+    Ingestor(interval=30).run()
+
+or from the command line: python -m udidata.ingest --interval 30
+
+Every new hourly file is aggregated into its hour and the hourly agg file of its day is updated in place.
+The daily agg of a day in progress is merged from its hours (see calculate.merge), so it has no median.
+Once the day is over and all of its hourly files settled, the daily agg is recalculated from the raw data of the day
+(like the original pipeline, so it has median). Monthly and yearly aggs of the day are rebuilt from the daily
+and monthly agg files, rollups that fail are tried again on the next poll.
+"""
+import os
+import json
+import time
+import numpy as np
+import pandas as pd
+from . import load, settings
+from .calculate.agg import spatial_agg, spatial_hour_agg, monthly_spatial_agg, yearly_spatial_agg
+from .calculate.merge import merge_stats
+from .dir import pack
+from .dir.utils import generate_date_list, get_day_folder_path, get_hours_with_data, add_lead_zero
+from .settings import EXTENSION
+
+
+#######################################################################################################################
+
+STATE_NAME = "ingest.json"
+
+
+#######################################################################################################################
+
+class Ingestor:
+    """
+    Polls recent day folders for new or changed hourly files and updates hourly, daily, monthly and yearly aggs
+
+    Parameters
+    ----------
+    cols : list of str, default ["temperature", "pressure", "humidity", "magnetic_tot"]
+        Variables to aggregate
+
+    deg : int or float, default None
+        Grid resolution level of the agg files to update. If None, the original agg files (2.5 degrees)
+
+    interval : float, default 30
+        Seconds between polls. Files are aggregated at most interval + settle seconds (plus processing) after they land
+
+    lookback_days : int, default 1
+        Day folders before today (UTC) to watch too, for late files
+
+    settle : float, default 5
+        Seconds a file must be unchanged before it's ingested, so files still being written are skipped
+    """
+
+    def __init__(self, cols=["temperature", "pressure", "humidity", "magnetic_tot"], deg=None, interval=30, lookback_days=1, settle=5):
+        self.cols = list(cols)
+        self.deg = deg
+        self.interval = interval
+        self.lookback_days = lookback_days
+        self.settle = settle
+        self.state = self.load_state()
+        self.running = False
+
+    # state, kept in DATA_DIR so a restart doesn't ingest everything again:
+    # files - fingerprints of ingested files by path
+    # partial - dates with a daily agg merged from the hours (no median yet)
+    # failed - rollups to try again, yyyy/mm for months and yyyy for years
+
+    def state_path(self):
+        suffix = load.agg.deg_suffix(self.deg)
+        return os.path.join(settings.DATA_DIR, STATE_NAME.replace(".json", f"{suffix}.json"))
+
+    def load_state(self):
+        try:
+            with open(self.state_path()) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            state = {}
+
+        # state files of older versions are only the fingerprints
+        if "files" not in state:
+            state = {"files": state}
+        state.setdefault("partial", [])
+        state.setdefault("failed", [])
+        return state
+
+    def save_state(self):
+        path = self.state_path()
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.state, f)
+        os.replace(tmp_path, path)
+
+    #
+
+    def watched_dates(self):
+        """
+        Returns the dates (yyyy/mm/dd) of the day folders to watch
+        """
+        today = pd.Timestamp(utc_today().replace("/", "-"))
+        start = today - pd.Timedelta(days=self.lookback_days)
+        return generate_date_list(start.strftime("%Y/%m/%d"), today.strftime("%Y/%m/%d"))
+
+    def changed_files(self, dates, settled=True):
+        """
+        Returns a dict of dates and lists of hours with new or changed hourly files.
+        If settled is True, only files that settled are returned
+        """
+        changed = {}
+        now = time.time()
+
+        for date in dates:
+            for hour in get_hours_with_data(date):
+                path = f"{get_day_folder_path(date)}{add_lead_zero(hour)}.{EXTENSION}"
+                _, mtime, size = pack.fingerprint(path)
+
+                if mtime is None or self.state["files"].get(path) == [mtime, size] or (settled and now - mtime / 1e9 < self.settle):
+                    continue
+                changed.setdefault(date, []).append((int(hour), path, [mtime, size]))
+
+        return changed
+
+    def day_finished(self, date):
+        """
+        Checks if a day is over (UTC) and all of its hourly files settled and were ingested
+        """
+        return date < utc_today() and len(self.changed_files([date], settled=False)) == 0
+
+    def poll(self, dates=None):
+        """
+        Ingests new or changed hourly files once
+
+        Parameters
+        ----------
+        dates : list of str, default None
+            Dates to check, the watched dates (see lookback_days) if None
+
+        Returns
+        -------
+        ingested : list of tuple
+            (date, hour) of the ingested files
+
+        Errors of a day or a rollup are printed, the day or rollup is tried again on the next poll
+        """
+        before = json.dumps(self.state)
+        changed = self.changed_files(self.watched_dates() if dates is None else dates)
+        ingested = []
+        rollups = set(self.state["failed"])
+
+        for date, files in changed.items():
+            try:
+                self.update_day(date, [hour for hour, _, _ in files])
+            except Exception as e:
+                # the files are tried again on the next poll
+                print(f"Failed to ingest {date}: {e!r}")
+                continue
+
+            for hour, path, fingerprint in files:
+                self.state["files"][path] = fingerprint
+                ingested.append((date, hour))
+            if date not in self.state["partial"]:
+                self.state["partial"].append(date)
+            rollups.update(["/".join(date.split("/")[:2]), date.split("/")[0]])
+
+        # daily aggs with median, read once when the day is over
+        for date in list(self.state["partial"]):
+            if self.day_finished(date):
+                try:
+                    self.finish_day(date)
+                    self.state["partial"].remove(date)
+                except Exception as e:
+                    print(f"Failed to finish {date}: {e!r}")
+
+        # rollups are rebuilt from the agg files, months before years
+        self.state["failed"] = []
+        for rollup in sorted(rollups, key=lambda rollup: (-rollup.count("/"), rollup)):
+            try:
+                if "/" in rollup:
+                    self.update_month(*rollup.split("/"))
+                else:
+                    self.update_year(rollup)
+            except Exception as e:
+                print(f"Failed to update {rollup}: {e!r}")
+                self.state["failed"].append(rollup)
+
+        if json.dumps(self.state) != before:
+            self.save_state()
+
+        return ingested
+
+    def update_day(self, date, hours):
+        """
+        Aggregates hours of a date, replaces them in the hourly agg file of the date and merges the daily agg file
+        from the hourly agg (without median, see finish_day). Only the files of the given hours are read
+        """
+        grid_deg = 2.5 if self.deg is None else self.deg
+        hourly_path = load.agg.hourly_path(date, self.deg)
+
+        new = {hour: spatial_hour_agg(date, hour, self.cols, grid_deg) for hour in hours}
+        new = {hour: agg for hour, agg in new.items() if agg is not None}
+        new = pd.concat(new, names=["hour"]) if new else None
+
+        # replace the hours in the existing hourly agg, variables of either side are kept
+        hourly = [new]
+        if pack.exists(hourly_path):
+            existing = pack.read_csv(hourly_path, index_col=["hour", "lat", "lng", "stat"])
+            hourly.append(existing[~existing.index.get_level_values("hour").isin(hours)])
+
+        hourly = [agg for agg in hourly if agg is not None and len(agg) > 0]
+        if len(hourly) == 0:
+            # none of the hours has data
+            return
+
+        hourly = pd.concat(hourly).sort_index()
+        hourly.columns.names = ["atmos"]
+        write_agg(hourly, hourly_path)
+
+        keys = lambda index: {name: np.asarray(index.get_level_values(name), dtype=float) for name in ["lat", "lng"]}
+        write_agg(merge_stats(hourly, keys), load.agg.day_path(date, self.deg))
+
+    def finish_day(self, date):
+        """
+        Recalculates the daily agg file of a finished day from its raw data, statistics like median
+        can't be merged from the hours
+        """
+        grid_deg = 2.5 if self.deg is None else self.deg
+        df = load.day(date, columns=["lat", "lng"]+self.cols)
+        if isinstance(df, pd.DataFrame):
+            write_agg(spatial_agg(df, deg=grid_deg), load.agg.day_path(date, self.deg))
+
+    def update_month(self, year, month):
+        agg = monthly_spatial_agg(int(year), int(month), self.deg)
+        if agg is not None:
+            write_agg(agg, load.agg.month_path(int(year), int(month), self.deg))
+
+    def update_year(self, year):
+        agg = yearly_spatial_agg(int(year), self.deg)
+        if agg is not None:
+            write_agg(agg, load.agg.year_path(int(year), self.deg))
+
+    def run(self):
+        """
+        Polls every interval seconds until stop is called (or KeyboardInterrupt)
+        """
+        self.running = True
+        try:
+            while self.running:
+                start = time.time()
+                try:
+                    for date, hour in self.poll():
+                        print(f"Ingested {date} {add_lead_zero(hour)}")
+                except Exception as e:
+                    # for example DATA_DIR being unavailable for a moment, polling goes on
+                    print(f"Poll failed: {e!r}")
+                time.sleep(max(self.interval - (time.time() - start), 0))
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.running = False
+
+    def stop(self):
+        self.running = False
+
+
+#######################################################################################################################
+
+def utc_today():
+    """
+    Returns today's date (UTC), format yyyy/mm/dd
+    """
+    return pd.Timestamp.now(tz="UTC").strftime("%Y/%m/%d")
+
+
+#######################################################################################################################
+
+def write_agg(agg, path):
+    """
+    Writes an agg file, to a temp file which replaces path, so readers never see half a file
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    agg.to_csv(tmp_path, compression="gzip" if path.endswith(".gz") else None)
+    os.replace(tmp_path, path)
+
+
+#######################################################################################################################
+
+if __name__ == "__main__":
+
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Watch DATA_DIR for new hourly files and update the aggregates")
+    parser.add_argument("--interval", type=float, default=30, help="seconds between polls")
+    parser.add_argument("--lookback-days", type=int, default=1, help="days before today to watch too")
+    parser.add_argument("--deg", type=float, default=None, help="grid resolution level of the agg files")
+    args = parser.parse_args()
+
+    Ingestor(deg=args.deg, interval=args.interval, lookback_days=args.lookback_days).run()
@@ -1,2 +1,4 @@
-from .raw import day, days
-from . import agg
\ No newline at end of file
+from .raw import day, days, scan
+from . import agg
+from .query import query
+from .where import col
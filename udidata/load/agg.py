@@ -1,4 +1,9 @@
-from ..dir.utils import DATA_DIR, add_lead_zero, get_day_folder_path
+from concurrent.futures import ThreadPoolExecutor
+from ..dir.utils import DATA_DIR, add_lead_zero, get_day_folder_path, generate_date_list
+from ..dir import pack
+from ..utils.grid import grid_shape, grid_labels
+from .backends import check_backend, read_table, to_backend
+import numpy as np
 import pandas as pd
 
 #######################################################################################################################
@@ -7,7 +12,7 @@ import pandas as pd
 atmos = ["pressure", "temperature", "humidity", "magnetic_tot"]
 idx = ["lat", "lng", "stat"]
 
-def load_agg(path, atmos=atmos, idx=idx):
+def load_agg(path, atmos=atmos, idx=idx, backend="pandas"):
     """
     Loads an aggregated dataframe (specific format) from path
     
@@ -19,12 +24,18 @@ def load_agg(path, atmos=atmos, idx=idx):
     atmos: array-like, default ["pressure", "temperature", "humidity", "magnetic_tot"]
         All atmospheric propeties wished to retrieve
 
+    backend: "pandas", "arrow" or "polars", default "pandas"
+        Output format (see load.backends). Arrow and polars results have the index levels as columns
+
     Returns
     -------
     agg: pandas DataFrame
     """
+    check_backend(backend)
+    if backend != "pandas":
+        return to_backend(read_table(path, idx+list(atmos)), backend)
 
-    agg = pd.read_csv(path, index_col=idx, usecols=idx+atmos)
+    agg = pack.read_csv(path, index_col=idx, usecols=idx+atmos)
     agg.columns.names = ["atmos"]
     
     return agg
@@ -32,7 +43,63 @@ def load_agg(path, atmos=atmos, idx=idx):
 
 #######################################################################################################################
 
-def day(date, atmos=atmos):
+def deg_suffix(deg=None):
+    """
+    Returns the file name suffix of a grid resolution level, for example "_0.5deg".
+    deg=None stands for the original agg files (2.5 degrees) which have no suffix.
+
+    Parameters
+    ----------
+    deg: int or float, default None
+        Spatial degree interval of the grid
+    """
+    if deg is None:
+        return ""
+    return f"_{float(deg):g}deg"
+
+
+#######################################################################################################################
+
+def day_path(date, deg=None):
+    """
+    Returns the path of a daily agg file
+
+    Parameters
+    ----------
+    date: str
+        Format yyyy/mm/dd
+
+    deg: int or float, default None
+        Grid resolution level, None for the original agg files
+    """
+    return f"{get_day_folder_path(date)}{date.replace('/','')}_daily_agg{deg_suffix(deg)}.csv.gz"
+
+
+def hourly_path(date, deg=None):
+    """
+    Returns the path of an hourly agg file, see day_path
+    """
+    return f"{get_day_folder_path(date)}{date.replace('/','')}_hourly_agg{deg_suffix(deg)}.csv.gz"
+
+
+def month_path(year, month, deg=None):
+    """
+    Returns the path of a monthly agg file, see day_path
+    """
+    month = add_lead_zero(month)
+    return f"{DATA_DIR}/{year}/{month}/{year}{month}_monthly_agg{deg_suffix(deg)}.csv.gz"
+
+
+def year_path(year, deg=None):
+    """
+    Returns the path of a yearly agg file, see day_path
+    """
+    return f"{DATA_DIR}/{year}/{year}_yearly_agg{deg_suffix(deg)}.csv.gz"
+
+
+#######################################################################################################################
+
+def day(date, atmos=atmos, deg=None, backend="pandas"):
     
     """
     Returns a dataframe of daily aggregated data
@@ -41,15 +108,22 @@ def day(date, atmos=atmos):
     -------
     date: str
         Format yyyy/mm/dd
+
+    deg: int or float, default None
+        Grid resolution level to read (see calculate.pyramid.spatial_agg_pyramid).
+        If None, the original agg file is read
+
+    backend: "pandas", "arrow" or "polars", default "pandas"
+        Output format, see load_agg
     """
-    path = f"{get_day_folder_path(date)}{date.replace('/','')}_daily_agg.csv.gz"
+    path = day_path(date, deg)
     
-    return load_agg(path, atmos)
+    return load_agg(path, atmos, backend=backend)
 
 
 #######################################################################################################################
 
-def hourly(date, atmos=atmos):
+def hourly(date, atmos=atmos, deg=None, backend="pandas"):
     
     """
     Returns a dataframe of hourly aggregated data for a specific date
@@ -58,14 +132,20 @@ def hourly(date, atmos=atmos):
     -------
     date: str
         Format yyyy/mm/dd
+
+    deg: int or float, default None
+        Grid resolution level to read. If None, the original agg file is read
+
+    backend: "pandas", "arrow" or "polars", default "pandas"
+        Output format, see load_agg
     """
-    path = f"{get_day_folder_path(date)}{date.replace('/','')}_hourly_agg.csv.gz"
-    return load_agg(path, atmos, idx=["hour"]+idx)
+    path = hourly_path(date, deg)
+    return load_agg(path, atmos, idx=["hour"]+idx, backend=backend)
 
 
 #######################################################################################################################
 
-def month(year, month, atmos=atmos):
+def month(year, month, atmos=atmos, deg=None, backend="pandas"):
     
     """
     Returns a dataframe of monthly aggregated data
@@ -77,18 +157,23 @@ def month(year, month, atmos=atmos):
     
     month: int or str
         Format mm
+
+    deg: int or float, default None
+        Grid resolution level to read. If None, the original agg file is read
+
+    backend: "pandas", "arrow" or "polars", default "pandas"
+        Output format, see load_agg
     """
     
     # construct path for a month data folder
-    month = add_lead_zero(month)
-    path = f"{DATA_DIR}/{year}/{month}/{year}{month}_monthly_agg.csv.gz"
+    path = month_path(year, month, deg)
 
-    return load_agg(path, atmos)
+    return load_agg(path, atmos, backend=backend)
     
 
 #######################################################################################################################
 
-def year(year, atmos=atmos):
+def year(year, atmos=atmos, deg=None, backend="pandas"):
     """
     Returns a dataframe of yearly aggregated data
     
@@ -96,15 +181,21 @@ def year(year, atmos=atmos):
     ----------
     year : str or int
         Format yyyy
+
+    deg: int or float, default None
+        Grid resolution level to read. If None, the original agg file is read
+
+    backend: "pandas", "arrow" or "polars", default "pandas"
+        Output format, see load_agg
     """
 
-    path = f"{DATA_DIR}/{year}/{year}_yearly_agg.csv.gz"
-    return load_agg(path, atmos)
+    path = year_path(year, deg)
+    return load_agg(path, atmos, backend=backend)
 
 
 #######################################################################################################################
 
-def years(year_range):
+def years(year_range, atmos=atmos, deg=None):
     """
     Returns a concatanated xarray Dataset of yearly aggregated data for specified year range.
     The range is inclusive, for example, for [2014,2016] it will return data for 2014, 2015 and 2016
@@ -119,4 +210,108 @@ def years(year_range):
     df : an aggregated xarray Dataset
     """
 
-    pass
+    return dataset(year_range, freq="year", atmos=atmos, deg=deg)
+
+
+#######################################################################################################################
+
+# statistics of agg files, spatial_agg for daily and hourly files, monthly_spatial_agg for monthly and yearly files
+day_stats = ["count", "mean", "median", "std", "min", "max", "na_count", "na_pct"]
+month_stats = ["count", "mean", "median", "std", "min", "max", "days"]
+
+
+def dataset(date_range, freq="day", atmos=atmos, stats=None, deg=None, workers=8):
+    """
+    Reads agg files of a date range straight into a dense xarray Dataset with date, stat, lat and lng dimensions
+    (and hour for hourly files), the format plot.scatter_geo and plot.lines expect.
+    Arrays are preallocated for the whole grid and every file is scattered into them by index arithmetic,
+    files are read in parallel.
+
+    Parameters
+    ----------
+    date_range : array-like
+        Start and end (inclusive), yyyy/mm/dd for day and hourly, yyyy/mm for month, yyyy for year
+
+    freq : str, default "day"
+        Agg files to read, one of "day", "hourly", "month", "year"
+
+    atmos : array-like, default ["pressure", "temperature", "humidity", "magnetic_tot"]
+        Atmospheric propeties to read
+
+    stats : array-like, default None
+        Statistics to read, by default all the statistics of the agg files
+
+    deg : int or float, default None
+        Grid resolution level to read, None for the original agg files (2.5 degrees)
+
+    workers : int, default 8
+        Number of files read in parallel
+
+    Returns
+    -------
+    ds : xarray Dataset
+        Dates (or hours) with no file, and variables a file doesn't have, are NaN
+    """
+    import xarray as xr
+
+    start, end = date_range[0], date_range[-1]
+
+    if freq in ["day", "hourly"]:
+        labels = generate_date_list(start, end)
+        path_func = day_path if freq == "day" else hourly_path
+        paths = [path_func(date, deg) for date in labels]
+        dates = pd.to_datetime(labels, format="%Y/%m/%d")
+    elif freq == "month":
+        months = pd.period_range(pd.Period(str(start).replace("/", "-"), "M"), pd.Period(str(end).replace("/", "-"), "M"), freq="M")
+        paths = [month_path(m.year, m.month, deg) for m in months]
+        dates = months.to_timestamp()
+    elif freq == "year":
+        years = range(int(start), int(end)+1)
+        paths = [year_path(y, deg) for y in years]
+        dates = pd.to_datetime([f"{y}-01-01" for y in years])
+    else:
+        raise ValueError(f"freq must be one of day, hourly, month, year. Got {freq}")
+
+    if stats is None:
+        stats = day_stats if freq in ["day", "hourly"] else month_stats
+    stats = pd.Index(stats)
+
+    grid_deg = 2.5 if deg is None else deg
+    nlat, nlng = grid_shape(grid_deg)
+    lat_labels, lng_labels = grid_labels(grid_deg)
+
+    # preallocated dense arrays
+    shape = (len(paths), 24, len(stats), nlat, nlng) if freq == "hourly" else (len(paths), len(stats), nlat, nlng)
+    arrays = {prop: np.full(shape, np.nan) for prop in atmos}
+
+    def read(i):
+        # files might have only some of the variables (the ingestor writes the ones it aggregates), missing ones stay NaN
+        wanted = set((["hour"] if freq == "hourly" else [])+idx+list(atmos))
+        try:
+            df = pack.read_csv(paths[i], usecols=lambda col: col in wanted)
+        except FileNotFoundError:
+            return
+
+        # position of every row in the dense arrays
+        lat_idx = np.round((df["lat"].to_numpy() + 90) / grid_deg).astype(int)
+        lng_idx = np.round((df["lng"].to_numpy() + 180) / grid_deg).astype(int)
+        stat_idx = stats.get_indexer(df["stat"])
+        valid = stat_idx >= 0
+
+        pos = (i, df["hour"].to_numpy()[valid]) if freq == "hourly" else (i,)
+        pos = pos + (stat_idx[valid], lat_idx[valid], lng_idx[valid])
+
+        for prop in atmos:
+            if prop in df.columns:
+                arrays[prop][pos] = df[prop].to_numpy()[valid]
+
+    # every file writes to its own date slice, so threads don't collide
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(read, range(len(paths))))
+
+    dims = ("date", "hour", "stat", "lat", "lng") if freq == "hourly" else ("date", "stat", "lat", "lng")
+    coords = {"date": dates, "stat": list(stats), "lat": lat_labels, "lng": lng_labels}
+    if freq == "hourly":
+        coords["hour"] = np.arange(24)
+
+    return xr.Dataset({prop: (dims, arrays[prop]) for prop in atmos}, coords=coords)
@@ -0,0 +1,137 @@
+import os
+import numpy as np
+import pandas as pd
+from ..dir import pack, cluster
+
+
+#######################################################################################################################
+
+# Output backends of the loaders. "pandas" is the default, "arrow" returns pyarrow Tables and "polars" returns
+# polars DataFrames, built from Arrow without a pandas round trip (polars wraps the Arrow buffers without copying).
+# pyarrow (and polars for the polars backend) are optional dependencies.
+
+BACKENDS = ["pandas", "arrow", "polars"]
+
+# key of the sample fraction in the schema metadata of Arrow tables, see load.raw.day
+SAMPLE_KEY = b"udidata.sample"
+
+
+#######################################################################################################################
+
+def check_backend(backend, sample=None):
+    """
+    Validates the backend parameter of the loaders. A sampled load (sample parameter of load.raw.day) needs a backend
+    that keeps the sample fraction with the data, polars frames have no metadata to keep it in
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"backend must be one of {BACKENDS}, got {backend}")
+    if sample is not None and backend == "polars":
+        raise ValueError("sample can't be combined with the polars backend, it would lose the sample fraction. "
+                         "Use the arrow backend and convert with polars.from_arrow after aggregating")
+
+
+#######################################################################################################################
+
+def read_table(source, columns=None):
+    """
+    Reads an hourly csv file (loose or packed), a block of the clustered layout (see dir.cluster)
+    or an agg file to a pyarrow Table
+
+    Parameters
+    ----------
+    source : str or dir.cluster.Block
+
+    columns : list of str, default None
+        Columns to read, in this order. All columns if None
+    """
+    import pyarrow as pa
+    import pyarrow.csv as csv
+    import pyarrow.compute as pc
+
+    include = None if columns is None else list(columns)
+
+    if isinstance(source, cluster.Block):
+        data = pack.read_member(None, source.name, path=source.path)
+        stream = pa.input_stream(pa.py_buffer(data), compression="gzip")
+        if include is not None:
+            include = include + ["hour"]
+    elif os.path.exists(source):
+        # compression is detected by the file extension
+        stream = source
+    else:
+        folder, name = os.path.split(os.path.normpath(source))
+        if pack.find_member(source) is None:
+            raise FileNotFoundError(source)
+        stream = pa.input_stream(pa.py_buffer(pack.read_member(folder, name)), compression="gzip" if name.endswith(".gz") else None)
+
+    table = csv.read_csv(stream, convert_options=csv.ConvertOptions(include_columns=include))
+
+    if isinstance(source, cluster.Block):
+        table = table.filter(pc.is_in(table["hour"], pa.array(source.hours, type=table.schema.field("hour").type)))
+        table = table.drop_columns(["hour"])
+
+    return table
+
+
+#######################################################################################################################
+
+def to_backend(table, backend):
+    """
+    Converts a pyarrow Table to the output format of backend
+    """
+    if backend == "arrow":
+        return table
+    if backend == "polars":
+        import polars as pl
+        return pl.from_arrow(table)
+    return as_pandas(table)
+
+
+#######################################################################################################################
+
+def is_frame(data):
+    """
+    Checks if data is a frame of one of the backends (pandas DataFrame, pyarrow Table, polars DataFrame or LazyFrame)
+    """
+    library = type(data).__module__.split(".")[0]
+    return isinstance(data, pd.DataFrame) or (library in ["pyarrow", "polars"] and hasattr(data, "schema"))
+
+
+#######################################################################################################################
+
+def as_pandas(data, index=None):
+    """
+    Converts loader output of any backend (pyarrow Table, polars DataFrame or LazyFrame) to a pandas DataFrame,
+    pandas objects and other data are returned as is. The sample fraction of Arrow tables is kept in df.attrs
+
+    Parameters
+    ----------
+    data : pandas DataFrame, pyarrow Table, polars DataFrame or LazyFrame
+
+    index : list of str, default None
+        Columns to set as the index after conversion, if they are columns of data (agg data, see load.agg)
+    """
+    library = type(data).__module__.split(".")[0]
+
+    if library == "pyarrow":
+        metadata = data.schema.metadata or {}
+        df = data.to_pandas()
+        if SAMPLE_KEY in metadata:
+            df.attrs["sample"] = float(metadata[SAMPLE_KEY])
+    elif library == "polars":
+        if hasattr(data, "collect"):
+            data = data.collect()
+        df = data.to_pandas()
+    else:
+        return data
+
+    if index is not None:
+        index = [name for name in index if name in df.columns]
+        if index:
+            df = df.set_index(index)
+            df.columns.names = ["atmos"]
+
+    return df
+
+
+#######################################################################################################################
@@ -0,0 +1,154 @@
+import os
+import numpy as np
+import pandas as pd
+from ..dir import pack, cluster
+
+
+#######################################################################################################################
+
+def count_rows(path):
+    """
+    Returns the number of data rows of a csv file if it is known without reading the file, None otherwise.
+    Used to size a ColumnBuffer before loading, files with unknown counts are fitted by growing the buffer
+
+    Parameters
+    ----------
+    path : str or dir.cluster.Block
+        Path to csv file. Packed files and clustered blocks use the row count of the table of contents,
+        loose files are unknown (counting their lines would decompress them a second time)
+    """
+    if isinstance(path, cluster.Block):
+        return path.rows
+
+    if os.path.exists(path):
+        return None
+
+    return pack.find_member(path)["rows"]
+
+
+def known_rows(paths):
+    """
+    Sum of the row counts of paths that are known without reading them, see count_rows
+    """
+    return sum(count_rows(path) or 0 for path in paths)
+
+
+def sized_buffer(paths):
+    """
+    Returns a ColumnBuffer for the rows of paths: sized by their known row counts, with the on disk size
+    of the rest to estimate their rows from while loading
+    """
+    paths = list(paths)
+    unknown_bytes = sum(os.path.getsize(path) for path in paths if count_rows(path) is None)
+    return ColumnBuffer(known_rows(paths), unknown_bytes)
+
+
+#######################################################################################################################
+
+class ColumnBuffer:
+    """
+    Preallocated column arrays that DataFrames are copied into one after the other.
+    Replaces collecting DataFrames in a list and concatenating them, which holds every row twice at peak.
+
+    Files with unknown row counts (unknown_bytes on disk) are fitted by adding chunks of column arrays, sized by
+    an estimate: rows per byte of the unknown files appended so far, times the bytes still to come.
+    Filled rows are never copied while loading, chunks are joined column by column in to_frame.
+    """
+
+    def __init__(self, capacity, unknown_bytes=0):
+        self.capacity = int(capacity)
+        self.size = 0
+        self.chunks = []    # list of [column arrays, filled rows]
+        self.dtypes = None
+        self.unknown_bytes = unknown_bytes
+        self.read_bytes = 0
+        self.read_rows = 0
+
+    def add_chunk(self, capacity, dtypes):
+        self.chunks.append([{col: np.empty(capacity, dtype=dtype) for col, dtype in dtypes.items()}, 0])
+
+    def append(self, df, source=None):
+        """
+        Copies the rows of df to the end of the buffer. Columns are allocated with the dtypes of the first df,
+        and upcast if a later df needs it (for example int column with NaN values).
+        source is the file df was read from, files with unknown row counts update the estimate of the rest
+        """
+        n = len(df)
+        if self.dtypes is None:
+            self.dtypes = df.dtypes.copy()
+            self.add_chunk(self.capacity, {col: df[col].to_numpy().dtype for col in df.columns})
+
+        if source is not None and count_rows(source) is None:
+            self.read_bytes += os.path.getsize(source)
+            self.read_rows += n
+
+        arrays, filled = self.chunks[-1]
+        fit = min(n, len(next(iter(arrays.values()), [])) - filled)
+        self.copy_rows(df.iloc[:fit] if fit < n else df)
+
+        # row count estimate was too low (or unknown), the rest goes to a new chunk sized to the estimate
+        # of the unknown files still to come, at least a quarter of the buffer so there are few chunks
+        if fit < n:
+            estimate = 0
+            if self.read_bytes:
+                estimate = int(1.05 * self.read_rows / self.read_bytes * max(self.unknown_bytes - self.read_bytes, 0))
+            capacity = max(n - fit + estimate, self.capacity // 4)
+            self.add_chunk(capacity, {col: arr.dtype for col, arr in arrays.items()})
+            self.capacity += capacity
+            self.copy_rows(df.iloc[fit:])
+
+    def copy_rows(self, df):
+        """
+        Copies df to the last chunk, which has room for it
+        """
+        n = len(df)
+        arrays, filled = self.chunks[-1]
+
+        for col, arr in arrays.items():
+            values = df[col].to_numpy()
+
+            if values.dtype != arr.dtype:
+                arrays[col] = arr = arr.astype(np.result_type(arr.dtype, values.dtype))
+                self.dtypes[col] = arr.dtype
+
+            arr[filled:filled+n] = values
+
+        self.chunks[-1][1] += n
+        self.size += n
+
+    def to_frame(self, columns=None):
+        """
+        Returns the filled part of the buffer as a pandas DataFrame, without copying numeric columns of a buffer
+        with one chunk. If less than half of the buffer was filled (for example because of filters) the data is copied,
+        so the rest of the buffer can be freed. Chunks are joined one column at a time, freeing the chunks' column
+        as it's copied, so at most one column is held twice.
+
+        Parameters
+        ----------
+        columns : list of str, default None
+            Columns of an empty result, in case nothing was appended
+        """
+        if self.dtypes is None:
+            return pd.DataFrame(columns=columns)
+
+        if len(self.chunks) > 1:
+            joined = {}
+            for col in list(self.chunks[-1][0]):
+                joined[col] = np.concatenate([arrays[col][:filled] for arrays, filled in self.chunks])
+                for arrays, _ in self.chunks:
+                    del arrays[col]
+            self.chunks = [[joined, self.size]]
+            self.capacity = self.size
+
+        arrays, filled = self.chunks[0]
+        trim = (lambda arr: arr[:filled].copy()) if filled < self.capacity / 2 else (lambda arr: arr[:filled])
+
+        data = {}
+        for col, arr in arrays.items():
+            dtype = self.dtypes[col]
+            data[col] = trim(arr) if isinstance(dtype, np.dtype) else pd.array(arr[:filled], dtype=dtype)
+
+        return pd.DataFrame(data, copy=False)
+
+
+#######################################################################################################################
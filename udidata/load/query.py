@@ -0,0 +1,215 @@
+import pandas as pd
+from . import agg
+from .raw import day as raw_day
+from ..dir import pack
+from ..dir.utils import data_exists, get_hours_with_data
+
+
+# statistics that merge exactly from monthly and yearly agg files (their min, max, std and na_count describe daily means)
+EXACT_STATS = ["count", "mean"]
+
+
+#######################################################################################################################
+
+def parse_time(time, end=False):
+    """
+    Converts a query time to an hour timestamp. A date with no hour (yyyy/mm/dd) stands for
+    the first hour of the day, or the last one if end is True
+    """
+    stamp = pd.Timestamp(str(time).replace("/", "-"))
+    if end and stamp == stamp.normalize() and len(str(time)) <= 10:
+        stamp += pd.Timedelta(hours=23)
+    return stamp.floor("h")
+
+
+#######################################################################################################################
+
+def plan_query(time_range, resolution=None):
+    """
+    Splits a time range into the cheapest available sources: yearly, monthly, daily and hourly agg files, or raw data.
+    Coarse levels are used wherever the whole period is in the range and its agg file exists
+
+    Parameters
+    ----------
+    time_range : array-like
+        (start, end) inclusive, yyyy/mm/dd or yyyy/mm/dd HH
+
+    resolution : int or float, default None
+        Grid resolution level of agg files, None for the original agg files
+
+    Returns
+    -------
+    plan : list of tuples
+        (level, period) for every step, level is one of year, month, day, hourly, raw.
+        period is year, (year, month), date or (date, first_hour, last_hour)
+    """
+    start, end = parse_time(time_range[0]), parse_time(time_range[-1], end=True)
+    hour = pd.Timedelta(hours=1)
+
+    plan = []
+    cursor = start
+    while cursor <= end:
+        date = cursor.strftime("%Y/%m/%d")
+        day_start = cursor == cursor.normalize()
+
+        year_end = pd.Timestamp(year=cursor.year, month=12, day=31, hour=23)
+        if day_start and cursor.dayofyear == 1 and year_end <= end and pack.exists(agg.year_path(cursor.year, resolution)):
+            plan.append(("year", cursor.year))
+            cursor = year_end + hour
+            continue
+
+        month_end = cursor + pd.offsets.MonthEnd(0) + pd.Timedelta(hours=23)
+        if day_start and cursor.day == 1 and month_end <= end and pack.exists(agg.month_path(cursor.year, cursor.month, resolution)):
+            plan.append(("month", (cursor.year, cursor.month)))
+            cursor = month_end + hour
+            continue
+
+        day_end = cursor.normalize() + pd.Timedelta(hours=23)
+        if day_start and day_end <= end and pack.exists(agg.day_path(date, resolution)):
+            plan.append(("day", date))
+            cursor = day_end + hour
+            continue
+
+        # part of a day, or a day without a daily agg file
+        last = min(end, day_end)
+        if data_exists(date):
+            plan.extend(hour_steps(date, cursor.hour, last.hour, resolution))
+        cursor = last + hour
+
+    return plan
+
+
+#######################################################################################################################
+
+def hour_steps(date, first_hour, last_hour, resolution=None):
+    """
+    Plan steps of hours first_hour to last_hour of a date: runs of hours the hourly agg file covers are hourly steps,
+    runs of hours it misses (or all hours, if there's no hourly agg file) are raw steps
+    """
+    path = agg.hourly_path(date, resolution)
+    covered = set(pack.read_csv(path, usecols=["hour"])["hour"].astype(int)) if pack.exists(path) else set()
+    with_data = set(get_hours_with_data(date)) | covered
+
+    steps = []
+    for h in range(first_hour, last_hour+1):
+        if h not in with_data:
+            continue
+        level = "hourly" if h in covered else "raw"
+
+        # extend the previous step if it has the same level and ends an hour before
+        if steps and steps[-1][0] == level and steps[-1][1][2] == h-1:
+            steps[-1] = (level, (date, steps[-1][1][1], h))
+        else:
+            steps.append((level, (date, h, h)))
+
+    return steps
+
+
+#######################################################################################################################
+
+def run_step(level, period, variables, resolution):
+    """
+    Returns aggregated data (lat, lng, stat index) of one step of a query plan
+    """
+    # import here, calculate.agg uses the load package
+    from ..calculate.agg import spatial_agg
+    from ..calculate.merge import merge_spatial_aggs
+
+    if level == "year":
+        return agg.year(period, atmos=variables, deg=resolution)
+    if level == "month":
+        return agg.month(*period, atmos=variables, deg=resolution)
+    if level == "day":
+        return agg.day(period, atmos=variables, deg=resolution)
+
+    date, first_hour, last_hour = period
+
+    if level == "hourly":
+        hourly = agg.hourly(date, atmos=variables, deg=resolution)
+        hours = hourly.index.get_level_values("hour")
+        return merge_spatial_aggs([hourly[(hours >= first_hour) & (hours <= last_hour)]])
+
+    if not set(range(first_hour, last_hour+1)) & set(get_hours_with_data(date)):
+        return None
+
+    df = raw_day(date, columns=["lat", "lng"]+list(variables), hour_range=(first_hour, last_hour))
+    if isinstance(df, pd.DataFrame) and not df.empty:
+        return spatial_agg(df, deg=2.5 if resolution is None else resolution)
+
+
+#######################################################################################################################
+
+def query(variables, time_range, bbox=None, stats=("count", "mean"), resolution=None, explain=True):
+    """
+    Single entry point for spatial aggregations of any time range. The range is covered by the cheapest
+    available sources (yearly, monthly, daily, hourly agg files, raw data as a last resort) and the parts are merged.
+
+    Count and mean are merged exactly from any level. min, max, std and na_count of monthly and yearly agg files
+    describe daily means, so other statistics than count and mean are only returned for a plan of a single
+    monthly or yearly part, or of daily and finer parts.
+
+    Parameters
+    ----------
+    variables : array-like
+        Atmospheric properties, for example load.agg.atmos
+
+    time_range : array-like
+        (start, end) inclusive, yyyy/mm/dd or yyyy/mm/dd HH
+
+    bbox : tuple, default None
+        (lat_min, lat_max, lng_min, lng_max), grid cells intersecting the box are returned
+
+    stats : array-like, default ("count", "mean")
+        Statistics to return
+
+    resolution : int or float, default None
+        Grid resolution level (see calculate.pyramid.spatial_agg_pyramid), None for the original 2.5 degrees agg files
+
+    explain : bool, default True
+        If True, the chosen plan is printed
+
+    Returns
+    -------
+    agg : pandas DataFrame
+        Aggregated data with lat, lng and stat index. The plan is kept in agg.attrs["plan"]
+    """
+    from ..calculate.merge import merge_spatial_aggs
+
+    variables = list(variables)
+    plan = plan_query(time_range, resolution)
+
+    if explain:
+        print("Query plan:")
+        for level, period in plan:
+            print(f"    {level}: {period}")
+
+    inexact = sorted(set(stats) - set(EXACT_STATS))
+    if len(plan) > 1 and inexact and any(level in ["year", "month"] for level, _ in plan):
+        raise ValueError(f"{inexact} can't be merged from monthly or yearly agg files with other parts, "
+                         f"use stats {EXACT_STATS} or a range of daily and finer parts")
+
+    parts = [run_step(level, period, variables, resolution) for level, period in plan]
+    parts = [part for part in parts if isinstance(part, pd.DataFrame)]
+
+    if len(parts) == 0:
+        print(f"Sorry, no data found for {time_range[0]} to {time_range[-1]}")
+        return
+
+    result = parts[0] if len(parts) == 1 else merge_spatial_aggs(parts)
+
+    lat = result.index.get_level_values("lat").astype(float)
+    lng = result.index.get_level_values("lng").astype(float)
+    mask = result.index.get_level_values("stat").isin(stats)
+
+    if bbox is not None:
+        deg = 2.5 if resolution is None else resolution
+        lat_min, lat_max, lng_min, lng_max = bbox
+        mask &= (lat < lat_max) & (lat + deg > lat_min) & (lng < lng_max) & (lng + deg > lng_min)
+
+    result = result[mask]
+    result.attrs["plan"] = plan
+
+    return result
+
+
+#######################################################################################################################
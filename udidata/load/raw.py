@@ -1,13 +1,22 @@
 import os
+import tempfile
 import numpy as np
 import pandas as pd
 from ..settings import DATA_DIR, COMPRESSION, EXTENSION, COL_NAMES
 from ..dir.utils import get_day_folder_path, data_exists, generate_date_list, get_relevant_hours
+from ..dir import pack, cluster
+from ..dir.scan import skip_bad_files
+from ..utils.dedupe import as_seen_ids
+from .spill import parse_size, spill_frame, PartitionedFrame
+from .buffer import count_rows, sized_buffer
+from .where import compile_where
+from .backends import check_backend, read_table, to_backend, SAMPLE_KEY
 
 
 #######################################################################################################################
 
-def day(date, columns=COL_NAMES.values(), hour_range=(0,23), where=None, dropna=None):
+def day(date, columns=COL_NAMES.values(), hour_range=(0,23), where=None, dropna=None, dedupe=False, sample=None, seed=None,
+        backend="pandas"):
     
     """
     Returns a pandas DataFrame of daily raw data
@@ -23,18 +32,69 @@ def day(date, columns=COL_NAMES.values(), hour_range=(0,23), where=None, dropna=
     columns: list of str, default all columns
         Columns to return
 
-    where: dict, default None
+    where: dict or load.where expression, default None
         A dictionary of column names and the values to filter by, the dataframe is filtered to accomodate all conditions.
-        Meaning cond1 AND cond2 are to be met not cond1 OR cond2
+        Meaning cond1 AND cond2 are to be met not cond1 OR cond2. A value is a (lower, upper) range or a set of values.
+        For OR, NOT, open ranges and NaN tests use an expression, for example:
+        (col("pressure") > 900) | col("model").isin({"a", "b"}), see load.where
 
     dropna: str or array-like
         If string there are two options ‘any’, ‘all’.
         If array-like, it takes in column names to drop by
 
+    dedupe: bool or utils.dedupe.SeenIds, default False
+        If True, readings with an _id that already appeared in an earlier hour are dropped.
+        Pass a SeenIds object to keep track of ids across calls
+
+    sample: float, default None
+        Fraction of rows to keep, a random (Bernoulli) sample for approximate answers. The fraction is kept in
+        df.attrs["sample"] (in the schema metadata of Arrow tables), calculate.agg.spatial_agg uses it to scale counts and add confidence intervals.
+        Rows of packed files are skipped while parsing
+
+    seed: int or numpy Generator, default None
+        Seed of the sample
+
+    backend: "pandas", "arrow" or "polars", default "pandas"
+        Output format: pandas DataFrame, pyarrow Table or polars DataFrame (see load.backends).
+        Arrow and polars results are built from Arrow tables directly. polars can't be combined with sample
+
     Returns
     -------
     df: a concatanated pandas Dataframe
     """
+    check_backend(backend, sample)
+    csv_files = get_day_files(date, hour_range)
+
+    if csv_files:
+        seen = as_seen_ids(dedupe)
+        if seen is None:
+            csv_files = clustered_sources(date, csv_files, where)
+
+        # construct csv file
+        if backend == "pandas":
+            df = construct_day_df(csv_files, columns, dropna, where, seen, sample=sample, rng=seed)
+        else:
+            df = to_backend(construct_day_table(csv_files, columns, dropna, where, seen, sample, seed), backend)
+
+        if len(df) == 0:
+            print(f"On {date} no data matched your critiriea, try changing your where/na filters")
+        return df
+
+
+#######################################################################################################################
+
+def get_day_files(date, hour_range=(0,23)):
+    """
+    Returns a list of hourly csv files of a date in the desired hour range, None if there's no data
+
+    Parameters
+    ----------
+    date: str 
+        Expected date format is yyyy/mm/dd
+    
+    hour_range: int or tuple of int, default (0,23)
+        Range of hours of the day
+    """
 
     if data_exists(date):
 
@@ -47,13 +107,8 @@ def day(date, columns=COL_NAMES.values(), hour_range=(0,23), where=None, dropna=
 
         # create a list of relevant csv files
         folder_path = get_day_folder_path(date)
-        csv_files = [f"{folder_path}/{h}.{EXTENSION}" for h in relevant_hours]
-
-        # construct csv file
-        df = construct_day_df(csv_files, columns, dropna, where)
-        if df.empty:
-            print(f"On {date} no data matched your critiriea, try changing your where/na filters")
-        return df
+        # files the last integrity scan found bad are skipped if settings.SKIP_BAD_FILES is set
+        return skip_bad_files([f"{folder_path}/{h}.{EXTENSION}" for h in relevant_hours])
         
     else:
         print(f"No data at all for {date}")
@@ -62,7 +117,8 @@ def day(date, columns=COL_NAMES.values(), hour_range=(0,23), where=None, dropna=
 
 #######################################################################################################################
 
-def days(date_range, columns=COL_NAMES.values(), hour_range=(0,23), where=None, dropna=None):
+def days(date_range, columns=COL_NAMES.values(), hour_range=(0,23), where=None, dropna=None, dedupe=False, memory_budget=None,
+         sample=None, seed=None, backend="pandas"):
     """
     Returns a pandas DataFrame of data between specified dates
 
@@ -74,33 +130,128 @@ def days(date_range, columns=COL_NAMES.values(), hour_range=(0,23), where=None,
     dropna : str or array-like
         If string there are two options ‘any’, ‘all’.
         If array-like, it takes in column names to drop by
+
+    dedupe : bool or utils.dedupe.SeenIds, default False
+        If True, readings with an _id that already appeared (in any hour of any day of the range) are dropped
+
+    memory_budget : int or str, default None
+        Maximum memory (bytes, or a string like "4GB") for loaded days. Whenever the loaded days exceed the budget,
+        they are spilled to a temporary columnar store on disk, and a lazy load.spill.PartitionedFrame is returned
+        instead of a DataFrame
+
+    sample : float, default None
+        Fraction of rows to keep, see day
+
+    seed : int or numpy Generator, default None
+        Seed of the sample
+
+    backend : "pandas", "arrow" or "polars", default "pandas"
+        Output format, see day. memory_budget needs the pandas backend, for larger than memory Arrow data see scan
     """
+    check_backend(backend, sample)
+    if memory_budget is not None and backend != "pandas":
+        raise ValueError("memory_budget is only supported by the pandas backend")
 
     str_dates = generate_date_list(*date_range)
+    seen = as_seen_ids(dedupe)
+    rng = np.random.default_rng(seed)
 
-    # load dataframes from the wanted dates and put them in a list
-    dfs = [day(date, columns, hour_range, where, dropna) for date in str_dates]
-    
-    # make sure all entries in dfs are of type DataFrame before concatanation
-    dfs = list(filter(lambda x: isinstance(x, pd.DataFrame),dfs))
-    
-    if len(dfs) > 0:
-        df = pd.concat(dfs,ignore_index=True)
-        return df
+    if memory_budget is not None:
+        return days_with_budget(str_dates, columns, hour_range, where, dropna, seen, parse_size(memory_budget), sample, rng)
+
+    # list the files of the wanted dates, to size one buffer for all of them
+    day_files = [(date, get_day_files(date, hour_range)) for date in str_dates]
+    day_files = [files if seen is not None else clustered_sources(date, files, where) for date, files in day_files if files]
+
+    if len(day_files) > 0 and backend != "pandas":
+        import pyarrow as pa
+
+        # day tables are chained, not copied
+        tables = [construct_day_table(files, columns, dropna, where, seen, sample, rng) for files in day_files]
+        return to_backend(pa.concat_tables(tables, promote_options="permissive"), backend)
+
+    elif len(day_files) > 0:
+        buffer = sized_buffer(file for files in day_files for file in files)
+
+        # every day is copied straight into the buffer, no concatanation
+        for files in day_files:
+            construct_day_df(files, columns, dropna, where, seen, buffer, sample, rng)
+
+        return with_sample(buffer.to_frame(list(columns)), sample)
     else:
         print(f"Sorry, no data found for these dates: {date_range[0]} to {date_range[-1]}")
 
 
 #######################################################################################################################
 
-def construct_day_df(csv_files, columns, dropna, where):
+def days_with_budget(str_dates, columns, hour_range, where, dropna, seen, budget, sample=None, rng=None):
+    """
+    Loads days like days, spilling loaded days to disk whenever their memory usage exceeds budget (bytes).
+    Returns a pandas DataFrame if nothing was spilled, otherwise a PartitionedFrame
+    """
+    partitions = []
+    in_memory = 0
+    spill_dir = None
+
+    for date in str_dates:
+
+        df = day(date, columns, hour_range, where, dropna, seen, sample, rng)
+        if not isinstance(df, pd.DataFrame):
+            continue
+
+        partitions.append((date, df))
+        in_memory += df.memory_usage(deep=True).sum()
+
+        if in_memory > budget:
+            if spill_dir is None:
+                spill_dir = tempfile.mkdtemp(prefix="udidata_")
+
+            # spill all days held in memory
+            partitions = [(date, spill_frame(part, f"{spill_dir}/{date.replace('/','')}")) if isinstance(part, pd.DataFrame) else (date, part)
+                          for date, part in partitions]
+            in_memory = 0
+
+    if len(partitions) == 0:
+        print(f"Sorry, no data found for these dates: {str_dates[0]} to {str_dates[-1]}")
+        return
+
+    parts = [part for date, part in partitions]
+
+    if spill_dir is None:
+        return with_sample(pd.concat(parts, ignore_index=True), sample)
+
+    return PartitionedFrame(parts, columns, spill_dir=spill_dir)
+
+
+#######################################################################################################################
+
+def iter_days(date_range, columns=COL_NAMES.values(), hour_range=(0,23), where=None, dropna=None, dedupe=False, sample=None, seed=None,
+              backend="pandas"):
+    """
+    Generator version of days, yields a pandas DataFrame for every day with data between specified dates,
+    so only one day is held in memory at a time. Parameters are the same as days
+    """
+    seen = as_seen_ids(dedupe)
+    rng = np.random.default_rng(seed)
+
+    for date in generate_date_list(*date_range):
+
+        df = day(date, columns, hour_range, where, dropna, seen, sample, rng, backend)
+
+        if df is not None:
+            yield df
+
+
+#######################################################################################################################
+
+def construct_day_df(csv_files, columns, dropna, where, seen=None, buffer=None, sample=None, rng=None):
     """
     Returns pandas DataFrame
 
     Parameters
     ----------
     csv_files : list of str 
-        A list with exact path to csv files to be concatanated
+        A list with exact path to csv files to be concatanated (or dir.cluster.Block objects)
 
     columns : list of str
         Columns to return
@@ -109,27 +260,274 @@ def construct_day_df(csv_files, columns, dropna, where):
         If string there are two options ‘any’, ‘all’.
         If array-like, it takes in column names to drop by
     
-    where : dict, default None
-        A dictionary of column names and the values to filter by, the dataframe is filtered to accomodate all conditions.
-        Meaning cond1 AND cond2 are to be met not cond1 OR cond2
+    where : dict or load.where expression, default None
+        Filter, see day
+
+    seen : utils.dedupe.SeenIds, default None
+        If given, readings with an _id that was already seen are dropped, file by file
+
+    buffer : load.buffer.ColumnBuffer, default None
+        If given, rows are appended to buffer and nothing is returned. Otherwise a buffer is sized
+        by the known row counts of csv_files (see load.buffer.sized_buffer)
+
+    sample : float, default None
+        Fraction of rows to keep, see day
+
+    rng : int or numpy Generator, default None
+        Random generator (or seed) of the sample
 
     Returns
     -------
     df : pandas DataFrame
     """
+    columns = list(columns)
+    where = compile_where(where)
+    own_buffer = buffer is None
+    check_sample(sample)
+    rng = np.random.default_rng(rng)
+
+    # columns used by the filter are read too
+    read_columns = columns + sorted(where.columns() - set(columns)) if where is not None else columns
+
+    if own_buffer:
+        buffer = sized_buffer(csv_files)
+
+    # filter every file on its own and copy it to the buffer, so only one hour is held twice at a time
+    for file in csv_files:
+
+        # sampled rows of files with a known row count are skipped while parsing, other files are sampled after
+        skiprows = None if sample is None else sample_skiprows(file, sample, rng)
+
+        if seen is None:
+            df = read_source(file, read_columns, skiprows)
+        else:
+            df = read_new_rows(file, read_columns, seen, skiprows)
+
+        if sample is not None and skiprows is None:
+            df = df[rng.random(len(df)) < sample]
+
+        buffer.append(filter_df(df, dropna, where, columns)[columns], file)
+
+    if own_buffer:
+        return with_sample(buffer.to_frame(columns), sample)
+
+
+#######################################################################################################################
+
+def construct_day_table(csv_files, columns, dropna, where, seen=None, sample=None, rng=None):
+    """
+    Returns a pyarrow Table, the Arrow version of construct_day_df (same parameters).
+    Files are read by the pyarrow csv reader and filtered with one mask each
+    """
+    import pyarrow as pa
+
+    columns = list(columns)
+    where = compile_where(where)
+    check_sample(sample)
+    rng = np.random.default_rng(rng)
+
+    read_columns = columns + sorted(where.columns() - set(columns)) if where is not None else columns
+    if seen is not None:
+        read_columns = list(dict.fromkeys(read_columns + ["_id"]))
+
+    tables = []
+    for file in csv_files:
+
+        table = read_table(file, read_columns)
+        mask = np.ones(table.num_rows, dtype=bool)
+
+        if sample is not None:
+            mask &= rng.random(table.num_rows) < sample
+        if seen is not None:
+            mask[mask] = seen.filter(np.asarray(table["_id"].filter(pa.array(mask))))
+
+        mask &= filter_mask(table, dropna, where, columns)
+        tables.append(table.filter(pa.array(mask)).select(columns))
+
+    table = pa.concat_tables(tables, promote_options="permissive")
+
+    if sample is not None:
+        table = table.replace_schema_metadata({**(table.schema.metadata or {}), SAMPLE_KEY: str(sample).encode()})
+
+    return table
+
+
+#######################################################################################################################
+
+def filter_mask(table, dropna, where, columns):
+    """
+    Returns the bool mask of the dropna and where filters (see construct_day_df) for a pyarrow Table.
+    "any" and "all" look at the requested columns only, not at columns read for where
+    """
+    where = compile_where(where)
+    mask = np.ones(table.num_rows, dtype=bool) if where is None else where.mask(table)
 
-    dfs = [pd.read_csv(file, usecols=columns, compression=COMPRESSION)[columns] for file in csv_files]
-    dfs = [df for df in dfs if isinstance(df, pd.core.frame.DataFrame)]   # make sure all entries in dfs are of type DataFrame before concatanation
-    df = pd.concat(dfs, ignore_index=True)
+    if isinstance(dropna, str) and dropna in ["any", "all"]:
+        names = list(columns)
+    elif isinstance(dropna, (list, tuple)):
+        names = list(dropna)
+    else:
+        return mask
+
+    notna = np.column_stack([~pd.isna(np.asarray(table[name])) for name in names])
+    return mask & (notna.any(axis=1) if dropna == "all" else notna.all(axis=1))
+
+
+#######################################################################################################################
+
+def filter_df(df, dropna, where, columns):
+    """
+    Applies the dropna and where filters of construct_day_df to df, with one boolean mask.
+    "any" and "all" look at the requested columns only, not at columns read for where
+    """
+    where = compile_where(where)
+    mask = None if where is None else where.mask(df)
 
     if isinstance(dropna, str) and dropna in ["any", "all"]:
-        df.dropna(how=dropna, inplace=True)
+        notna = df[list(columns)].notna()
+        notna = notna.all(axis=1) if dropna == "any" else notna.any(axis=1)
+        mask = notna.to_numpy() if mask is None else mask & notna.to_numpy()
     elif isinstance(dropna, (list, tuple)):
-        df.dropna(subset=dropna, inplace=True)
+        notna = df[list(dropna)].notna().all(axis=1).to_numpy()
+        mask = notna if mask is None else mask & notna
+
+    if mask is None:
+        return df
+
+    return df[mask]
+
+
+#######################################################################################################################
+
+def read_new_rows(file, columns, seen, skiprows=None):
+    """
+    Reads a csv file and drops readings with an _id that was already seen
+
+    Parameters
+    ----------
+    file : str
+        Path to csv file
+
+    columns : list of str
+        Columns to return
+
+    seen : utils.dedupe.SeenIds
+        Ids seen so far, updated with the ids of the file
+
+    skiprows : array-like of int, default None
+        Line numbers to skip, see read_source
+    """
+    df = read_source(file, list(dict.fromkeys(list(columns) + ["_id"])), skiprows)
+    df = df[seen.filter(df["_id"])]
+
+    return df[columns]
+
+
+#######################################################################################################################
+
+def read_source(source, columns, skiprows=None):
+    """
+    Reads columns of an hourly csv file (loose or packed) or of a block of the clustered layout (see dir.cluster).
+    skiprows are line numbers to skip (0 is the header)
+    """
+    if isinstance(source, cluster.Block):
+        return cluster.read_block(source, columns, skiprows)
+
+    return pack.read_csv(source, usecols=columns, compression=COMPRESSION, skiprows=skiprows)[columns]
+
+
+#######################################################################################################################
+
+def check_sample(sample):
+    """
+    Validates the sample parameter of the loaders
+    """
+    if sample is not None and not 0 < sample <= 1:
+        raise ValueError(f"sample must be a fraction in (0, 1], got {sample}")
+
+
+def sample_skiprows(source, fraction, rng):
+    """
+    Returns line numbers of source to skip for a Bernoulli sample of fraction of its rows,
+    None if the row count of source isn't known without reading it (loose files)
+    """
+    rows = count_rows(source)
+    if rows is None:
+        return None
+
+    # line 0 is the header
+    return np.flatnonzero(rng.random(rows) >= fraction) + 1
+
+
+def with_sample(df, sample):
+    """
+    Records the sample fraction of a loaded DataFrame in df.attrs["sample"]
+    """
+    if sample is not None:
+        df.attrs["sample"] = sample
+    return df
+
+
+#######################################################################################################################
+
+def clustered_sources(date, csv_files, where):
+    """
+    If where limits lat or lng and the day has an up to date clustered layout (see dir.cluster),
+    returns the blocks that intersect the limits instead of csv_files. Otherwise returns csv_files.
+    Rows read from blocks come in clustered order rather than hour order, so dedupe doesn't use blocks
+    """
+    where = compile_where(where)
+    if where is None:
+        return csv_files
+
+    lat_bounds, lng_bounds = where.bounds("lat"), where.bounds("lng")
+    if lat_bounds is None and lng_bounds is None:
+        return csv_files
+
+    hours = [int(os.path.basename(file)[:2]) for file in csv_files]
+    blocks = cluster.find_blocks(get_day_folder_path(date), hours, lat_bounds, lng_bounds)
+
+    return csv_files if blocks is None else blocks
+
+
+#######################################################################################################################
+
+def scan(date_range, hour_range=(0,23)):
+    """
+    Returns a polars LazyFrame over the raw data between specified dates, nothing is read until it's collected.
+    Filters and column selections of the LazyFrame are pushed down to the reader, for example:
+
+        scan(("2017/05/01", "2017/05/31")).filter(pl.col("lat") > 30).select(["lat", "lng", "temperature"]).collect()
+
+    Loose files are scanned lazily (a pyarrow dataset), packed files (see dir.pack) are read when scan is called
+
+    Parameters
+    ----------
+    date_range : array-like of str
+        A tuple in the form of (start_date, end_date). Dates must be in the following format: yyyy/mm/dd
+
+    hour_range : int or tuple of int, default (0,23)
+        Range of hours of the day
+    """
+    import polars as pl
+    import pyarrow.dataset as ds
+
+    files = []
+    for date in generate_date_list(*date_range):
+        files += get_day_files(date, hour_range) or []
+
+    if len(files) == 0:
+        print(f"Sorry, no data found for these dates: {date_range[0]} to {date_range[-1]}")
+        return
+
+    loose = [file for file in files if os.path.exists(file)]
+    packed = [file for file in files if not os.path.exists(file)]
 
-    if where is not None:
-        for col in where:
-            llim, ulim = where[col]
-            df = df[df[col].between(llim, ulim)]
+    parts = []
+    if loose:
+        parts.append(ds.dataset(loose, format="csv"))
+    if packed:
+        parts.append(ds.dataset([read_table(file) for file in packed]))
 
-    return df
\ No newline at end of file
+    dataset = parts[0] if len(parts) == 1 else ds.dataset(parts)
+    return pl.scan_pyarrow_dataset(dataset)
@@ -0,0 +1,234 @@
+import os
+import re
+import shutil
+import weakref
+import numpy as np
+import pandas as pd
+from .where import compile_where
+
+
+#######################################################################################################################
+
+def parse_size(size):
+    """
+    Converts a memory size to bytes
+
+    Parameters
+    ----------
+    size : int or str
+        Number of bytes, or a string like "500MB", "2GB"
+    """
+    if not isinstance(size, str):
+        return int(size)
+
+    match = re.fullmatch(r"\s*([\d.]+)\s*([KMGT]?)B?\s*", size.upper())
+    if match is None:
+        raise ValueError(f"Can't parse memory size {size}")
+
+    number, unit = match.groups()
+    return int(float(number) * 1024**" KMGT".index(unit or " "))
+
+
+#######################################################################################################################
+
+def spill_frame(df, folder):
+    """
+    Writes a DataFrame to disk, one file per column. Numeric columns are saved as .npy so they can be memory mapped,
+    other columns are pickled.
+
+    Parameters
+    ----------
+    df : pandas DataFrame
+
+    folder : str
+        Folder to write to, created if necessary
+
+    Returns
+    -------
+    folder : str
+    """
+    os.makedirs(folder, exist_ok=True)
+
+    for i, col in enumerate(df.columns):
+        if pd.api.types.is_numeric_dtype(df[col]) and isinstance(df[col].dtype, np.dtype):
+            np.save(f"{folder}/{i}.npy", df[col].to_numpy())
+        else:
+            df[col].to_pickle(f"{folder}/{i}.pkl")
+
+    pd.Series(df.columns).to_pickle(f"{folder}/columns.pkl")
+
+    return folder
+
+
+#######################################################################################################################
+
+def read_spilled(folder, columns):
+    """
+    Reads columns of a DataFrame written by spill_frame
+
+    Parameters
+    ----------
+    folder : str
+
+    columns : list of str
+        Columns to read
+    """
+    all_columns = list(pd.read_pickle(f"{folder}/columns.pkl"))
+
+    data = {}
+    for col in columns:
+        i = all_columns.index(col)
+        if os.path.exists(f"{folder}/{i}.npy"):
+            data[col] = np.load(f"{folder}/{i}.npy", mmap_mode="r")
+        else:
+            data[col] = pd.read_pickle(f"{folder}/{i}.pkl").to_numpy()
+
+    return pd.DataFrame(data, columns=columns)
+
+
+#######################################################################################################################
+
+class PartitionedFrame:
+    """
+    A lazily materialized DataFrame made of partitions (one per day), each partition is either held in memory
+    or spilled to disk (see load.days with memory_budget).
+    Supports column selection, filtering and groupby aggregation partition by partition.
+    """
+
+    def __init__(self, partitions, columns, where=(), spill_dir=None):
+        self.partitions = partitions    # list of DataFrames and spilled folders
+        self.columns = list(columns)
+        self.where = list(where)    # list of where expressions, see load.where
+
+        # remove the temp store when the last handle that uses it is gone
+        if spill_dir is not None:
+            self._finalizer = weakref.finalize(self, shutil.rmtree, spill_dir, ignore_errors=True)
+        self.spill_dir = spill_dir
+
+    def __repr__(self):
+        spilled = sum(isinstance(p, str) for p in self.partitions)
+        return f"PartitionedFrame({len(self.partitions)} partitions, {spilled} spilled, columns={self.columns})"
+
+    def _derive(self, columns=None, where=()):
+        derived = PartitionedFrame(self.partitions, columns or self.columns, self.where + [compile_where(w) for w in where])
+        derived._parent = self    # keep the temp store alive
+        return derived
+
+    def __getitem__(self, columns):
+        """
+        Column selection, returns a new PartitionedFrame
+        """
+        if isinstance(columns, str):
+            columns = [columns]
+        return self._derive(columns=columns)
+
+    def filter(self, where):
+        """
+        Returns a new PartitionedFrame with rows filtered by where (dict or expression, same as load.day where)
+        """
+        return self._derive(where=[where])
+
+    def iter_partitions(self):
+        """
+        Yields every partition as a pandas DataFrame, with selected columns and filters applied
+        """
+        needed = list(dict.fromkeys(self.columns + [col for where in self.where for col in sorted(where.columns())]))
+
+        for part in self.partitions:
+            df = read_spilled(part, needed) if isinstance(part, str) else part[needed]
+
+            if self.where:
+                mask = self.where[0].mask(df)
+                for where in self.where[1:]:
+                    mask &= where.mask(df)
+                df = df[mask]
+
+            yield df[self.columns]
+
+    def compute(self):
+        """
+        Materializes the whole frame as one pandas DataFrame
+        """
+        return pd.concat(self.iter_partitions(), ignore_index=True)
+
+    def groupby(self, by):
+        """
+        Returns a PartitionedGroupBy, see PartitionedGroupBy.agg
+
+        Parameters
+        ----------
+        by : str or list of str
+            Columns to group by
+        """
+        return PartitionedGroupBy(self, by)
+
+
+#######################################################################################################################
+
+class PartitionedGroupBy:
+    """
+    Groupby aggregation over a PartitionedFrame. Every partition is reduced to mergeable partial statistics
+    (count, sum, min, max, mean and sum of squared deviations) which are merged into the final result.
+    """
+
+    funcs = ["count", "sum", "mean", "std", "var", "min", "max"]
+
+    def __init__(self, frame, by):
+        self.frame = frame
+        self.by = [by] if isinstance(by, str) else list(by)
+
+    def agg(self, funcs=["count", "mean", "std", "min", "max"]):
+        """
+        Parameters
+        ----------
+        funcs : list of str, default ["count", "mean", "std", "min", "max"]
+            Any of count, sum, mean, std, var, min, max
+
+        Returns
+        -------
+        agg : pandas DataFrame
+            Same format as pandas groupby agg with a list of functions
+        """
+        unknown = set(funcs) - set(self.funcs)
+        if unknown:
+            raise ValueError(f"Unsupported functions: {unknown}")
+
+        partials = []
+        for df in self.frame.iter_partitions():
+            values = [col for col in df.columns if col not in self.by and pd.api.types.is_numeric_dtype(df[col])]
+            grouped = df.groupby(self.by, observed=True)[values]
+
+            partial = grouped.agg(["count", "sum", "min", "max", "mean"])
+            m2 = grouped.var(ddof=0) * grouped.count()
+            for col in values:
+                partial[(col, "m2")] = m2[col]
+
+            partials.append(partial)
+
+        partials = pd.concat(partials)
+
+        result = {}
+        for col in partials.columns.get_level_values(0).unique():
+            part = partials[col]
+            grouped = part.groupby(level=self.by, observed=True)
+
+            count = grouped["count"].sum()
+            total = grouped["sum"].sum()
+            mean = total / count
+
+            # merge sums of squared deviations (Chan et al.)
+            deviation = part["count"] * (part["mean"] - mean.reindex(part.index).values)**2
+            m2 = grouped["m2"].sum() + deviation.fillna(0).groupby(level=self.by).sum()
+
+            # sample variance is NaN for groups with fewer than two values, like pandas
+            var = (m2 / (count-1)).where(count > 1)
+            stats = {"count": count, "sum": total, "mean": mean, "var": var, "std": np.sqrt(var),
+                     "min": grouped["min"].min(), "max": grouped["max"].max()}
+
+            for func in funcs:
+                result[(col, func)] = stats[func]
+
+        return pd.DataFrame(result)
+
+
+#######################################################################################################################
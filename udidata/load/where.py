@@ -0,0 +1,271 @@
+from abc import ABC, abstractmethod
+import numpy as np
+import pandas as pd
+
+
+#######################################################################################################################
+
+# Filter expressions for the where parameter of the loaders, for example:
+#
+#     (col("pressure").between(900, None) | col("humidity").isna()) & col("model").isin({"a", "b"}) & ~col("lat").between(-10, 10)
+#
+# An expression is evaluated into one boolean mask per chunk, which is applied once.
+
+def values(df, name):
+    """
+    Returns a column of df as a numpy array
+    """
+    return np.asarray(df[name])
+
+
+class Expr(ABC):
+    """
+    Base class of filter expressions, combine expressions with & (and), | (or) and ~ (not)
+    """
+
+    def __and__(self, other):
+        return And(self, other)
+
+    def __or__(self, other):
+        return Or(self, other)
+
+    def __invert__(self):
+        return Not(self)
+
+    @abstractmethod
+    def mask(self, df):
+        """
+        Returns a bool numpy array, True for rows of df that match the expression
+        """
+
+    @abstractmethod
+    def columns(self):
+        """
+        Returns a set of column names the expression uses
+        """
+
+    def bounds(self, name):
+        """
+        Returns (lower, upper) limits the expression implies on a column, None if it doesn't limit it
+        (an open end is None too). Rows outside the limits never match
+        """
+        return None
+
+
+#######################################################################################################################
+
+class Cond(Expr):
+    """
+    A condition on one column
+    """
+
+    def __init__(self, name, op, value=None):
+        self.name = name
+        self.op = op
+        self.value = value
+
+    def __repr__(self):
+        return f"{self.name} {self.op} {self.value}"
+
+    def columns(self):
+        return {self.name}
+
+    def mask(self, df):
+        x = values(df, self.name)
+        op, value = self.op, self.value
+
+        if op == "isna":
+            return pd.isna(x)
+        if op == "notna":
+            return ~pd.isna(x)
+        if op == "isin":
+            return pd.Series(x).isin(value).to_numpy()
+
+        if op == "between":
+            lower, upper = value
+            mask = np.ones(len(x), dtype=bool) if lower is not None or upper is not None else ~pd.isna(x)
+            if lower is not None:
+                mask &= x >= lower
+            if upper is not None:
+                mask &= x <= upper
+            return mask
+
+        with np.errstate(invalid="ignore"):
+            return {"==": np.equal, "!=": np.not_equal, "<": np.less, "<=": np.less_equal,
+                    ">": np.greater, ">=": np.greater_equal}[op](x, value)
+
+    def bounds(self, name):
+        if name != self.name:
+            return None
+        if self.op == "between":
+            return tuple(self.value)
+        if self.op in ["<", "<="]:
+            return (None, self.value)
+        if self.op in [">", ">="]:
+            return (self.value, None)
+        if self.op == "==":
+            return (self.value, self.value)
+        return None
+
+
+#######################################################################################################################
+
+class And(Expr):
+
+    def __init__(self, *exprs):
+        self.exprs = exprs
+
+    def __repr__(self):
+        return "(" + " & ".join(map(repr, self.exprs)) + ")"
+
+    def columns(self):
+        return set().union(*[expr.columns() for expr in self.exprs])
+
+    def mask(self, df):
+        mask = self.exprs[0].mask(df)
+        for expr in self.exprs[1:]:
+            mask &= expr.mask(df)
+        return mask
+
+    def bounds(self, name):
+        # intersection of the limits of all parts
+        lower, upper = None, None
+        for expr in self.exprs:
+            b = expr.bounds(name)
+            if b is None:
+                continue
+            if b[0] is not None:
+                lower = b[0] if lower is None else max(lower, b[0])
+            if b[1] is not None:
+                upper = b[1] if upper is None else min(upper, b[1])
+        return None if lower is None and upper is None else (lower, upper)
+
+
+class Or(Expr):
+
+    def __init__(self, *exprs):
+        self.exprs = exprs
+
+    def __repr__(self):
+        return "(" + " | ".join(map(repr, self.exprs)) + ")"
+
+    def columns(self):
+        return set().union(*[expr.columns() for expr in self.exprs])
+
+    def mask(self, df):
+        mask = self.exprs[0].mask(df)
+        for expr in self.exprs[1:]:
+            mask |= expr.mask(df)
+        return mask
+
+    def bounds(self, name):
+        # hull of the limits of all parts, only if every part limits the column
+        bounds = [expr.bounds(name) for expr in self.exprs]
+        if any(b is None for b in bounds):
+            return None
+        lower = None if any(b[0] is None for b in bounds) else min(b[0] for b in bounds)
+        upper = None if any(b[1] is None for b in bounds) else max(b[1] for b in bounds)
+        return None if lower is None and upper is None else (lower, upper)
+
+
+class Not(Expr):
+
+    def __init__(self, expr):
+        self.expr = expr
+
+    def __repr__(self):
+        return f"~{self.expr!r}"
+
+    def columns(self):
+        return self.expr.columns()
+
+    def mask(self, df):
+        return ~self.expr.mask(df)
+
+
+#######################################################################################################################
+
+class Col:
+    """
+    A column reference to build filter expressions with, see col
+    """
+
+    def __init__(self, name):
+        self.name = name
+
+    def between(self, lower=None, upper=None):
+        """
+        Inclusive range, None for an open end
+        """
+        return Cond(self.name, "between", (lower, upper))
+
+    def isin(self, values):
+        return Cond(self.name, "isin", list(values))
+
+    def isna(self):
+        return Cond(self.name, "isna")
+
+    def notna(self):
+        return Cond(self.name, "notna")
+
+    def __eq__(self, value):
+        return Cond(self.name, "==", value)
+
+    def __ne__(self, value):
+        return Cond(self.name, "!=", value)
+
+    def __lt__(self, value):
+        return Cond(self.name, "<", value)
+
+    def __le__(self, value):
+        return Cond(self.name, "<=", value)
+
+    def __gt__(self, value):
+        return Cond(self.name, ">", value)
+
+    def __ge__(self, value):
+        return Cond(self.name, ">=", value)
+
+    __hash__ = None
+
+
+def col(name):
+    """
+    Returns a column reference to build where expressions with
+
+    Parameters
+    ----------
+    name : str
+        Column name
+    """
+    return Col(name)
+
+
+#######################################################################################################################
+
+def compile_where(where):
+    """
+    Converts the where parameter of the loaders to an expression
+
+    Parameters
+    ----------
+    where : dict or Expr or None
+        A dict is AND of its items, a tuple value is an inclusive (lower, upper) range (None for an open end),
+        a set value is set membership
+
+    Returns
+    -------
+    : Expr or None
+    """
+    if where is None or isinstance(where, Expr):
+        return where
+
+    if isinstance(where, dict):
+        conds = [Col(name).isin(value) if isinstance(value, (set, frozenset)) else Col(name).between(*value)
+                 for name, value in where.items()]
+        return And(*conds) if conds else None
+
+    raise TypeError(f"where can't be of type {type(where)}")
+
+
+#######################################################################################################################
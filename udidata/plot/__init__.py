@@ -1 +1 @@
-from .plot import scatter_geo_layout, add_dropdown
\ No newline at end of file
+from .plot import scatter_geo_layout, add_dropdown, raster_geo, raster_geo_widget, lines_gl, linked_lines
\ No newline at end of file
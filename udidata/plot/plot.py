@@ -1,6 +1,7 @@
 import numpy as np
 import plotly.graph_objects as go
 import plotly.express as px
+from plotly.subplots import make_subplots
 from . import plot_utils
 
 #######################################################################################################################
@@ -78,6 +79,220 @@ def lines(ds, prop="pressure", stat="mean", title=None):
 
 #######################################################################################################################
 
+def raster_geo(df, prop=None, stat="count", bounds=(-85, 85, -180, 180), shape=(360, 720), title=None, cmap="ylorrd",
+               map_style="carto-positron"):
+    """
+    Plot raw data points as a raster (heatmap) over a world map. Points are binned in numpy into an image,
+    which is drawn as a layer of a map layout (Web Mercator, with coastlines and borders of the base map),
+    so the figure size depends on the raster shape, not on the number of points.
+
+    Parameters
+    ----------
+    df : pandas DataFrame
+        Raw data with lat and lng columns (see load.day)
+
+    prop : str, default None
+        Atmospheric property of interest, required for any stat but count
+
+    stat : str, default 'count'
+        A statistic of every pixel. Options: count, sum, mean, min, max
+
+    bounds : tuple, default (-85, 85, -180, 180)
+        (lat_min, lat_max, lng_min, lng_max) of the raster. Web Mercator maps end at about 85 degrees latitude,
+        points closer to the poles are not drawn
+
+    shape : tuple of int, default (360, 720)
+        Number of pixels (rows, columns) of the raster. Rows are evenly spaced on the map, not in latitude
+
+    map_style : str, default 'carto-positron'
+        Base map style, see plotly layout.map.style
+
+    Returns
+    -------
+    fig : plotly.graph_objs._figure.Figure
+        Plotly figure
+    """
+    lat = df["lat"].to_numpy(dtype=float)
+    lng = df["lng"].to_numpy(dtype=float)
+    values = None if prop is None else df[prop].to_numpy(dtype=float)
+
+    layer, scale = raster_layer(lat, lng, values, stat, bounds, shape, cmap)
+
+    # the zoom level which fits the longitude range into the default figure width (700 px, 512 px world at zoom 0)
+    lat_min, lat_max, lng_min, lng_max = bounds
+    zoom = max(np.log2(700 / 512 * 360 / (lng_max - lng_min)), 0)
+
+    fig = go.Figure(scale)
+    fig.update_layout(title=title, margin=dict(l=0, r=0, b=0, t=40 if title else 0),
+                      map=dict(style=map_style, zoom=zoom, layers=[layer],
+                               center=dict(lat=(lat_min + lat_max) / 2, lon=(lng_min + lng_max) / 2)))
+
+    return fig
+
+
+def raster_layer(lat, lng, values, stat, bounds, shape, cmap):
+    """
+    Rasterizes points into a map image layer, with log scale colors for counts with a range bigger than 2 orders
+    of magnitude. Returns the layer and an invisible trace which shows the colorbar
+    """
+    lat_min, lat_max, lng_min, lng_max = bounds
+    lat_min, lat_max = max(lat_min, -plot_utils.MERCATOR_LAT), min(lat_max, plot_utils.MERCATOR_LAT)
+
+    # rasterize in Web Mercator y, so pixel rows are evenly spaced on the map
+    y_min, y_max = plot_utils.mercator_y([lat_min, lat_max])
+    _, _, raster = plot_utils.rasterize(plot_utils.mercator_y(lat), lng, values, stat, (y_min, y_max, lng_min, lng_max), shape)
+
+    title = stat
+    if stat == "count":
+        raster = np.where(raster > 0, raster, np.nan)
+        if np.nanmax(raster, initial=0) > 100:
+            raster, title = np.log10(raster), "log10(count)"
+
+    zmin, zmax = (np.nanmin(raster), np.nanmax(raster)) if (~np.isnan(raster)).any() else (0, 1)
+
+    layer = dict(sourcetype="image", source=plot_utils.png_image(raster, cmap, zmin, zmax), opacity=0.8,
+                 coordinates=[[lng_min, lat_max], [lng_max, lat_max], [lng_max, lat_min], [lng_min, lat_min]])
+
+    scale = go.Scattermap(lat=[lat_min], lon=[lng_min], mode="markers", hoverinfo="skip", showlegend=False,
+                          marker=dict(size=0, opacity=0, color=[zmin], colorscale=cmap, cmin=zmin, cmax=zmax,
+                                      showscale=True, colorbar=dict(title=title)))
+
+    return layer, scale
+
+
+def raster_geo_widget(df, prop=None, stat="count", shape=(450, 700), title=None, cmap="ylorrd", map_style="carto-positron"):
+    """
+    Interactive version of raster_geo for notebooks, points are binned again into the visible area
+    whenever the map is zoomed or panned. Requires ipywidgets
+
+    Returns
+    -------
+    fig : plotly.graph_objs.FigureWidget
+    """
+    lat = df["lat"].to_numpy(dtype=float)
+    lng = df["lng"].to_numpy(dtype=float)
+    values = None if prop is None else df[prop].to_numpy(dtype=float)
+
+    fig = go.FigureWidget(raster_geo(df, prop, stat, shape=shape, title=title, cmap=cmap, map_style=map_style))
+
+    def rebin(layout, center, zoom):
+        if center is None or zoom is None:
+            return
+
+        # visible area, the world is 512 px wide at zoom 0 and twice as wide at every zoom level
+        per_px = 360 / (512 * 2**zoom)
+        width, height = layout.width or 700, layout.height or 450
+        y = plot_utils.mercator_y(np.clip(center.lat, -plot_utils.MERCATOR_LAT, plot_utils.MERCATOR_LAT))
+        bounds = (plot_utils.mercator_lat(max(y - height / 2 * per_px, -180)), plot_utils.mercator_lat(min(y + height / 2 * per_px, 180)),
+                  max(center.lon - width / 2 * per_px, -180), min(center.lon + width / 2 * per_px, 180))
+
+        layer, scale = raster_layer(lat, lng, values, stat, bounds, shape, cmap)
+
+        with fig.batch_update():
+            fig.layout.map.layers = [layer]
+            fig.data[0].marker.update(scale.marker)
+
+    fig.layout.on_change(rebin, "map.center", "map.zoom")
+
+    return fig
+
+#######################################################################################################################
+
+def lines_gl(ds, prop="pressure", stat="mean", title=None, buckets=None, groups=None):
+    """
+    Scalable version of lines for thousands of grid cells. All lines are packed into a few WebGL traces
+    (one per group) instead of one trace per cell.
+
+    Parameters
+    ----------
+    ds : xarray Dataset
+        A dataset of aggregated data with a specified format
+        
+    prop : str, default 'pressure'
+        Atmospheric property of interest
+
+    stat : str, default 'mean'
+        A statistic of interest to show on the plot. Options: count, mean, median, std, min, max
+
+    buckets : int, default None
+        If given, every line is downsampled to the min and max of buckets parts of the date axis (about the plot width in pixels)
+
+    groups : function, default None
+        Takes in an array of "lat,lng" cell labels and returns a group name for each, one trace is drawn per group.
+        By default all lines are in one trace
+    
+    Returns
+    -------
+    fig : plotly.graph_objs._figure.Figure
+        Plotly figure
+    """
+    x, Y, labels = plot_utils.series_matrix(ds, prop, stat)
+    X = x
+    if buckets is not None:
+        X, Y = plot_utils.minmax_decimate(x, Y, buckets)
+
+    group_labels = np.zeros(len(labels)) if groups is None else np.asarray(groups(labels))
+
+    fig = go.Figure()
+    for group in np.unique(group_labels):
+        mask = group_labels == group
+        line_x, line_y, text = plot_utils.pack_series(X if X.ndim == 1 else X[:, mask], Y[:, mask], labels[mask])
+        fig.add_trace(go.Scattergl(x=line_x, y=line_y, text=text, mode="lines", name=str(group), line=dict(width=1),
+                                   hovertemplate="%{text}<br>%{x}<br>%{y}<extra></extra>"))
+
+    fig.update_layout(title=title, showlegend=groups is not None, xaxis_title="date", yaxis_title=stat)
+
+    return fig
+
+
+#######################################################################################################################
+
+def linked_lines(ds, prop="pressure", stat="mean", title=None, buckets=None):
+    """
+    Map of grid cells linked to their lines, selecting cells on the map (box/lasso select or click)
+    highlights their lines. Replaces a dropdown with a button per trace. Requires ipywidgets
+
+    Parameters
+    ----------
+    Same as lines_gl
+
+    Returns
+    -------
+    fig : plotly.graph_objs.FigureWidget
+    """
+    x, Y, labels = plot_utils.series_matrix(ds, prop, stat)
+    X = x
+    if buckets is not None:
+        X, Y = plot_utils.minmax_decimate(x, Y, buckets)
+
+    lat, lng = np.array([label.split(",") for label in labels], dtype=float).T
+
+    fig = go.FigureWidget(make_subplots(rows=2, cols=1, row_heights=[0.5, 0.5], vertical_spacing=0.05,
+                                        specs=[[{"type": "scattergeo"}], [{"type": "xy"}]]))
+
+    fig.add_trace(go.Scattergeo(lat=lat, lon=lng, text=labels, mode="markers", name="cells"), row=1, col=1)
+
+    line_x, line_y, text = plot_utils.pack_series(X, Y, labels)
+    fig.add_trace(go.Scattergl(x=line_x, y=line_y, text=text, mode="lines", name="all", line=dict(width=1, color="lightgray")), row=2, col=1)
+    fig.add_trace(go.Scattergl(x=[], y=[], mode="lines", name="selected", line=dict(width=2)), row=2, col=1)
+
+    fig.update_layout(title=title, showlegend=False, dragmode="select")
+
+    def highlight(trace, points, selector):
+        cols = np.asarray(points.point_inds, dtype=int)
+        if cols.size == 0:
+            return
+        hx, hy, htext = plot_utils.pack_series(X if X.ndim == 1 else X[:, cols], Y[:, cols], labels[cols])
+        with fig.batch_update():
+            fig.data[2].x, fig.data[2].y, fig.data[2].text = hx, hy, htext
+
+    fig.data[0].on_selection(highlight)
+    fig.data[0].on_click(highlight)
+
+    return fig
+
+#######################################################################################################################
+
 def add_dropdown(figure, labels=None):
 
     """
@@ -1,3 +1,7 @@
+import zlib
+import base64
+import struct
+import numpy as np
 from .. import utils
 
 #######################################################################################################################
@@ -69,4 +73,251 @@ def lines(ds, prop="pressure", stat="mean"):
     df = df.dropna().reset_index()
     df = df.zip_columns(["lat","lng"])
     
-    return df
\ No newline at end of file
+    return df
+
+#######################################################################################################################
+
+def rasterize(lat, lng, values=None, stat="count", bounds=(-90, 90, -180, 180), shape=(360, 720)):
+    """
+    Bins points into a regular latitude, longitude raster in numpy
+
+    Parameters
+    ----------
+    lat, lng : array-like
+        Coordinates of the points
+
+    values : array-like, default None
+        Values of the points, required for any stat but count
+
+    stat : str, default 'count'
+        Statistic of every pixel. Options: count, sum, mean, min, max
+
+    bounds : tuple, default (-90, 90, -180, 180)
+        (lat_min, lat_max, lng_min, lng_max) of the raster, points outside are ignored
+
+    shape : tuple of int, default (360, 720)
+        Number of pixels (rows, columns) of the raster
+
+    Returns
+    -------
+    lat_centers, lng_centers : numpy arrays
+        Coordinates of the pixel centers
+
+    raster : numpy array
+        Array with the given shape, NaN for pixels with no points (0 for count)
+    """
+    lat_min, lat_max, lng_min, lng_max = bounds
+    rows, cols = shape
+
+    lat = np.asarray(lat, dtype=float)
+    lng = np.asarray(lng, dtype=float)
+
+    with np.errstate(invalid="ignore"):
+        row = np.floor((lat - lat_min) / (lat_max - lat_min) * rows).astype(np.int64, copy=False)
+        col = np.floor((lng - lng_min) / (lng_max - lng_min) * cols).astype(np.int64, copy=False)
+
+    valid = (lat >= lat_min) & (lat <= lat_max) & (lng >= lng_min) & (lng <= lng_max)
+    if values is not None:
+        values = np.asarray(values, dtype=float)
+        valid &= ~np.isnan(values)
+        values = values[valid]
+
+    # points on the upper bound belong to the last pixel
+    pixel = np.minimum(row[valid], rows-1) * cols + np.minimum(col[valid], cols-1)
+    size = rows * cols
+
+    count = np.bincount(pixel, minlength=size).astype(float)
+
+    if stat == "count":
+        raster = count
+    elif stat in ["sum", "mean"]:
+        raster = np.bincount(pixel, weights=values, minlength=size)
+        if stat == "mean":
+            with np.errstate(invalid="ignore"):
+                raster = raster / count
+    elif stat in ["min", "max"]:
+        raster = np.full(size, np.inf if stat == "min" else -np.inf)
+        (np.minimum if stat == "min" else np.maximum).at(raster, pixel, values)
+        raster[count == 0] = np.nan
+    else:
+        raise ValueError(f"Unsupported stat {stat}")
+
+    lat_centers = lat_min + (np.arange(rows) + 0.5) * (lat_max - lat_min) / rows
+    lng_centers = lng_min + (np.arange(cols) + 0.5) * (lng_max - lng_min) / cols
+
+    return lat_centers, lng_centers, raster.reshape(shape)
+
+
+#######################################################################################################################
+
+# Web Mercator, the projection of plotly map layouts, doesn't reach the poles
+MERCATOR_LAT = 85.0511
+
+
+def mercator_y(lat):
+    """
+    Web Mercator y of latitudes, in degrees like longitude (-180 to 180 for the whole map).
+    Latitudes beyond MERCATOR_LAT are NaN
+    """
+    lat = np.asarray(lat, dtype=float)
+    with np.errstate(invalid="ignore"):
+        lat = np.where(np.abs(lat) <= MERCATOR_LAT, lat, np.nan)
+    return np.degrees(np.log(np.tan(np.pi/4 + np.radians(lat)/2)))
+
+
+def mercator_lat(y):
+    """
+    Latitudes of Web Mercator y, inverse of mercator_y
+    """
+    return np.degrees(2*np.arctan(np.exp(np.radians(np.asarray(y, dtype=float)))) - np.pi/2)
+
+
+#######################################################################################################################
+
+def png_image(raster, cmap, zmin, zmax):
+    """
+    Encodes a raster as a PNG data URI, colored with a plotly colorscale from zmin to zmax.
+    The first raster row is the bottom (south) row of the image, NaN pixels are transparent.
+    The PNG is written with zlib, so no imaging library is needed
+
+    Parameters
+    ----------
+    raster : numpy array
+        2D array of values
+
+    cmap : str or list
+        Plotly colorscale name or colorscale
+
+    zmin, zmax : float
+        Values of the ends of the colorscale
+
+    Returns
+    -------
+    uri : str
+    """
+    from plotly.colors import get_colorscale, sample_colorscale
+
+    colorscale = get_colorscale(cmap) if isinstance(cmap, str) else cmap
+    colors = np.array(sample_colorscale(colorscale, np.linspace(0, 1, 256), colortype="tuple"))
+    lut = np.concatenate([np.round(colors * 255), np.full((256, 1), 255)], axis=1).astype(np.uint8)
+
+    nan = np.isnan(raster)
+    with np.errstate(invalid="ignore"):
+        scaled = np.where(nan, 0, (raster - zmin) / ((zmax - zmin) or 1))
+    rgba = lut[np.clip(np.round(scaled * 255), 0, 255).astype(int)]
+    rgba[nan] = 0
+
+    # PNG rows start at the top, every row starts with a filter type byte (0, none)
+    rows, cols = raster.shape
+    data = np.insert(rgba[::-1].reshape(rows, cols * 4), 0, 0, axis=1)
+
+    def chunk(kind, body):
+        return struct.pack(">I", len(body)) + kind + body + struct.pack(">I", zlib.crc32(kind + body))
+
+    png = (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", struct.pack(">IIBBBBB", cols, rows, 8, 6, 0, 0, 0))
+           + chunk(b"IDAT", zlib.compress(data.tobytes())) + chunk(b"IEND", b""))
+
+    return "data:image/png;base64," + base64.b64encode(png).decode()
+
+#######################################################################################################################
+
+def series_matrix(ds, prop="pressure", stat="mean"):
+    """
+    Takes in xarray Dataset and returns its grid cell series as one dense matrix, with no tidy DataFrame in between.
+    Works with lat, lng datasets (see load.agg.dataset) and with cell datasets (see calculate.resample.grid_resample)
+
+    Returns
+    -------
+    x : numpy array
+        Dates
+
+    Y : numpy array
+        Array with shape (dates, cells), cells with no data at all are dropped
+
+    labels : numpy array of str
+        "lat,lng" label of every cell
+    """
+    da = ds.sel(stat=stat)[prop]
+
+    if "cell" not in da.dims:
+        da = da.stack(cell=("lat", "lng"))
+    da = da.transpose("date", "cell")
+
+    Y = da.values
+    keep = ~np.isnan(Y).all(axis=0)
+    labels = np.array([utils.df_utils.stringify_tuple(tup) for tup in zip(da["lat"].values[keep], da["lng"].values[keep])])
+
+    return da["date"].values, Y[:, keep], labels
+
+#######################################################################################################################
+
+def minmax_decimate(x, Y, buckets):
+    """
+    Downsamples every column of Y to the minimum and maximum of each of buckets equal parts of x,
+    which keeps the shape of a line at a resolution of buckets pixels
+
+    Parameters
+    ----------
+    x : numpy array
+        Shared x values of all the series
+
+    Y : numpy array
+        Array with shape (len(x), series)
+
+    buckets : int
+        Number of parts (about the plot width in pixels)
+
+    Returns
+    -------
+    X, Y : numpy arrays
+        Arrays with shape (2*buckets, series), every series has its own x values
+    """
+    if len(x) <= 2*buckets:
+        return np.repeat(x[:, None], Y.shape[1], axis=1), Y
+
+    edges = np.linspace(0, len(x), buckets+1).astype(int)
+    nan = np.isnan(Y)
+    Y_min = np.where(nan, np.inf, Y)
+    Y_max = np.where(nan, -np.inf, Y)
+
+    idx = []
+    for start, end in zip(edges[:-1], edges[1:]):
+        idx_min = start + Y_min[start:end].argmin(axis=0)
+        idx_max = start + Y_max[start:end].argmax(axis=0)
+        # keep time order inside the bucket
+        idx += [np.minimum(idx_min, idx_max), np.maximum(idx_min, idx_max)]
+
+    idx = np.stack(idx)
+    cols = np.arange(Y.shape[1])
+
+    return x[idx], Y[idx, cols]
+
+#######################################################################################################################
+
+def pack_series(X, Y, labels):
+    """
+    Packs many series into one long series with gaps (NaN) between them, so they can be drawn by a single trace
+
+    Parameters
+    ----------
+    X, Y : numpy arrays
+        Arrays with shape (points, series). X can also be 1D, shared by all series
+
+    labels : numpy array
+        Label of every series
+
+    Returns
+    -------
+    x, y, text : numpy arrays
+        Packed x, y and series label of every point
+    """
+    if X.ndim == 1:
+        X = np.repeat(X[:, None], Y.shape[1], axis=1)
+
+    x = np.vstack([X, X[-1:]]).T.ravel()
+    y = np.vstack([Y, np.full((1, Y.shape[1]), np.nan)]).T.ravel()
+    text = np.repeat(labels, X.shape[0]+1)
+
+    return x, y, text
+
+#######################################################################################################################
@@ -20,4 +20,12 @@ COL_NAMES = {
     15: "lng",
     16: "model",
     17: "tz_offset"
-}
\ No newline at end of file
+}
+
+# on disk cache of calculate.agg results (see udidata.cache), off by default.
+# Set to a folder to enable, for example os.path.join(os.path.expanduser("~"), ".cache", "udidata")
+CACHE_DIR = None
+CACHE_SIZE = "2GB"
+
+# skip files the last integrity scan found bad (see udidata.dir.scan) when loading
+SKIP_BAD_FILES = False
@@ -1 +1,3 @@
-from . import df_utils
\ No newline at end of file
+from . import df_utils
+from . import grid
+from . import dedupe
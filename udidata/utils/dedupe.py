@@ -0,0 +1,126 @@
+import numpy as np
+import pandas as pd
+
+
+#######################################################################################################################
+
+def hash_ids(ids):
+    """
+    Maps ids to 64 bit unsigned integers. Integer ids are used as is, other ids (like strings) are hashed.
+    Integral float ids (an int _id column with missing values is read as float) map like the same integers
+
+    Parameters
+    ----------
+    ids : array-like
+        Ids, for example the _id column
+
+    Returns
+    -------
+    : numpy array of uint64
+    """
+    ids = np.asarray(ids)
+
+    if np.issubdtype(ids.dtype, np.integer):
+        return ids.astype(np.int64).view(np.uint64)
+
+    if np.issubdtype(ids.dtype, np.floating):
+        with np.errstate(invalid="ignore"):
+            integral = (ids == np.round(ids)) & (np.abs(ids) < 2.0**63)
+        hashes = pd.util.hash_array(ids)
+        hashes[integral] = ids[integral].astype(np.int64).view(np.uint64)
+        return hashes
+
+    return pd.util.hash_array(ids.astype(object))
+
+
+#######################################################################################################################
+
+class SeenIds:
+    """
+    Keeps track of ids that were already seen while data streams in, as sorted runs of uint64 (8 bytes per id).
+    Non integer ids are hashed, the chance of a false duplicate is negligible (about 1 in 30 for a billion ids).
+    Missing ids (NaN, None) are never treated as duplicates.
+
+    New ids are kept as a new run, and runs are merged whenever the newest run is as big as the one before it,
+    so there are at most log2(ids) runs and every id is copied log2(ids) times in total (instead of the whole
+    array being copied for every chunk).
+    """
+
+    def __init__(self):
+        # sorted, disjoint runs, each less than half the size of the run before it
+        self.runs = []
+
+    def __len__(self):
+        return sum(run.size for run in self.runs)
+
+    def contains(self, hashes):
+        """
+        Returns a bool mask which is True for hashes that were already seen
+        """
+        seen = np.zeros(hashes.size, dtype=bool)
+        for run in self.runs:
+            pos = np.searchsorted(run, hashes)
+            seen |= run[np.minimum(pos, run.size-1)] == hashes
+        return seen
+
+    def add(self, hashes):
+        """
+        Marks sorted unique hashes, none of which were seen, as seen
+        """
+        run = hashes
+        while self.runs and self.runs[-1].size <= 2 * run.size:
+            # a stable sort of two sorted runs is a linear merge
+            run = np.sort(np.concatenate([self.runs.pop(), run]), kind="stable")
+        self.runs.append(run)
+
+    def filter(self, ids):
+        """
+        Returns a bool mask which is True for ids seen for the first time, and marks them as seen
+
+        Parameters
+        ----------
+        ids : array-like
+            Ids of the new chunk of data
+        """
+        ids = np.asarray(ids)
+        mask = np.ones(ids.size, dtype=bool)
+
+        # missing ids are kept, and not tracked
+        present = np.flatnonzero(~pd.isna(ids)) if not np.issubdtype(ids.dtype, np.integer) else np.arange(ids.size)
+        hashes = hash_ids(ids[present])
+
+        # keep only the first occurrence inside the chunk
+        new_hashes, first = np.unique(hashes, return_index=True)
+        keep = np.zeros(hashes.size, dtype=bool)
+        keep[first] = True
+
+        # drop ids seen in previous chunks
+        seen = self.contains(new_hashes)
+        keep[first[seen]] = False
+        mask[present] = keep
+
+        if (~seen).any():
+            self.add(new_hashes[~seen])
+
+        return mask
+
+
+#######################################################################################################################
+
+def as_seen_ids(dedupe):
+    """
+    Normalizes the dedupe parameter of the loaders and agg builders
+
+    Parameters
+    ----------
+    dedupe : bool or SeenIds
+        If True a new SeenIds is returned, a SeenIds is returned as is (to share it across calls), otherwise None
+    """
+    if isinstance(dedupe, SeenIds):
+        return dedupe
+    if dedupe:
+        return SeenIds()
+    return None
+
+
+#######################################################################################################################
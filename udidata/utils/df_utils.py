@@ -21,7 +21,7 @@ def stringify_tuple(tup, sep=","):
 
 #######################################################################################################################
 
-def to_utc(self, time_col="raw_time", reindex=False, drop=False):
+def to_utc(self, time_col="raw_time", reindex=False, drop=False, inplace=False):
     """
     Parameters
     ----------
@@ -37,13 +37,16 @@ def to_utc(self, time_col="raw_time", reindex=False, drop=False):
     drop : bool, default False
         If true, original raw time column will be dropped for DataFrame
 
+    inplace : bool, default False
+        If True, self is modified instead of a copy
+
     Returns
     -------
     self : pandas DataFrame
         Dataframe with time as index
     """
     if time_col in self.columns:
-        df = self.copy()
+        df = self if inplace else self.copy()
         utc_col = pd.to_datetime(df[time_col], unit="ms")
 
         if reindex:
@@ -56,7 +59,7 @@ def to_utc(self, time_col="raw_time", reindex=False, drop=False):
         raise KeyError("There's no time column in your dataframe!")
 
     if drop:
-        df = df.drop([time_col], axis=1)
+        df.drop([time_col], axis=1, inplace=True)
 
     return df
 
@@ -64,6 +67,61 @@ pd.DataFrame.to_utc = to_utc
 
 #######################################################################################################################
 
+# milliseconds in a unit of tz_offset
+TZ_UNITS = {"ms": 1, "s": 1000, "min": 60000, "h": 3600000}
+
+def local_ms(self, time_col="raw_time", tz_col="tz_offset", tz_unit="ms"):
+    """
+    Returns a numpy array of local time in milliseconds since epoch, raw_time + tz_offset
+    """
+    return self[time_col].to_numpy(dtype=float) + self[tz_col].to_numpy(dtype=float) * TZ_UNITS[tz_unit]
+
+
+def local_time(self, time_col="raw_time", tz_col="tz_offset", tz_unit="ms"):
+    """
+    Local clock time of every reading, from UTC raw time and the per row timezone offset.
+    Vectorized, and the DataFrame is not copied
+
+    Parameters
+    ----------
+    self : pandas DataFrame
+        Dataframe with raw time and timezone offset columns
+
+    time_col : str, default 'raw_time'
+        Column name that holds raw time data (ms since epoch, UTC)
+
+    tz_col : str, default 'tz_offset'
+        Column name that holds timezone offset data
+
+    tz_unit : str, default 'ms'
+        Unit of tz_offset, one of ms, s, min, h
+
+    Returns
+    -------
+    : pandas Series
+        Local timestamps, named "local_time", with the index of self
+    """
+    return pd.Series(pd.to_datetime(local_ms(self, time_col, tz_col, tz_unit), unit="ms"), index=self.index, name="local_time")
+
+pd.DataFrame.local_time = local_time
+
+
+def local_hour(self, time_col="raw_time", tz_col="tz_offset", tz_unit="ms"):
+    """
+    Local hour of day (0-23) of every reading, computed arithmetically without creating timestamps.
+    Parameters are the same as local_time
+
+    Returns
+    -------
+    : numpy array of float
+        Local hour, NaN where time or offset are missing
+    """
+    return np.floor(local_ms(self, time_col, tz_col, tz_unit) / 3600000) % 24
+
+pd.DataFrame.local_hour = local_hour
+
+#######################################################################################################################
+
 def count_na(self):
     
     """ 
@@ -136,9 +194,13 @@ def discretize_latlng(self, deg=2.5, lat_col="lat", lng_col="lng", drop=True):
     """
     df = self.copy()
 
+    # bin edges, linspace makes sure the last edge is exactly 90 (180) for any deg (arange overshoots for deg like 0.5)
+    lat_bins = np.linspace(-90, 90, int(round(180/deg))+1)
+    lng_bins = np.linspace(-180, 180, int(round(360/deg))+1)
+
     # discretize lat, lng values into categories using cut method from pandas
-    df["lat_cat"] = pd.cut(df[lat_col], bins=np.arange(-90,91,deg), labels=np.arange(-90,90,deg))
-    df["lng_cat"] = pd.cut(df[lng_col], bins=np.arange(-180,181,deg), labels=np.arange(-180,180,deg))
+    df["lat_cat"] = pd.cut(df[lat_col], bins=lat_bins, labels=lat_bins[:-1])
+    df["lng_cat"] = pd.cut(df[lng_col], bins=lng_bins, labels=lng_bins[:-1])
 
     if drop:
         df = df.drop([lat_col, lng_col], axis=1)
@@ -0,0 +1,274 @@
+import numpy as np
+
+
+#######################################################################################################################
+
+def grid_shape(deg=2.5):
+    """
+    Returns number of latitude and longitude cells of a grid with a given spatial degree interval
+
+    Parameters
+    ----------
+    deg : int or float, default 2.5
+        Spatial degree interval for for latitude and longitude data
+    """
+    return int(round(180/deg)), int(round(360/deg))
+
+
+#######################################################################################################################
+
+def grid_labels(deg=2.5):
+    """
+    Returns latitude and longitude labels (lower edge) of grid cells, same labels as discretize_latlng
+
+    Parameters
+    ----------
+    deg : int or float, default 2.5
+        Spatial degree interval for for latitude and longitude data
+    """
+    nlat, nlng = grid_shape(deg)
+    return np.linspace(-90, 90, nlat+1)[:-1], np.linspace(-180, 180, nlng+1)[:-1]
+
+
+#######################################################################################################################
+
+def latlng_index(lat, lng, deg=2.5):
+    """
+    Vectorized version of discretize_latlng, without copying the DataFrame.
+    Bins are right closed like pd.cut, so a cell labeled -90 holds latitudes in (-90, -87.5]
+
+    Parameters
+    ----------
+    lat, lng : array-like
+        Latitude and longitude values
+
+    deg : int or float, default 2.5
+        Spatial degree interval for for latitude and longitude data
+
+    Returns
+    -------
+    lat_idx, lng_idx : numpy arrays of int
+        Row and column of the grid cell of every point, -1 for points outside the grid (or NaN)
+    """
+    nlat, nlng = grid_shape(deg)
+
+    with np.errstate(invalid="ignore"):
+        lat_idx = np.ceil((np.asarray(lat, dtype=float) + 90) / deg) - 1
+        lng_idx = np.ceil((np.asarray(lng, dtype=float) + 180) / deg) - 1
+
+        valid = (lat_idx >= 0) & (lat_idx < nlat) & (lng_idx >= 0) & (lng_idx < nlng)
+
+    lat_idx = np.where(valid, lat_idx, -1).astype(np.int64)
+    lng_idx = np.where(valid, lng_idx, -1).astype(np.int64)
+
+    return lat_idx, lng_idx
+
+
+#######################################################################################################################
+
+# Equal area grid: a reduced latitude/longitude grid. Latitude bands are deg degrees like the latitude/longitude grid,
+# and towards the poles bands have fewer longitude columns, so cells have about the same area and shape everywhere
+# instead of turning into slivers. Column counts of a band are the number of columns at the equator divided by
+# its prime factors, smallest first (360 -> 180 -> 90 -> 45 -> 15 -> 5 -> 1), and a band takes the smallest count
+# that keeps cells at least deg degrees wide at its poleward edge. The bands at the poles are single cells (caps).
+# Cells of a grid of k*deg hold k bands of the deg grid, and a whole number of columns in each, for rollups.
+# Cells are identified by cell id (band * columns at the equator + column) and labeled by their centroid.
+
+GRIDS = ["latlng", "equal_area"]
+
+
+def check_grid(grid):
+    """
+    Validates the grid parameter of the aggregations
+    """
+    if grid not in GRIDS:
+        raise ValueError(f"grid must be one of {GRIDS}, got {grid}")
+
+
+#######################################################################################################################
+
+def equal_area_columns(deg=2.5):
+    """
+    Returns the number of longitude columns of every latitude band of the equal area grid, south to north
+
+    Parameters
+    ----------
+    deg : int or float, default 2.5
+        Latitude height of bands and longitude width of cells at the equator
+    """
+    nlat, nlng = grid_shape(deg)
+
+    # column counts to choose from, ascending: nlng divided by its prime factors, smallest first
+    counts, factor = [nlng], 2
+    while counts[-1] > 1:
+        if counts[-1] % factor == 0:
+            counts.append(counts[-1] // factor)
+        else:
+            factor += 1
+    counts = np.array(counts[::-1])
+
+    edges = np.linspace(-90, 90, nlat+1)
+    poleward = np.radians(np.round(np.maximum(np.abs(edges[:-1]), np.abs(edges[1:])), 9))
+
+    # the fewest columns that are at least deg wide at the poleward edge of the band
+    return counts[np.searchsorted(counts, nlng * np.cos(poleward) - 1e-9)]
+
+
+def equal_area_centroids(band_idx, lng_idx, deg=2.5):
+    """
+    Returns latitude and longitude of the centroids of equal area grid cells.
+    The centroid latitude splits the band area in half
+
+    Parameters
+    ----------
+    band_idx, lng_idx : array-like of int
+        Band and column of the cells, see equal_area_index
+    """
+    band_idx = np.asarray(band_idx)
+    lat_edges = np.radians(np.linspace(-90, 90, grid_shape(deg)[0]+1))
+    lat = np.degrees(np.arcsin((np.sin(lat_edges[band_idx]) + np.sin(lat_edges[band_idx+1])) / 2))
+    lng = -180 + (np.asarray(lng_idx) + 0.5) * 360 / equal_area_columns(deg)[band_idx]
+    return lat, lng
+
+
+#######################################################################################################################
+
+def equal_area_index(lat, lng, deg=2.5):
+    """
+    Vectorized assignment of points to equal area grid cells, like latlng_index. Bins are right closed
+
+    Parameters
+    ----------
+    lat, lng : array-like
+        Latitude and longitude values
+
+    deg : int or float, default 2.5
+        Latitude height of bands and longitude width of cells at the equator
+
+    Returns
+    -------
+    band_idx, lng_idx : numpy arrays of int
+        Band and column (within the band) of the grid cell of every point, -1 for points outside the grid (or NaN)
+    """
+    band_idx, _ = latlng_index(lat, np.zeros_like(np.asarray(lat, dtype=float)), deg)
+    columns = equal_area_columns(deg)[np.maximum(band_idx, 0)]
+
+    with np.errstate(invalid="ignore"):
+        lng_idx = np.ceil((np.asarray(lng, dtype=float) + 180) / 360 * columns) - 1
+        valid = (band_idx >= 0) & (lng_idx >= 0) & (lng_idx < columns)
+
+    band_idx = np.where(valid, band_idx, -1).astype(np.int64)
+    lng_idx = np.where(valid, lng_idx, -1).astype(np.int64)
+
+    return band_idx, lng_idx
+
+
+#######################################################################################################################
+
+def cell_ids(lat, lng, deg=2.5):
+    """
+    Returns the equal area grid cell id of every point, -1 for points outside the grid
+    """
+    band_idx, lng_idx = equal_area_index(lat, lng, deg)
+    return np.where(band_idx >= 0, band_idx * grid_shape(deg)[1] + lng_idx, -1)
+
+
+def cell_centroid(cell, deg=2.5):
+    """
+    Returns latitude and longitude of the centroids of equal area grid cells
+
+    Parameters
+    ----------
+    cell : int or array-like of int
+        Cell ids
+    """
+    band_idx, lng_idx = np.divmod(np.asarray(cell), grid_shape(deg)[1])
+    return equal_area_centroids(band_idx, lng_idx, deg)
+
+
+#######################################################################################################################
+
+def nesting_ratio(fine_deg, coarse_deg):
+    """
+    Returns how many cells of the fine grid nest in a cell of the coarse grid along each axis
+    (along latitude for the equal area grid, see equal_area_parent)
+    """
+    ratio = coarse_deg / fine_deg
+    if ratio < 1 or not np.isclose(ratio, round(ratio)):
+        raise ValueError(f"coarse_deg must be a multiple of fine_deg, got {coarse_deg} and {fine_deg}")
+    return int(round(ratio))
+
+
+def equal_area_parent(band_idx, lng_idx, deg, parent_deg):
+    """
+    Returns band and column of the cells of the coarser equal area grid (parent_deg, a multiple of deg)
+    that hold the given cells
+    """
+    k = nesting_ratio(deg, parent_deg)
+    columns = equal_area_columns(deg)
+    parent_columns = equal_area_columns(parent_deg)[np.arange(columns.size) // k]
+
+    if (columns % parent_columns).any():
+        raise ValueError(f"Cells of the {deg} degree equal area grid don't nest in the {parent_deg} degree grid")
+
+    # every parent column holds a whole number of the columns of a band
+    band_idx = np.asarray(band_idx)
+    return band_idx // k, np.asarray(lng_idx) // (columns // parent_columns)[band_idx]
+
+
+def cell_parent(cell, deg, parent_deg):
+    """
+    Returns the cell ids of the coarser equal area grid (parent_deg, a multiple of deg) that hold the given cells
+    """
+    band_idx, lng_idx = equal_area_parent(*np.divmod(np.asarray(cell), grid_shape(deg)[1]), deg, parent_deg)
+    return band_idx * grid_shape(parent_deg)[1] + lng_idx
+
+
+def cell_children(cell, deg, child_deg):
+    """
+    Returns the cell ids of the finer equal area grid (child_deg, deg is a multiple of it) that nest in a cell,
+    an array per given cell. Cells closer to the poles have fewer children
+    """
+    k = nesting_ratio(child_deg, deg)
+    child_columns = equal_area_columns(child_deg)
+    columns = equal_area_columns(deg)
+    nlng = grid_shape(child_deg)[1]
+
+    children = []
+    for band, col in zip(*np.divmod(np.atleast_1d(cell), grid_shape(deg)[1])):
+        ids = []
+        for child_band in range(band * k, (band + 1) * k):
+            per_parent = child_columns[child_band] // columns[band]
+            ids.append(child_band * nlng + np.arange(col * per_parent, (col + 1) * per_parent))
+        children.append(np.concatenate(ids))
+
+    return children
+
+
+#######
+
+def grid_cells(lat, lng, deg=2.5, grid="latlng"):
+    """
+    Returns cell labels of every point for a grid: lower edges for the latitude/longitude grid (like discretize_latlng),
+    centroids for the equal area grid. NaN for points outside the grid
+
+    Returns
+    -------
+    lat_labels, lng_labels : numpy arrays of float
+    """
+    check_grid(grid)
+
+    if grid == "equal_area":
+        row_idx, col_idx = equal_area_index(lat, lng, deg)
+        valid = row_idx >= 0
+        lat_labels, lng_labels = equal_area_centroids(np.where(valid, row_idx, 0), np.where(valid, col_idx, 0), deg)
+    else:
+        row_idx, col_idx = latlng_index(lat, lng, deg)
+        valid = row_idx >= 0
+        lat_labels, lng_labels = grid_labels(deg)
+        lat_labels, lng_labels = lat_labels[row_idx], lng_labels[col_idx]
+
+    return np.where(valid, lat_labels, np.nan), np.where(valid, lng_labels, np.nan)
+
+
+#######################################################################################################################